@@ -29,6 +29,14 @@ Dependency graph (→ = depends on):
 Steps in brackets are optional and only execute when their prerequisite data
 is present.
 
+The last step fails the build when a lookup tier that is driven by an FTS index no
+longer fetches its rows by the matched rowids (sumatora_lookup.Lookup.check_plans).
+
+Every step is profiled: wall and CPU time, peak RSS and block I/O per step,
+rows added per sumatora.db table, and the per-pass records the stage-2 scripts
+and split-sumatora-packs.py append (sumatora_common.ProfilePass). The result is
+written to <output>/build-report.json, and a summary to BuildMetadata.
+
 Usage:
     build-sumatora-db.py -o <sqlite output dir>
         [--gitjidic2  <dir>]   intermediate kanjidic2 JSON repo  (default: ~/Code/gitjidic2)
@@ -45,6 +53,11 @@ Usage:
         [--split-packs]        also write installable pack DBs under <output>/packs
         [--pack-lang <code>]   repeatable pack language (default: eng)
         [--all-pack-languages] split every language present in the monolithic DB
+        [--shared-example-segments]  store each Tatoeba sentence's ruby segments once
+                                (ExampleSentenceSegment) instead of once per
+                                translation language (ExampleSegment)
+        [--sql-profile]        profile every SQL statement of the stage-2 steps and
+                                write the ranked tables to <output>/sql-profile.txt
 
 This program is free software: you can redistribute it and/or modify it under
 the terms of the GNU General Public License as published by the Free Software
@@ -58,12 +71,17 @@ __version__ = "0.1.0"
 
 import getopt
 import glob
+import json
 import os
+import resource
+import sqlite3
 import subprocess
 import sys
 import time
 
 import sumatora_schema
+from sumatora_common import PROFILE_ENV, ProfilePass, rss_mb
+from sumatora_lookup import Lookup
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -80,7 +98,9 @@ HELP = (
     '    [--skip-stage1]        reuse existing JSON repos, skip *-to-git.py steps\n'
     '    [--split-packs]        also write installable pack DBs under <output>/packs\n'
     '    [--pack-lang <code>]   repeatable pack language (default: eng)\n'
-    '    [--all-pack-languages] split every language present in the monolithic DB'
+    '    [--all-pack-languages] split every language present in the monolithic DB\n'
+    '    [--shared-example-segments] store example segments once per sentence, not per language\n'
+    '    [--sql-profile]        write per-statement SQL profiles to <output>/sql-profile.txt'
 )
 
 
@@ -88,10 +108,161 @@ def script(name):
     return os.path.join(SCRIPT_DIR, name)
 
 
-def run(*args):
-    cmd = [sys.executable] + [str(a) for a in args]
-    print('==> ' + ' '.join(cmd), flush=True)
-    subprocess.run(cmd, check=True)
+# ru_inblock/ru_oublock unit
+_BLOCK_SIZE = 512
+
+
+def _table_rows(db_path):
+    """{table: row count} for the ordinary tables of db_path. FTS indexes are left
+    out, virtual tables and their shadow tables alike."""
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table' "
+            "AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()
+        virtual = [name for name, sql in tables
+                   if (sql or '').upper().startswith('CREATE VIRTUAL TABLE')]
+        return {
+            name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            for name, _ in tables
+            if not any(name == v or name.startswith(v + '_') for v in virtual)
+        }
+    finally:
+        conn.close()
+
+
+def _run_measured(cmd):
+    """Run cmd; return its (wall seconds, rusage). The rusage is the child's own
+    where os.wait4 exists, else the RUSAGE_CHILDREN delta (whose ru_maxrss is the
+    largest child so far)."""
+    started = time.perf_counter()
+    if not hasattr(os, 'wait4'):
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        subprocess.run(cmd, check=True)
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        usage = {
+            field: getattr(after, field) - getattr(before, field)
+            for field in ('ru_utime', 'ru_stime', 'ru_inblock', 'ru_oublock')
+        }
+        usage['ru_maxrss'] = after.ru_maxrss
+        return time.perf_counter() - started, usage
+
+    proc = subprocess.Popen(cmd)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - started
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    usage = {field: getattr(rusage, field) for field in
+             ('ru_utime', 'ru_stime', 'ru_maxrss', 'ru_inblock', 'ru_oublock')}
+    return wall, usage
+
+
+class BuildProfile:
+    """Collects the per-step measurements behind build-report.json.
+
+    Each step's scripts inherit PROFILE_ENV and append their ProfilePass records
+    to build-passes.jsonl; the records written while a step ran are attached to it.
+    Steps that write sumatora.db (-d) get its table row counts taken afterwards and
+    diffed against the previous such step.
+    """
+
+    def __init__(self, output_dir, sumatora_db):
+        self.sumatora_db = sumatora_db
+        self.report_path = os.path.join(output_dir, 'build-report.json')
+        self.passes_path = os.path.join(output_dir, 'build-passes.jsonl')
+        if os.path.exists(self.passes_path):
+            os.unlink(self.passes_path)
+        os.environ[PROFILE_ENV] = self.passes_path
+        self.steps = []
+        self._started = time.perf_counter()
+        self._rows = {}
+
+    def _passes_since(self, offset):
+        if not os.path.exists(self.passes_path):
+            return []
+        with open(self.passes_path, encoding='utf-8') as f:
+            f.seek(offset)
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _passes_offset(self):
+        return os.path.getsize(self.passes_path) if os.path.exists(self.passes_path) else 0
+
+    def _row_rates(self, wall):
+        rows = _table_rows(self.sumatora_db)
+        added = {}
+        for table, count in rows.items():
+            delta = count - self._rows.get(table, 0)
+            if delta:
+                added[table] = {
+                    'rows_added': delta,
+                    'rows_per_second': round(delta / wall) if wall > 0 else None,
+                }
+        self._rows = rows
+        return added
+
+    def run(self, *args):
+        cmd = [sys.executable] + [str(a) for a in args]
+        print('==> ' + ' '.join(cmd), flush=True)
+        writes_db = any(a == '-d' and b == self.sumatora_db for a, b in zip(cmd, cmd[1:]))
+        offset = self._passes_offset()
+        wall, usage = _run_measured(cmd)
+        step = {
+            'step': os.path.splitext(os.path.basename(str(args[0])))[0],
+            'wall_seconds': round(wall, 3),
+            'cpu_seconds': round(usage['ru_utime'] + usage['ru_stime'], 3),
+            'peak_rss_mb': rss_mb(usage['ru_maxrss']),
+            'block_bytes_read': usage['ru_inblock'] * _BLOCK_SIZE,
+            'block_bytes_written': usage['ru_oublock'] * _BLOCK_SIZE,
+            'tables': self._row_rates(wall) if writes_db else {},
+            'passes': self._passes_since(offset),
+        }
+        self.steps.append(step)
+        print(f'  [{step["step"]}] {wall:.1f}s wall, {step["cpu_seconds"]:.1f}s CPU, '
+              f'peak RSS {step["peak_rss_mb"]:.0f} MiB', flush=True)
+
+    def call(self, name, fn, *args):
+        """Profile an in-process step from its single ProfilePass record."""
+        offset = self._passes_offset()
+        timing = ProfilePass(name)
+        fn(*args)
+        timing.done()
+        passes = self._passes_since(offset)
+        record = passes[-1]
+        self.steps.append({
+            'step': name,
+            'wall_seconds': record['wall_seconds'],
+            'cpu_seconds': record['cpu_seconds'],
+            'peak_rss_mb': record['peak_rss_mb'],
+            'passes': passes,
+        })
+
+    def summary(self):
+        """Compact per-step totals for BuildMetadata."""
+        return {
+            'build_wall_seconds': str(round(time.perf_counter() - self._started, 1)),
+            'build_peak_rss_mb': str(max((s['peak_rss_mb'] for s in self.steps), default=0)),
+            'build_profile': json.dumps(
+                [[s['step'], round(s['wall_seconds'], 1), s['peak_rss_mb']]
+                 for s in self.steps],
+                ensure_ascii=False, separators=(',', ':'),
+            ),
+        }
+
+    def write_report(self):
+        report = {
+            'wall_seconds': round(time.perf_counter() - self._started, 3),
+            'cpu_seconds': round(sum(s['cpu_seconds'] for s in self.steps), 3),
+            'peak_rss_mb': max((s['peak_rss_mb'] for s in self.steps), default=0),
+            'steps': self.steps,
+        }
+        with open(self.report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+            f.write('\n')
+        print(f'Build report: {self.report_path}', flush=True)
 
 
 def _git_describe():
@@ -118,13 +289,16 @@ def main(argv):
     split_packs   = False
     pack_langs    = []
     all_pack_langs = False
+    shared_example_segments = False
+    sql_profile   = False
 
     try:
         opts, _ = getopt.getopt(
             argv, 'ho:',
             ['odir=', 'gitjidic2=', 'gitmdict=', 'gitnedict=', 'gitch=',
              'pitch-dir=', 'gitoeba=', 'pitch-tsv=', 'cache=', 'skip-stage1',
-             'split-packs', 'pack-lang=', 'all-pack-languages'],
+             'split-packs', 'pack-lang=', 'all-pack-languages', 'shared-example-segments',
+             'sql-profile'],
         )
     except getopt.GetoptError:
         print(HELP)
@@ -160,6 +334,10 @@ def main(argv):
             pack_langs.append(arg)
         elif opt == '--all-pack-languages':
             all_pack_langs = True
+        elif opt == '--shared-example-segments':
+            shared_example_segments = True
+        elif opt == '--sql-profile':
+            sql_profile = True
 
     if not output_dir:
         print(HELP)
@@ -170,6 +348,16 @@ def main(argv):
     jmdict_cache    = os.path.join(cache_dir, 'jmdict')
     tatoeba_cache   = os.path.join(cache_dir, 'tatoeba')
     unidic_cache    = os.path.join(cache_dir, 'unidic')
+    segments_cache  = os.path.join(cache_dir, 'segments')
+
+    os.makedirs(output_dir, exist_ok=True)
+    sumatora_db = os.path.join(output_dir, 'sumatora.db')
+    profile = BuildProfile(output_dir, sumatora_db)
+    if sql_profile:
+        sql_profile_path = os.path.join(output_dir, 'sql-profile.txt')
+        if os.path.exists(sql_profile_path):
+            os.unlink(sql_profile_path)
+        os.environ[sumatora_schema.SQL_PROFILE_ENV] = sql_profile_path
 
     # ------------------------------------------------------------------
     # Stage 1 — build JSON repos (git-friendly intermediate data, shared with v1)
@@ -180,27 +368,28 @@ def main(argv):
               flush=True)
     else:
         print('--- Step 1: kanjidic2-to-git ---', flush=True)
-        run(script('kanjidic2-to-git.py'),
+        profile.run(script('kanjidic2-to-git.py'),
             '-o', gitjidic2_dir,
             '--cache', kanjidic2_cache)
 
         print('--- Step 2: jmnedict-to-git ---', flush=True)
-        run(script('jmnedict-to-git.py'),
+        profile.run(script('jmnedict-to-git.py'),
             '-o', gitnedict_dir,
             '--cache', jmnedict_cache)
 
         print('--- Step 3: jmdict-to-git ---', flush=True)
-        run(script('jmdict-to-git.py'),
+        profile.run(script('jmdict-to-git.py'),
             '-o', gitmdict_dir,
             '--cache', jmdict_cache)
 
         print('--- Step 4: tatoeba-to-git ---', flush=True)
-        run(script('tatoeba-to-git.py'),
+        profile.run(script('tatoeba-to-git.py'),
             '-o', gitoeba_dir,
-            '--cache', tatoeba_cache)
+            '--cache', tatoeba_cache,
+            '--jobs', os.cpu_count() or 1)
 
         print('--- Step 5: unidic-to-git ---', flush=True)
-        run(script('unidic-to-git.py'), '-o', gitch_dir, '--cache', unidic_cache)
+        profile.run(script('unidic-to-git.py'), '-o', gitch_dir, '--cache', unidic_cache)
 
         if not pitch_tsvs and os.path.isdir(pitch_dir):
             pitch_tsvs = sorted(glob.glob(os.path.join(pitch_dir, '*.tsv')))
@@ -212,7 +401,7 @@ def main(argv):
             for tsv in pitch_tsvs:
                 pitch_args += ['-i', tsv]
             pitch_args += ['-o', gitch_dir]
-            run(*pitch_args)
+            profile.run(*pitch_args)
         else:
             print(f'--- Step 6: pitch-to-git skipped (no *.tsv in {pitch_dir}) ---', flush=True)
 
@@ -220,61 +409,88 @@ def main(argv):
     # Stage 2 — compile JSON repos into one normalized sumatora.db
     # ------------------------------------------------------------------
 
-    os.makedirs(output_dir, exist_ok=True)
-    sumatora_db = os.path.join(output_dir, 'sumatora.db')
     if os.path.exists(sumatora_db):
         os.unlink(sumatora_db)
 
+    # Every loader skips its own FTS rebuild; Step 11.4 does one per index at the end.
     print('--- Step 7: kanjidic2-to-sumatora-db ---', flush=True)
-    run(script('kanjidic2-to-sumatora-db.py'),
+    profile.run(script('kanjidic2-to-sumatora-db.py'),
         '-i', gitjidic2_dir,
-        '-d', sumatora_db)
+        '-d', sumatora_db,
+        '--jobs', os.cpu_count() or 1,
+        '--skip-fts-rebuild')
 
     print('--- Step 8: jmnedict-to-sumatora-db (informed furigana) ---', flush=True)
-    run(script('jmnedict-to-sumatora-db.py'),
+    profile.run(script('jmnedict-to-sumatora-db.py'),
         '-i', gitnedict_dir,
         '-d', sumatora_db,
-        '-k', gitjidic2_dir)
+        '-k', gitjidic2_dir,
+        '--jobs', os.cpu_count() or 1,
+        '--skip-fts-rebuild')
 
     print('--- Step 9: jmdict-to-sumatora-db (informed furigana) ---', flush=True)
-    run(script('jmdict-to-sumatora-db.py'),
+    profile.run(script('jmdict-to-sumatora-db.py'),
         '-i', gitmdict_dir,
         '-d', sumatora_db,
-        '-k', gitjidic2_dir)
+        '-k', gitjidic2_dir,
+        '--jobs', os.cpu_count() or 1,
+        '--skip-fts-rebuild')
 
     print('--- Step 10: pitch-to-sumatora-db ---', flush=True)
-    run(script('pitch-to-sumatora-db.py'),
+    profile.run(script('pitch-to-sumatora-db.py'),
         '-i', gitch_dir,
-        '-d', sumatora_db)
+        '-d', sumatora_db,
+        '--jobs', os.cpu_count() or 1)
 
     if os.path.isdir(gitoeba_dir):
         print('--- Step 11: gitoeba-to-sumatora-db ---', flush=True)
-        run(script('gitoeba-to-sumatora-db.py'),
+        gitoeba_args = [
+            script('gitoeba-to-sumatora-db.py'),
             '-i', gitoeba_dir,
             '-u', unidic_cache,
-            '-d', sumatora_db)
+            '-d', sumatora_db,
+            '--cache', segments_cache,
+            '--jobs', os.cpu_count() or 1,
+        ]
+        if shared_example_segments:
+            gitoeba_args.append('--shared-segments')
+        profile.run(*gitoeba_args)
     else:
         print(f'--- Step 11: gitoeba-to-sumatora-db skipped ({gitoeba_dir} not found) ---',
               flush=True)
 
-    print('--- Step 11.5: build metadata ---', flush=True)
+    print('--- Step 11.4: rebuild and optimize FTS indexes ---', flush=True)
     conn = sumatora_schema.open_or_init_db(sumatora_db)
+    profile.call('finalize FTS', sumatora_schema.finalize_fts, conn)
+
+    print('--- Step 11.5: build metadata ---', flush=True)
     sumatora_schema.set_build_metadata(
         conn,
         schema_version=str(sumatora_schema.SCHEMA_VERSION),
         build_timestamp=str(int(time.time())),
         sumatora_index_version=_git_describe(),
+        **profile.summary(),
     )
     conn.close()
 
     if split_packs:
         print('--- Step 12: split-sumatora-packs ---', flush=True)
-        run(script('split-sumatora-packs.py'),
+        profile.run(script('split-sumatora-packs.py'),
             '-i', sumatora_db,
             '-o', os.path.join(output_dir, 'packs'),
             *(['--all-languages'] if all_pack_langs else
               [x for lang in (pack_langs or ['eng']) for x in ('--lang', lang)]))
 
+    print('--- Step 13: check lookup query plans ---', flush=True)
+    problems = []
+    for path in [sumatora_db] + ([os.path.join(output_dir, 'packs')] if split_packs else []):
+        lookup = Lookup(path, pack_langs or ['eng'])
+        problems += [f'{path}: {problem}' for problem in lookup.check_plans()]
+        lookup.close()
+    if problems:
+        sys.exit('Lookup query plans regressed:\n  ' + '\n  '.join(problems))
+
+    profile.write_report()
     print('Done.', flush=True)
 
 
@@ -175,7 +175,8 @@ def main(argv):
     run(script('gitmdict-to-sqlite.py'),
         '-i', gitmdict_dir,
         '--nedict', gitnedict_dir,
-        '-o', output_dir)
+        '-o', output_dir,
+        '--jobs', os.cpu_count() or 1)
 
     print('--- Step 8: gitch-to-sqlite ---', flush=True)
     run(script('gitch-to-sqlite.py'),
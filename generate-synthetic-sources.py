@@ -0,0 +1,956 @@
+#!/usr/bin/env python3
+"""Write synthetic JMdict, JMnedict, KANJIDIC2 and Tatoeba downloads for offline
+scaling benchmarks.
+
+    generate-synthetic-sources.py --cache ~/.cache/sumatora-synthetic -n 200000
+    build-sumatora-db.py -o output --cache ~/.cache/sumatora-synthetic ...
+
+The files land where build-sumatora-db.py --cache points the stage-1 scripts,
+under the names ensure_cached() would download them to:
+
+    <cache>/kanjidic2/kanjidic2.xml.gz
+    <cache>/jmnedict/JMnedict.xml.gz
+    <cache>/jmdict/JMdict.gz
+    <cache>/tatoeba/jpn_sentences.tsv.bz2, jpn_indices.tar.bz2, _jpn_dir.html,
+                    jpn-{lang}_links.tsv.bz2, {lang}_sentences.tsv.bz2
+
+Each EDRDG file gets a <name>.headers file marking it synthetic, so ensure_cached()
+uses it as it is instead of revalidating it against the server (which would
+replace it with the real file). The Tatoeba exports are never revalidated. UniDic
+is not synthesized: unidic-to-git.py and gitoeba-to-sumatora-db.py need a real
+cached UniDic, or run with --skip-stage1 over repos built earlier.
+
+The data follows the upstream DTDs and export layouts, with entity-coded tags,
+priority codes, restricted readings, stagk/stagr, xref/ant, lsource, non-English
+senses, verb and adjective classes whose okurigana match their rule, and B-line
+annotations with readings, sense numbers and conjugated {forms}. Words are built
+from the synthetic kanji and their readings, so informed furigana resolves, and
+the Tatoeba sentences are built from the synthetic words. Text is drawn from
+Zipf-distributed vocabularies, so index and FTS sizes grow as they do with real
+data.
+
+Everything is streamed and derived from --seed, so a scale and seed always give
+byte-identical files. Only the kanji table, a word reservoir for xrefs and
+sentences, and one hash per JMdict (writing, reading) pair are held in memory.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+"""
+
+__author__ = "Nicolas Centa"
+__license__ = "GPLv3"
+__version__ = "0.1.0"
+
+import bz2
+import getopt
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import tarfile
+from xml.sax.saxutils import escape
+
+from sumatora_common import hira_to_kata
+
+SOURCES = ('kanjidic2', 'jmnedict', 'jmdict', 'tatoeba')
+
+HELP = (
+    'usage: generate-synthetic-sources.py --cache <download cache root>\n'
+    '    [-n|--entries <n>]   JMdict entries (default: 10000)\n'
+    '    [--names <n>]        JMnedict entries (default: 3 x entries)\n'
+    '    [--kanji <n>]        KANJIDIC2 characters (default: entries / 10, 500..20000)\n'
+    '    [--sentences <n>]    Tatoeba Japanese sentences (default: entries)\n'
+    '    [--lang <code>]      repeatable Tatoeba translation language (default: eng fra deu)\n'
+    '    [--only <source>]    repeatable: kanjidic2, jmnedict, jmdict, tatoeba\n'
+    '    [--seed <n>]         default: 1'
+)
+
+_JMDICT_SEQ = 1000000
+_JMNEDICT_SEQ = 5000000
+_CJK_FIRST, _CJK_LAST = 0x4E00, 0x9FFF
+# Words kept for xrefs and sentences, whatever the scale.
+_RESERVOIR_SIZE = 50000
+_RECENT_SIZE = 2000
+
+# ---------------------------------------------------------------------------
+# Entities (a subset of the upstream DTDs, with their upstream descriptions)
+# ---------------------------------------------------------------------------
+
+_JMDICT_ENTITIES = (
+    ('adj-i', 'adjective (keiyoushi)'),
+    ('adj-na', 'adjectival nouns or quasi-adjectives (keiyodoshi)'),
+    ('adj-no', "nouns which may take the genitive case particle 'no'"),
+    ('adv', 'adverb (fukushi)'),
+    ('ctr', 'counter'),
+    ('exp', 'expressions (phrases, clauses, etc.)'),
+    ('int', 'interjection (kandoushi)'),
+    ('n', 'noun (common) (futsuumeishi)'),
+    ('pref', 'prefix'),
+    ('prt', 'particle'),
+    ('suf', 'suffix'),
+    ('v1', 'Ichidan verb'),
+    ('v5b', "Godan verb with 'bu' ending"),
+    ('v5g', "Godan verb with 'gu' ending"),
+    ('v5k', "Godan verb with 'ku' ending"),
+    ('v5m', "Godan verb with 'mu' ending"),
+    ('v5n', "Godan verb with 'nu' ending"),
+    ('v5r', "Godan verb with 'ru' ending"),
+    ('v5s', "Godan verb with 'su' ending"),
+    ('v5t', "Godan verb with 'tsu' ending"),
+    ('v5u', "Godan verb with 'u' ending"),
+    ('vi', 'intransitive verb'),
+    ('vs', 'noun or participle which takes the aux. verb suru'),
+    ('vt', 'transitive verb'),
+    ('abbr', 'abbreviation'),
+    ('arch', 'archaic'),
+    ('col', 'colloquial'),
+    ('hon', 'honorific or respectful (sonkeigo) language'),
+    ('hum', 'humble (kenjougo) language'),
+    ('on-mim', 'onomatopoeic or mimetic word'),
+    ('pol', 'polite (teineigo) language'),
+    ('sl', 'slang'),
+    ('uk', 'word usually written using kana alone'),
+    ('yoji', 'yojijukugo'),
+    ('comp', 'computing'),
+    ('food', 'food, cooking'),
+    ('ling', 'linguistics'),
+    ('math', 'mathematics'),
+    ('med', 'medicine'),
+    ('sports', 'sports'),
+    ('ksb', 'Kansai-ben'),
+    ('kyb', 'Kyoto-ben'),
+    ('osb', 'Osaka-ben'),
+    ('ateji', 'ateji (phonetic) reading'),
+    ('iK', 'word containing irregular kanji usage'),
+    ('oK', 'word containing out-dated kanji or kanji usage'),
+    ('rK', 'rarely used kanji form'),
+    ('sK', 'search-only kanji form'),
+    ('gikun', 'gikun (meaning as reading) or jukujikun (special kanji reading)'),
+    ('ik', 'word containing irregular kana usage'),
+    ('ok', 'out-dated or obsolete kana usage'),
+    ('sk', 'search-only kana form'),
+)
+
+_JMNEDICT_ENTITIES = (
+    ('company', 'company name'),
+    ('fem', 'female given name or forename'),
+    ('given', 'given name or forename, gender not specified'),
+    ('masc', 'male given name or forename'),
+    ('organization', 'organization name'),
+    ('person', 'full name of a particular person'),
+    ('place', 'place name'),
+    ('product', 'product name'),
+    ('station', 'railway station'),
+    ('surname', 'family or surname'),
+    ('unclass', 'unclassified name'),
+    ('work', 'work of art, literature, music, etc. name'),
+)
+
+_JMDICT_DTD = """<!DOCTYPE JMdict [
+<!ELEMENT JMdict (entry*)>
+<!ELEMENT entry (ent_seq, k_ele*, r_ele+, sense+)>
+<!ELEMENT ent_seq (#PCDATA)>
+<!ELEMENT k_ele (keb, ke_inf*, ke_pri*)>
+<!ELEMENT keb (#PCDATA)>
+<!ELEMENT ke_inf (#PCDATA)>
+<!ELEMENT ke_pri (#PCDATA)>
+<!ELEMENT r_ele (reb, re_nokanji?, re_restr*, re_inf*, re_pri*)>
+<!ELEMENT reb (#PCDATA)>
+<!ELEMENT re_nokanji EMPTY>
+<!ELEMENT re_restr (#PCDATA)>
+<!ELEMENT re_inf (#PCDATA)>
+<!ELEMENT re_pri (#PCDATA)>
+<!ELEMENT sense (stagk*, stagr*, pos*, xref*, ant*, field*, misc*, s_inf*, lsource*, dial*, gloss*)>
+<!ELEMENT stagk (#PCDATA)>
+<!ELEMENT stagr (#PCDATA)>
+<!ELEMENT xref (#PCDATA)*>
+<!ELEMENT ant (#PCDATA)*>
+<!ELEMENT pos (#PCDATA)>
+<!ELEMENT field (#PCDATA)>
+<!ELEMENT misc (#PCDATA)>
+<!ELEMENT lsource (#PCDATA)>
+<!ATTLIST lsource xml:lang CDATA "eng">
+<!ATTLIST lsource ls_type CDATA #IMPLIED>
+<!ATTLIST lsource ls_wasei CDATA #IMPLIED>
+<!ELEMENT dial (#PCDATA)>
+<!ELEMENT gloss (#PCDATA)>
+<!ATTLIST gloss xml:lang CDATA "eng">
+<!ATTLIST gloss g_type CDATA #IMPLIED>
+<!ELEMENT s_inf (#PCDATA)>
+{entities}
+]>
+<!-- JMdict created: 2000-01-01 (synthetic) -->
+"""
+
+_JMNEDICT_DTD = """<!DOCTYPE JMnedict [
+<!ELEMENT JMnedict (entry*)>
+<!ELEMENT entry (ent_seq, k_ele*, r_ele+, trans+)>
+<!ELEMENT ent_seq (#PCDATA)>
+<!ELEMENT k_ele (keb, ke_inf*, ke_pri*)>
+<!ELEMENT keb (#PCDATA)>
+<!ELEMENT r_ele (reb, re_restr*, re_inf*, re_pri*)>
+<!ELEMENT reb (#PCDATA)>
+<!ELEMENT re_restr (#PCDATA)>
+<!ELEMENT trans (name_type*, xref*, trans_det*)>
+<!ELEMENT name_type (#PCDATA)>
+<!ELEMENT trans_det (#PCDATA)>
+<!ATTLIST trans_det xml:lang CDATA "eng">
+{entities}
+]>
+<!-- JMnedict created: 2000-01-01 (synthetic) -->
+"""
+
+_KANJIDIC2_DTD = """<!DOCTYPE kanjidic2 [
+<!ELEMENT kanjidic2 (header, character*)>
+<!ELEMENT header (file_version, database_version, date_of_creation)>
+<!ELEMENT file_version (#PCDATA)>
+<!ELEMENT database_version (#PCDATA)>
+<!ELEMENT date_of_creation (#PCDATA)>
+<!ELEMENT character (literal, codepoint, radical, misc, query_code?, reading_meaning?)>
+<!ELEMENT literal (#PCDATA)>
+<!ELEMENT codepoint (cp_value+)>
+<!ELEMENT cp_value (#PCDATA)>
+<!ATTLIST cp_value cp_type CDATA #REQUIRED>
+<!ELEMENT radical (rad_value+)>
+<!ELEMENT rad_value (#PCDATA)>
+<!ATTLIST rad_value rad_type CDATA #REQUIRED>
+<!ELEMENT misc (grade?, stroke_count+, freq?, jlpt?)>
+<!ELEMENT grade (#PCDATA)>
+<!ELEMENT stroke_count (#PCDATA)>
+<!ELEMENT freq (#PCDATA)>
+<!ELEMENT jlpt (#PCDATA)>
+<!ELEMENT query_code (q_code+)>
+<!ELEMENT q_code (#PCDATA)>
+<!ATTLIST q_code qc_type CDATA #REQUIRED>
+<!ELEMENT reading_meaning (rmgroup*, nanori*)>
+<!ELEMENT rmgroup (reading*, meaning*)>
+<!ELEMENT reading (#PCDATA)>
+<!ATTLIST reading r_type CDATA #REQUIRED>
+<!ELEMENT meaning (#PCDATA)>
+<!ATTLIST meaning m_lang CDATA #IMPLIED>
+<!ELEMENT nanori (#PCDATA)>
+]>
+"""
+
+# ---------------------------------------------------------------------------
+# Kana and vocabulary
+# ---------------------------------------------------------------------------
+
+_ROWS = {
+    '': 'あいうえお', 'k': 'かきくけこ', 's': 'さしすせそ', 't': 'たちつてと',
+    'n': 'なにぬねの', 'h': 'はひふへほ', 'm': 'まみむめも', 'y': 'や ゆ よ',
+    'r': 'らりるれろ', 'w': 'わ   を', 'g': 'がぎぐげご', 'z': 'ざじずぜぞ',
+    'd': 'だぢづでど', 'b': 'ばびぶべぼ', 'p': 'ぱぴぷぺぽ',
+}
+_VOWELS = 'aiueo'
+_ROMAJI = {}
+for _consonant, _kana in _ROWS.items():
+    for _vowel, _char in zip(_VOWELS, _kana):
+        if _char != ' ':
+            _ROMAJI[_char] = _consonant + _vowel
+_ROMAJI.update({
+    'し': 'shi', 'ち': 'chi', 'つ': 'tsu', 'ふ': 'fu', 'じ': 'ji', 'ぢ': 'ji', 'づ': 'zu',
+    'を': 'o', 'ん': 'n',
+})
+_YOON = {'ゃ': 'ya', 'ゅ': 'yu', 'ょ': 'yo'}
+_MORAE = [c for c in _ROMAJI if c not in 'をぢづん']
+_YOON_BASES = 'きしちにひみりぎじびぴ'
+# On readings: a mora with an optional second mora drawn from these.
+_ON_TAILS = ('', '', 'ん', 'う', 'い', 'く', 'つ', 'ち', 'き')
+# Kun okurigana and the JMdict class each implies; None stays a plain noun.
+_OKURIGANA = (
+    (None, 'n'), ('る', 'v5r'), ('く', 'v5k'), ('す', 'v5s'), ('う', 'v5u'),
+    ('つ', 'v5t'), ('む', 'v5m'), ('ぶ', 'v5b'), ('ぐ', 'v5g'), ('べる', 'v1'),
+    ('める', 'v1'), ('える', 'v1'), ('きる', 'v1'), ('い', 'adj-i'), ('しい', 'adj-i'),
+)
+_GODAN_STEM = {
+    'う': 'い', 'く': 'き', 'ぐ': 'ぎ', 'す': 'し', 'つ': 'ち', 'ぬ': 'に',
+    'ぶ': 'び', 'む': 'み', 'る': 'り',
+}
+_PARTICLES = ('が', 'を', 'に', 'は', 'で', 'と', 'の', 'へ', 'も')
+_ENDINGS = ('です。', 'だ。', 'ました。', '。', 'か。', 'よ。')
+
+_SYLLABLE_ONSETS = ('b', 'c', 'd', 'f', 'g', 'h', 'j', 'k', 'l', 'm', 'n', 'p', 'r',
+                    's', 't', 'v', 'w', 'br', 'cl', 'dr', 'fl', 'gr', 'pl', 'pr',
+                    'sh', 'st', 'th', 'tr', '')
+_SYLLABLE_VOWELS = ('a', 'e', 'i', 'o', 'u', 'ea', 'ou', 'ai')
+_SYLLABLE_CODAS = ('', '', '', 'n', 'r', 's', 't', 'l', 'm', 'nd', 'st', 'ck', 'ng')
+# The most frequent ranks of every vocabulary, so gloss prefixes look natural.
+_COMMON_WORDS = (
+    'the', 'of', 'a', 'to', 'one', 'person', 'thing', 'time', 'place', 'way',
+    'day', 'water', 'large', 'small', 'good', 'new', 'old', 'high', 'long', 'make',
+    'go', 'come', 'see', 'take', 'give', 'say', 'eat', 'write', 'read', 'hand',
+    'eye', 'mouth', 'heart', 'word', 'book', 'house', 'work', 'school', 'car', 'money',
+)
+_ZIPF_EXPONENT = 1.07
+
+# JMdict sense languages (JMdict codes) and the share of entries that have them.
+_SENSE_LANGS = (('ger', 0.4), ('dut', 0.25), ('rus', 0.2), ('hun', 0.15),
+                ('fre', 0.1), ('spa', 0.1), ('swe', 0.05), ('slv', 0.05))
+# Share of Tatoeba sentences translated into each language; others get 0.2.
+_TRANSLATION_SHARE = {'eng': 0.9, 'fra': 0.4, 'deu': 0.4}
+_PRIORITY_CODES = ('news1', 'news2', 'ichi1', 'ichi2', 'spec1', 'spec2', 'gai1')
+
+
+class _Zipf:
+    """Zipf-distributed picks from a sequence, most frequent first."""
+
+    def __init__(self, items):
+        self.items = items
+        self._cum = list(itertools.accumulate(
+            1 / (rank ** _ZIPF_EXPONENT) for rank in range(1, len(items) + 1)
+        ))
+
+    def pick(self, rng, k=1):
+        return rng.choices(self.items, cum_weights=self._cum, k=k)
+
+
+def _vocabulary(rng, size):
+    words = list(_COMMON_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(
+            rng.choice(_SYLLABLE_ONSETS) + rng.choice(_SYLLABLE_VOWELS)
+            for _ in range(rng.choice((1, 2, 2, 3, 3, 4)))
+        ) + rng.choice(_SYLLABLE_CODAS)
+        if len(word) > 2 and word not in seen:
+            seen.add(word)
+            words.append(word)
+    return _Zipf(words)
+
+
+def _mora(rng):
+    if rng.random() < 0.08:
+        return rng.choice(_YOON_BASES) + rng.choice(tuple(_YOON))
+    return rng.choice(_MORAE)
+
+
+def _kana(rng, morae):
+    text = ''.join(_mora(rng) for _ in range(morae))
+    if morae > 2 and rng.random() < 0.15:
+        text += 'ん'
+    return text
+
+
+def _romaji(kana):
+    out = ''
+    for char in kana:
+        if char in _YOON and out.endswith('i'):
+            base = out[:-1]
+            out = base + (_YOON[char][1:] if base.endswith(('sh', 'ch', 'j')) else _YOON[char])
+        else:
+            out += _ROMAJI.get(char, '')
+    return out
+
+
+def _open_gzip_text(path):
+    # mtime=0 keeps the output byte-identical across runs.
+    raw = open(path, 'wb')
+    return io.TextIOWrapper(
+        gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6, mtime=0),
+        encoding='utf-8',
+    ), raw
+
+
+def _close_gzip_text(handles):
+    text, raw = handles
+    text.close()
+    raw.close()
+
+
+def _mark_synthetic(path, params):
+    """The .headers file ensure_cached() reads: a synthetic file is never revalidated."""
+    with open(path + '.headers', 'w') as f:
+        json.dump({'synthetic': params}, f)
+
+
+def _entities_block(entities):
+    return '\n'.join(f'<!ENTITY {name} "{description}">' for name, description in entities)
+
+
+# ---------------------------------------------------------------------------
+# KANJIDIC2
+# ---------------------------------------------------------------------------
+
+class _Kanji:
+    __slots__ = ('char', 'on', 'kun', 'meanings', 'strokes', 'grade', 'jlpt', 'freq',
+                 'radical', 'nanori')
+
+
+def _make_kanji(rng, count, vocabulary):
+    chars = sorted(rng.sample(range(_CJK_FIRST, _CJK_LAST + 1), count))
+    table = []
+    for rank, cp in enumerate(rng.sample(chars, len(chars)), 1):
+        k = _Kanji()
+        k.char = chr(cp)
+        k.on = sorted({_mora(rng) + rng.choice(_ON_TAILS) for _ in range(rng.choice((1, 1, 2)))})
+        k.kun = []
+        for _ in range(rng.choice((0, 1, 1, 2, 3))):
+            stem = _kana(rng, rng.choice((1, 2, 2, 3)))
+            okurigana, _ = rng.choice(_OKURIGANA)
+            k.kun.append((stem, okurigana))
+        k.meanings = vocabulary.pick(rng, rng.choice((1, 2, 2, 3)))
+        k.strokes = rng.randint(1, 24)
+        k.grade = rng.choice((1, 2, 3, 4, 5, 6, 8)) if rank <= 2136 else (
+            rng.choice((9, 10)) if rng.random() < 0.05 else None)
+        k.jlpt = rng.randint(1, 4) if rank <= 2000 else None
+        k.freq = rank if rank <= 2500 else None
+        k.radical = rng.randint(1, 214)
+        k.nanori = [_kana(rng, 2)] if rng.random() < 0.3 else []
+        table.append(k)
+    table.sort(key=lambda k: k.char)
+    return table
+
+
+def write_kanjidic2(path, kanji):
+    handles = _open_gzip_text(path)
+    f = handles[0]
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    f.write(_KANJIDIC2_DTD)
+    f.write('<kanjidic2>\n<header>\n<file_version>4</file_version>\n'
+            '<database_version>synthetic</database_version>\n'
+            '<date_of_creation>2000-01-01</date_of_creation>\n</header>\n')
+    for k in kanji:
+        parts = [
+            '<character>\n',
+            f'<literal>{k.char}</literal>\n',
+            f'<codepoint>\n<cp_value cp_type="ucs">{ord(k.char):x}</cp_value>\n</codepoint>\n',
+            f'<radical>\n<rad_value rad_type="classical">{k.radical}</rad_value>\n</radical>\n',
+            '<misc>\n',
+        ]
+        if k.grade is not None:
+            parts.append(f'<grade>{k.grade}</grade>\n')
+        parts.append(f'<stroke_count>{k.strokes}</stroke_count>\n')
+        if k.freq is not None:
+            parts.append(f'<freq>{k.freq}</freq>\n')
+        if k.jlpt is not None:
+            parts.append(f'<jlpt>{k.jlpt}</jlpt>\n')
+        parts.append('</misc>\n<reading_meaning>\n<rmgroup>\n')
+        for on in k.on:
+            parts.append(f'<reading r_type="ja_on">{hira_to_kata(on)}</reading>\n')
+        for stem, okurigana in k.kun:
+            kun = stem + ('.' + okurigana if okurigana else '')
+            parts.append(f'<reading r_type="ja_kun">{kun}</reading>\n')
+        for meaning in k.meanings:
+            parts.append(f'<meaning>{escape(meaning)}</meaning>\n')
+        parts.append(f'<meaning m_lang="fr">{escape(k.meanings[0])}e</meaning>\n')
+        parts.append('</rmgroup>\n')
+        for nanori in k.nanori:
+            parts.append(f'<nanori>{nanori}</nanori>\n')
+        parts.append('</reading_meaning>\n</character>\n')
+        f.write(''.join(parts))
+    f.write('</kanjidic2>\n')
+    _close_gzip_text(handles)
+
+
+# ---------------------------------------------------------------------------
+# JMdict
+# ---------------------------------------------------------------------------
+
+class _Word:
+    """One generated JMdict entry; the reservoir keeps these for xrefs and Tatoeba."""
+    __slots__ = ('seq', 'kebs', 'rebs', 'pos', 'sense_count')
+
+
+def _on_compound(rng, kanji, size):
+    chars = rng.sample(kanji, size)
+    return (''.join(k.char for k in chars),
+            ''.join(rng.choice(k.on) for k in chars))
+
+
+def _kun_word(rng, kanji):
+    """(writing, reading, class) of a kun-read word: a single kanji with its
+    okurigana, or a kun compound of two."""
+    k = rng.choice(kanji)
+    if not k.kun:
+        return None
+    stem, okurigana = rng.choice(k.kun)
+    if okurigana:
+        pos = dict(_OKURIGANA)[okurigana]
+        return k.char + okurigana, stem + okurigana, pos
+    other = rng.choice(kanji)
+    if not other.kun:
+        return k.char, stem, 'n'
+    other_stem, _ = rng.choice(other.kun)
+    return k.char + other.char, stem + other_stem, 'n'
+
+
+class _JMdictWriter:
+
+    def __init__(self, rng, kanji, vocabulary, sense_vocabularies):
+        self.rng = rng
+        self.kanji = kanji
+        self.vocabulary = vocabulary
+        self.sense_vocabularies = sense_vocabularies
+        self.seen = set()
+        self.recent = []
+        self.reservoir = []
+        self.count = 0
+
+    def _headword(self):
+        """(kebs, rebs, pos) for a new entry, or None on a duplicate."""
+        rng = self.rng
+        r = rng.random()
+        if r < 0.1:
+            reb = _kana(rng, rng.choice((2, 3, 3, 4)))
+            pos = rng.choice(('adv', 'int', 'exp', 'adj-na', 'n', 'prt'))
+            kebs, rebs = [], [reb]
+        elif r < 0.18:
+            reb = hira_to_kata(_kana(rng, rng.choice((2, 3, 4, 5)))) + 'ー' * (rng.random() < 0.3)
+            pos = rng.choice(('n', 'n', 'vs', 'adj-na'))
+            kebs, rebs = [], [reb]
+        elif r < 0.45:
+            word = _kun_word(rng, self.kanji)
+            if word is None:
+                return None
+            keb, reb, pos = word
+            kebs, rebs = [keb], [reb]
+        else:
+            keb, reb = _on_compound(rng, self.kanji, rng.choice((1, 2, 2, 2, 3, 3, 4)))
+            pos = rng.choices(('n', 'vs', 'adj-na', 'adj-no', 'ctr', 'suf'),
+                              (60, 20, 8, 8, 2, 2))[0]
+            kebs, rebs = [keb], [reb]
+        key = hashlib.blake2b(f'{kebs[0] if kebs else ""}\t{rebs[0]}'.encode('utf-8'),
+                              digest_size=8).digest()
+        if key in self.seen:
+            return None
+        self.seen.add(key)
+        return kebs, rebs, pos
+
+    def _forms_xml(self, kebs, rebs, pos):
+        rng = self.rng
+        common = rng.random() < 0.15
+        parts = []
+        if kebs and rng.random() < 0.15:
+            variant = rng.choice(self.kanji).char + kebs[0][1:]
+            if variant != kebs[0]:
+                kebs.append(variant)
+        if kebs and pos in ('n', 'vs', 'adj-na', 'adj-no') and rng.random() < 0.08:
+            rebs.append(rebs[0] + rng.choice(('う', 'ん', 'い')))
+        for i, keb in enumerate(kebs):
+            parts.append(f'<k_ele>\n<keb>{keb}</keb>\n')
+            if i:
+                parts.append(f'<ke_inf>&{rng.choice(("oK", "iK", "rK", "sK", "ateji"))};</ke_inf>\n')
+            elif common:
+                parts.append(f'<ke_pri>{rng.choice(_PRIORITY_CODES)}</ke_pri>\n')
+                parts.append(f'<ke_pri>nf{rng.randint(1, 48):02d}</ke_pri>\n')
+            parts.append('</k_ele>\n')
+        for i, reb in enumerate(rebs):
+            parts.append(f'<r_ele>\n<reb>{reb}</reb>\n')
+            if kebs and len(kebs) > 1 and i == 0 and rng.random() < 0.2:
+                parts.append(f'<re_restr>{kebs[0]}</re_restr>\n')
+            if i:
+                parts.append(f'<re_restr>{kebs[-1]}</re_restr>\n'
+                             if rng.random() < 0.5 else
+                             f'<re_inf>&{rng.choice(("ik", "ok", "gikun", "sk"))};</re_inf>\n')
+            elif common:
+                parts.append(f'<re_pri>{rng.choice(_PRIORITY_CODES)}</re_pri>\n')
+            parts.append('</r_ele>\n')
+        return ''.join(parts)
+
+    def _gloss(self, pos):
+        rng = self.rng
+        words = ' '.join(self.vocabulary.pick(rng, rng.choice((1, 1, 2, 2, 3))))
+        if pos.startswith('v'):
+            return 'to ' + words
+        if rng.random() < 0.1:
+            return f'({self.vocabulary.pick(rng)[0]}) {words}'
+        return words
+
+    def _xref(self):
+        rng = self.rng
+        word = rng.choice(self.recent)
+        head = word.kebs[0] if word.kebs else word.rebs[0]
+        shape = rng.random()
+        if shape < 0.4 or not word.kebs:
+            return head
+        if shape < 0.8:
+            return f'{head}・{word.rebs[0]}'
+        return f'{head}・{word.rebs[0]}・{rng.randint(1, word.sense_count)}'
+
+    def _senses_xml(self, kebs, rebs, pos, loanword):
+        rng = self.rng
+        sense_count = rng.choices((1, 2, 3, 4), (60, 25, 10, 5))[0]
+        parts = []
+        for i in range(sense_count):
+            parts.append('<sense>\n')
+            if i and len(kebs) > 1 and rng.random() < 0.3:
+                parts.append(f'<stagk>{kebs[0]}</stagk>\n')
+            if i and len(rebs) > 1 and rng.random() < 0.3:
+                parts.append(f'<stagr>{rebs[0]}</stagr>\n')
+            if i == 0 or rng.random() < 0.3:
+                parts.append(f'<pos>&{pos};</pos>\n')
+                if pos == 'vs' and rng.random() < 0.5:
+                    parts.append('<pos>&vt;</pos>\n')
+                elif pos.startswith('v5') or pos == 'v1':
+                    parts.append(f'<pos>&{rng.choice(("vt", "vi"))};</pos>\n')
+            if self.recent and rng.random() < 0.08:
+                parts.append(f'<xref>{self._xref()}</xref>\n')
+            if self.recent and rng.random() < 0.01:
+                parts.append(f'<ant>{self._xref()}</ant>\n')
+            if rng.random() < 0.05:
+                parts.append(f'<field>&{rng.choice(("comp", "food", "ling", "math", "med", "sports"))};</field>\n')
+            if rng.random() < 0.1:
+                misc = 'uk' if kebs and rng.random() < 0.5 else rng.choice(
+                    ('abbr', 'arch', 'col', 'hon', 'hum', 'on-mim', 'pol', 'sl', 'yoji'))
+                parts.append(f'<misc>&{misc};</misc>\n')
+            if rng.random() < 0.05:
+                parts.append(f'<s_inf>{escape(self._gloss("n"))}</s_inf>\n')
+            if loanword and i == 0:
+                lang, attrs = 'eng', ''
+                if rng.random() < 0.2:
+                    lang = rng.choice(('ger', 'fre', 'dut', 'por'))
+                if rng.random() < 0.1:
+                    attrs += ' ls_type="part"'
+                if rng.random() < 0.05:
+                    attrs += ' ls_wasei="y"'
+                text = self.vocabulary.pick(rng)[0]
+                parts.append(f'<lsource xml:lang="{lang}"{attrs}>{text}</lsource>\n')
+            if rng.random() < 0.02:
+                parts.append(f'<dial>&{rng.choice(("ksb", "kyb", "osb"))};</dial>\n')
+            for _ in range(rng.choices((1, 2, 3, 4), (45, 30, 15, 10))[0]):
+                g_type = ''
+                if rng.random() < 0.02:
+                    g_type = f' g_type="{rng.choice(("expl", "lit", "fig"))}"'
+                parts.append(f'<gloss{g_type}>{escape(self._gloss(pos))}</gloss>\n')
+            parts.append('</sense>\n')
+        for lang, share in _SENSE_LANGS:
+            if rng.random() < share * 0.75:
+                vocabulary = self.sense_vocabularies[lang]
+                for _ in range(rng.choice((1, 1, 2))):
+                    glosses = ''.join(
+                        f'<gloss xml:lang="{lang}">'
+                        f'{escape(" ".join(vocabulary.pick(rng, rng.choice((1, 2)))))}</gloss>\n'
+                        for _ in range(rng.choice((1, 2, 3)))
+                    )
+                    parts.append(f'<sense>\n{glosses}</sense>\n')
+        return ''.join(parts), sense_count
+
+    def entry(self, seq):
+        """Entry XML for seq, or None when the headword drawn was a duplicate."""
+        headword = self._headword()
+        if headword is None:
+            return None
+        kebs, rebs, pos = headword
+        loanword = not kebs and rebs[0][0] >= 'ァ'
+        forms = self._forms_xml(kebs, rebs, pos)
+        senses, sense_count = self._senses_xml(kebs, rebs, pos, loanword)
+
+        word = _Word()
+        word.seq, word.kebs, word.rebs, word.pos, word.sense_count = (
+            seq, kebs, rebs, pos, sense_count)
+        self._keep(word)
+        return f'<entry>\n<ent_seq>{seq}</ent_seq>\n{forms}{senses}</entry>\n'
+
+    def _keep(self, word):
+        self.count += 1
+        self.recent.append(word)
+        if len(self.recent) > _RECENT_SIZE:
+            self.recent.pop(0)
+        if len(self.reservoir) < _RESERVOIR_SIZE:
+            self.reservoir.append(word)
+        else:
+            slot = self.rng.randrange(self.count)
+            if slot < _RESERVOIR_SIZE:
+                self.reservoir[slot] = word
+
+
+def write_jmdict(path, rng, entries, kanji, vocabulary, sense_vocabularies):
+    writer = _JMdictWriter(rng, kanji, vocabulary, sense_vocabularies)
+    handles = _open_gzip_text(path)
+    f = handles[0]
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    f.write(_JMDICT_DTD.format(entities=_entities_block(_JMDICT_ENTITIES)))
+    f.write('<JMdict>\n')
+    seq = _JMDICT_SEQ
+    attempts = 0
+    while writer.count < entries:
+        attempts += 1
+        if attempts > entries * 20:
+            raise SystemExit(f'could not draw {entries} distinct words from {len(kanji)} '
+                             'kanji; raise --kanji')
+        xml = writer.entry(seq)
+        if xml is None:
+            continue
+        f.write(xml)
+        seq += rng.choice((1, 1, 1, 2, 5, 10))
+        if writer.count % 100000 == 0:
+            print(f'  {writer.count} JMdict entries…', flush=True)
+    f.write('</JMdict>\n')
+    _close_gzip_text(handles)
+    return writer.reservoir
+
+
+# ---------------------------------------------------------------------------
+# JMnedict
+# ---------------------------------------------------------------------------
+
+_NAME_TYPES = (('surname', 35), ('place', 20), ('given', 10), ('fem', 8), ('masc', 8),
+               ('person', 6), ('unclass', 4), ('company', 3), ('station', 2),
+               ('organization', 2), ('product', 1), ('work', 1))
+
+
+def write_jmnedict(path, rng, names, kanji, vocabulary):
+    types, weights = zip(*_NAME_TYPES)
+    handles = _open_gzip_text(path)
+    f = handles[0]
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    f.write(_JMNEDICT_DTD.format(entities=_entities_block(_JMNEDICT_ENTITIES)))
+    f.write('<JMnedict>\n')
+    for i in range(names):
+        name_types = list(dict.fromkeys(rng.choices(types, weights, k=rng.choice((1, 1, 1, 2)))))
+        if rng.random() < 0.06:
+            reb = hira_to_kata(_kana(rng, rng.choice((2, 3, 4))))
+            kebs = []
+            det = vocabulary.pick(rng)[0].capitalize()
+        else:
+            keb, reb = _on_compound(rng, kanji, rng.choice((1, 2, 2, 2, 3)))
+            if rng.random() < 0.4:
+                word = _kun_word(rng, kanji)
+                if word is not None and word[2] == 'n':
+                    keb, reb = word[0], word[1]
+            kebs = [keb]
+            det = _romaji(reb).capitalize()
+        parts = [f'<entry>\n<ent_seq>{_JMNEDICT_SEQ + i}</ent_seq>\n']
+        for keb in kebs:
+            parts.append(f'<k_ele>\n<keb>{keb}</keb>\n</k_ele>\n')
+        parts.append(f'<r_ele>\n<reb>{reb}</reb>\n</r_ele>\n<trans>\n')
+        for name_type in name_types:
+            parts.append(f'<name_type>&{name_type};</name_type>\n')
+        parts.append(f'<trans_det>{escape(det)}</trans_det>\n</trans>\n</entry>\n')
+        f.write(''.join(parts))
+        if (i + 1) % 100000 == 0:
+            print(f'  {i + 1} JMnedict entries…', flush=True)
+    f.write('</JMnedict>\n')
+    _close_gzip_text(handles)
+
+
+# ---------------------------------------------------------------------------
+# Tatoeba
+# ---------------------------------------------------------------------------
+
+def _conjugated(rng, word):
+    """(surface, expression) of a word as it appears in a sentence; expression is
+    None when the dictionary form is used."""
+    writing = word.kebs[0] if word.kebs else word.rebs[0]
+    if rng.random() > 0.3:
+        return writing, None
+    if word.pos == 'v1':
+        surface = writing[:-1] + 'ました'
+    elif word.pos.startswith('v5') and writing[-1] in _GODAN_STEM:
+        surface = writing[:-1] + _GODAN_STEM[writing[-1]] + 'ます'
+    elif word.pos == 'adj-i':
+        surface = writing[:-1] + 'かった'
+    elif word.pos == 'vs':
+        surface = writing + 'した'
+    else:
+        return writing, None
+    return surface, surface
+
+
+def _sentence(rng, words):
+    """(text, b_line) for one Japanese sentence over words (a _Zipf of _Word)."""
+    text = []
+    tokens = []
+    for word in words.pick(rng, rng.randint(2, 7)):
+        surface, expression = _conjugated(rng, word)
+        token = word.kebs[0] if word.kebs else word.rebs[0]
+        r = rng.random()
+        if r < 0.05:
+            token += f'(#{word.seq})'
+        elif word.kebs and r < 0.35:
+            token += f'({word.rebs[0]})'
+        if word.sense_count > 1 and rng.random() < 0.2:
+            token += f'[{rng.randint(1, word.sense_count):02d}]'
+        if expression:
+            token += '{' + expression + '}'
+        if rng.random() < 0.85:
+            token += '~'
+        tokens.append(token)
+        text.append(surface)
+        if expression is None:
+            particle = rng.choice(_PARTICLES)
+            text.append(particle)
+            tokens.append(particle)
+    text.append(rng.choice(_ENDINGS))
+    return ''.join(text), ' '.join(tokens)
+
+
+def _translation(rng, vocabulary):
+    words = vocabulary.pick(rng, rng.randint(3, 12))
+    return ' '.join(words).capitalize() + rng.choice(('.', '.', '.', '?', '!'))
+
+
+def write_tatoeba(tatoeba_dir, rng, sentences, langs, words, vocabulary):
+    os.makedirs(tatoeba_dir, exist_ok=True)
+    words = _Zipf(words)
+    jpn = bz2.open(os.path.join(tatoeba_dir, 'jpn_sentences.tsv.bz2'), 'wt', encoding='utf-8')
+    indices_csv = os.path.join(tatoeba_dir, 'jpn_indices.csv.tmp')
+    indices = open(indices_csv, 'w', encoding='utf-8')
+    links = {}
+    texts = {}
+    for lang in langs:
+        links[lang] = bz2.open(os.path.join(tatoeba_dir, f'jpn-{lang}_links.tsv.bz2'),
+                               'wt', encoding='utf-8')
+        texts[lang] = bz2.open(os.path.join(tatoeba_dir, f'{lang}_sentences.tsv.bz2'),
+                               'wt', encoding='utf-8')
+
+    # One id space for every language, allocated in order, so each export comes
+    # out sorted by id as the upstream ones are.
+    ids = itertools.count(1)
+    for i in range(sentences):
+        sentence_id = next(ids)
+        text, b_line = _sentence(rng, words)
+        jpn.write(f'{sentence_id}\tjpn\t{text}\n')
+        meaning_id = -1
+        for lang in langs:
+            if rng.random() >= _TRANSLATION_SHARE.get(lang, 0.2):
+                continue
+            for _ in range(rng.choice((1, 1, 1, 2))):
+                translation_id = next(ids)
+                if meaning_id < 0 and lang == 'eng':
+                    meaning_id = translation_id
+                links[lang].write(f'{sentence_id}\t{translation_id}\n')
+                texts[lang].write(f'{translation_id}\t{lang}\t{_translation(rng, vocabulary)}\n')
+        if rng.random() < 0.9:
+            indices.write(f'{sentence_id}\t{meaning_id}\t{b_line}\n')
+        if (i + 1) % 100000 == 0:
+            print(f'  {i + 1} Tatoeba sentences…', flush=True)
+
+    jpn.close()
+    indices.close()
+    for lang in langs:
+        links[lang].close()
+        texts[lang].close()
+    with tarfile.open(os.path.join(tatoeba_dir, 'jpn_indices.tar.bz2'), 'w:bz2') as tf:
+        info = tf.gettarinfo(indices_csv, arcname='jpn_indices.csv')
+        info.mtime = 0
+        with open(indices_csv, 'rb') as f:
+            tf.addfile(info, f)
+    os.unlink(indices_csv)
+    with open(os.path.join(tatoeba_dir, '_jpn_dir.html'), 'w', encoding='utf-8') as f:
+        f.write('<html><body>\n')
+        for lang in langs:
+            f.write(f'<a href="jpn-{lang}_links.tsv.bz2">jpn-{lang}_links.tsv.bz2</a>\n')
+        f.write('</body></html>\n')
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def generate(cache_dir, entries, names, kanji_count, sentences, langs, seed, only):
+    params = {'seed': seed, 'entries': entries, 'names': names, 'kanji': kanji_count,
+              'sentences': sentences, 'langs': langs}
+    # Every source draws from its own generator, so regenerating one with --only
+    # gives the same file as a full run.
+    rngs = {name: random.Random(f'{seed}:{name}') for name in SOURCES + ('kanji', 'vocabulary')}
+    vocabulary = _vocabulary(rngs['vocabulary'], max(5000, entries // 4))
+    kanji = _make_kanji(rngs['kanji'], kanji_count, vocabulary)
+
+    if 'kanjidic2' in only:
+        path = os.path.join(cache_dir, 'kanjidic2', 'kanjidic2.xml.gz')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        print(f'KANJIDIC2: {kanji_count} characters → {path}', flush=True)
+        write_kanjidic2(path, kanji)
+        _mark_synthetic(path, params)
+
+    if 'jmnedict' in only:
+        path = os.path.join(cache_dir, 'jmnedict', 'JMnedict.xml.gz')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        print(f'JMnedict: {names} entries → {path}', flush=True)
+        write_jmnedict(path, rngs['jmnedict'], names, kanji, vocabulary)
+        _mark_synthetic(path, params)
+
+    if 'jmdict' in only or 'tatoeba' in only:
+        sense_vocabularies = {
+            lang: _vocabulary(random.Random(f'{seed}:vocabulary:{lang}'), 5000)
+            for lang, _ in _SENSE_LANGS
+        }
+        # Tatoeba sentences are built from JMdict words, so JMdict is generated
+        # even when only Tatoeba is asked for; it is just not kept.
+        path = os.path.join(cache_dir, 'jmdict', 'JMdict.gz')
+        keep = 'jmdict' in only
+        if not keep:
+            path = os.path.join(cache_dir, 'tatoeba', '_JMdict.gz.tmp')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        print(f'JMdict: {entries} entries → {path}', flush=True)
+        words = write_jmdict(path, rngs['jmdict'], entries, kanji, vocabulary,
+                             sense_vocabularies)
+        if keep:
+            _mark_synthetic(path, params)
+        else:
+            os.unlink(path)
+
+        if 'tatoeba' in only:
+            tatoeba_dir = os.path.join(cache_dir, 'tatoeba')
+            print(f'Tatoeba: {sentences} sentences, languages {" ".join(langs)} → '
+                  f'{tatoeba_dir}', flush=True)
+            # Zipf ranks follow reservoir order, which follows seq; shuffle first.
+            rngs['tatoeba'].shuffle(words)
+            write_tatoeba(tatoeba_dir, rngs['tatoeba'], sentences, langs, words, vocabulary)
+    print('Done.', flush=True)
+
+
+def main(argv):
+    cache_dir = ''
+    entries = 10000
+    names = kanji_count = sentences = None
+    langs = []
+    only = []
+    seed = 1
+    try:
+        opts, _ = getopt.getopt(
+            argv, 'hn:',
+            ['cache=', 'entries=', 'names=', 'kanji=', 'sentences=', 'lang=', 'only=', 'seed='],
+        )
+    except getopt.GetoptError:
+        print(HELP)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(HELP)
+            sys.exit()
+        elif opt == '--cache':
+            cache_dir = os.path.expanduser(arg)
+        elif opt in ('-n', '--entries'):
+            entries = int(arg)
+        elif opt == '--names':
+            names = int(arg)
+        elif opt == '--kanji':
+            kanji_count = int(arg)
+        elif opt == '--sentences':
+            sentences = int(arg)
+        elif opt == '--lang':
+            langs.append(arg)
+        elif opt == '--only':
+            if arg not in SOURCES:
+                print(HELP)
+                sys.exit(2)
+            only.append(arg)
+        elif opt == '--seed':
+            seed = int(arg)
+    if not cache_dir:
+        print(HELP)
+        sys.exit(2)
+
+    generate(
+        cache_dir, entries,
+        names if names is not None else 3 * entries,
+        min(_CJK_LAST - _CJK_FIRST + 1,
+            kanji_count if kanji_count is not None else min(20000, max(500, entries // 10))),
+        sentences if sentences is not None else entries,
+        langs or ['eng', 'fra', 'deu'],
+        seed,
+        only or list(SOURCES),
+    )
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -4,6 +4,12 @@
 Reads JSON files produced by xml-to-git.py and writes the same SQLite
 databases that sumatora-index.py used to produce in a single pass.
 
+With -j/--jobs N, entry and proper noun files are parsed on N worker processes
+(sumatora_common.iter_parsed), which also compute the FTS suffix "parts" strings,
+and the parent writes the finished rows to jmdict.db _BATCH_SIZE at a time. Each
+{lang}.db is a separate file, so every language is written start to finish
+(inserts, FTS rebuild, VACUUM) by its own process while jmdict.db is built.
+
 This program is free software: you can redistribute it and/or modify it under
 the terms of the GNU General Public License as published by the Free Software
 Foundation, either version 3 of the License, or (at your option) any later
@@ -14,6 +20,7 @@ __author__ = "Nicolas Centa"
 __license__ = "GPLv3"
 __version__ = "0.1.0"
 
+import concurrent.futures
 import getopt
 import json
 import os
@@ -21,6 +28,11 @@ import sqlite3
 import sys
 import time
 
+from sumatora_common import iter_parsed
+
+# Rows per executemany call.
+_BATCH_SIZE = 2000
+
 
 # ---------------------------------------------------------------------------
 # Kana normalisation (replaces romkan)
@@ -73,7 +85,7 @@ class SumatoraDB:
         self._jmcur.execute('PRAGMA journal_mode=DELETE')
         self._jmcur.execute('BEGIN TRANSACTION')
 
-        self._trans = {}   # lang -> (conn, cur)
+        self._pending = {}  # INSERT sql -> rows not yet written
 
     # -- jmdict.db ----------------------------------------------------------
 
@@ -134,23 +146,10 @@ class SumatoraDB:
             entities.items(),
         )
 
-    def insert_proper_noun(self, seq, readings, writings, types_json,
-                           translations_json):
-        r_kata = to_kana(readings)
-        self._jmcur.execute(
-            'INSERT INTO ProperNounIndex '
-            '(rowid, readingsKana, readingsKanaParts, writings, writingsParts) '
-            'VALUES (?, ?, ?, ?, ?)',
-            (seq,
-             r_kata, calculate_parts_kana(readings),
-             writings, calculate_parts(writings)),
-        )
-        self._jmcur.execute(
-            'INSERT INTO ProperNounEntry '
-            '(seq, readings, writings, types, translations) '
-            'VALUES (?, ?, ?, ?, ?)',
-            (seq, readings, writings, types_json, translations_json),
-        )
+    def add_proper_noun(self, rows):
+        """Queue the (ProperNounIndex, ProperNounEntry) rows of one proper noun."""
+        self._queue(_NOUN_INDEX_SQL, rows[0])
+        self._queue(_NOUN_ENTRY_SQL, rows[1])
 
     def insert_control(self, entry_count):
         rows = [
@@ -163,83 +162,101 @@ class SumatoraDB:
             rows,
         )
 
-    def insert_entry(self, seq, readings_prio, readings, writings_prio,
-                     writings, pos, xref, ant, misc, lsource, dial, s_inf,
-                     field, kanji_data, kana_data, stagk, stagr, furigana,
-                     rules, score):
-        rp_kata = to_kana(readings_prio)
-        r_kata = to_kana(readings)
-        self._jmcur.execute(
-            'INSERT INTO DictionaryIndex '
-            '(rowid, readingsPrioKana, readingsPrioKanaParts, '
-            'readingsKana, readingsKanaParts, '
-            'writingsPrio, writingsPrioParts, writings, writingsParts) '
-            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-            (seq,
-             rp_kata, calculate_parts_kana(readings_prio),
-             r_kata, calculate_parts_kana(readings),
-             writings_prio, calculate_parts(writings_prio),
-             writings, calculate_parts(writings)),
-        )
-        self._jmcur.execute(
-            'INSERT INTO DictionaryEntry '
-            '(seq, readingsPrio, readings, writingsPrio, writings, '
-            'pos, xref, ant, misc, lsource, dial, s_inf, field, '
-            'kanjiData, kanaData, stagk, stagr, furigana, rules, score) '
-            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-            (seq, readings_prio, readings, writings_prio, writings,
-             pos, xref, ant, misc, lsource, dial, s_inf, field,
-             kanji_data, kana_data, stagk, stagr, furigana, rules, score),
-        )
+    def add_entry(self, rows):
+        """Queue the (DictionaryIndex, DictionaryEntry) rows of one entry."""
+        self._queue(_ENTRY_INDEX_SQL, rows[0])
+        self._queue(_ENTRY_SQL, rows[1])
 
-    # -- per-language translation DBs ----------------------------------------
+    def _queue(self, sql, row):
+        rows = self._pending.setdefault(sql, [])
+        rows.append(row)
+        if len(rows) >= _BATCH_SIZE:
+            self.flush()
 
-    def _ensure_lang(self, lang):
-        if lang in self._trans:
-            return
-        conn = sqlite3.connect(
-            os.path.join(self.folder, f'{lang}.db'), isolation_level=None,
-        )
-        cur = conn.cursor()
-        cur.execute('PRAGMA journal_mode=DELETE')
-        cur.execute('BEGIN TRANSACTION')
-        cur.execute('DROP TABLE IF EXISTS DictionaryTranslation')
-        cur.execute('DROP TABLE IF EXISTS DictionaryTranslationIndex')
-        cur.execute(
-            'CREATE TABLE DictionaryTranslation '
-            '(seq INTEGER, gloss_id INTEGER, '
-            'gloss TEXT, PRIMARY KEY (seq, gloss_id))'
-        )
-        cur.execute(
-            'CREATE VIRTUAL TABLE DictionaryTranslationIndex '
-            'USING fts5(gloss, content="DictionaryTranslation")'
-        )
-        self._trans[lang] = (conn, cur)
-
-    def insert_translation(self, lang, seq, glosses):
-        self._ensure_lang(lang)
-        _, cur = self._trans[lang]
-        for i, sense_glosses in enumerate(glosses):
-            cur.execute(
-                'INSERT INTO DictionaryTranslation '
-                '(seq, gloss_id, gloss) VALUES (?, ?, ?)',
-                (seq, i, ', '.join(sense_glosses)),
-            )
+    def flush(self):
+        for sql, rows in self._pending.items():
+            self._jmcur.executemany(sql, rows)
+        self._pending = {}
 
     # -- close ---------------------------------------------------------------
 
     def close(self):
+        self.flush()
         self._jmcur.execute('COMMIT')
         self._jmconn.execute('VACUUM')
         self._jmconn.close()
 
-        for lang, (conn, cur) in self._trans.items():
-            cur.execute(
-                "INSERT INTO DictionaryTranslationIndex(DictionaryTranslationIndex) VALUES('rebuild')"
-            )
-            cur.execute('COMMIT')
-            conn.execute('VACUUM')
-            conn.close()
+
+_ENTRY_INDEX_SQL = (
+    'INSERT INTO DictionaryIndex '
+    '(rowid, readingsPrioKana, readingsPrioKanaParts, '
+    'readingsKana, readingsKanaParts, '
+    'writingsPrio, writingsPrioParts, writings, writingsParts) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+_ENTRY_SQL = (
+    'INSERT INTO DictionaryEntry '
+    '(seq, readingsPrio, readings, writingsPrio, writings, '
+    'pos, xref, ant, misc, lsource, dial, s_inf, field, '
+    'kanjiData, kanaData, stagk, stagr, furigana, rules, score) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+_NOUN_INDEX_SQL = (
+    'INSERT INTO ProperNounIndex '
+    '(rowid, readingsKana, readingsKanaParts, writings, writingsParts) '
+    'VALUES (?, ?, ?, ?, ?)'
+)
+_NOUN_ENTRY_SQL = (
+    'INSERT INTO ProperNounEntry '
+    '(seq, readings, writings, types, translations) '
+    'VALUES (?, ?, ?, ?, ?)'
+)
+
+
+# ---------------------------------------------------------------------------
+# Per-language translation DBs
+# ---------------------------------------------------------------------------
+
+def write_translation_db(folder, lang, lang_dir):
+    """Write {lang}.db from the translations/{lang}/ files and return how many
+    there were. Runs in its own process when --jobs > 1."""
+    conn = sqlite3.connect(os.path.join(folder, f'{lang}.db'), isolation_level=None)
+    cur = conn.cursor()
+    cur.execute('PRAGMA journal_mode=DELETE')
+    cur.execute('BEGIN TRANSACTION')
+    cur.execute('DROP TABLE IF EXISTS DictionaryTranslation')
+    cur.execute('DROP TABLE IF EXISTS DictionaryTranslationIndex')
+    cur.execute(
+        'CREATE TABLE DictionaryTranslation '
+        '(seq INTEGER, gloss_id INTEGER, '
+        'gloss TEXT, PRIMARY KEY (seq, gloss_id))'
+    )
+    cur.execute(
+        'CREATE VIRTUAL TABLE DictionaryTranslationIndex '
+        'USING fts5(gloss, content="DictionaryTranslation")'
+    )
+    insert = 'INSERT INTO DictionaryTranslation (seq, gloss_id, gloss) VALUES (?, ?, ?)'
+    rows = []
+    count = 0
+    for path in iter_json_files(lang_dir):
+        with open(path, encoding='utf-8') as f:
+            t = json.load(f)
+        rows.extend(
+            (t['seq'], i, ', '.join(sense_glosses))
+            for i, sense_glosses in enumerate(t['glosses'])
+        )
+        count += 1
+        if len(rows) >= _BATCH_SIZE:
+            cur.executemany(insert, rows)
+            rows = []
+    cur.executemany(insert, rows)
+    cur.execute(
+        "INSERT INTO DictionaryTranslationIndex(DictionaryTranslationIndex) VALUES('rebuild')"
+    )
+    cur.execute('COMMIT')
+    conn.execute('VACUUM')
+    conn.close()
+    return count
 
 
 # ---------------------------------------------------------------------------
@@ -299,7 +316,15 @@ def _kana_data_json(kana_list):
 # Cross-reference resolution
 # ---------------------------------------------------------------------------
 
-def build_xref_index(entries_dir):
+def _entry_forms(path):
+    with open(path, encoding='utf-8') as f:
+        entry = json.load(f)
+    return (entry['seq'],
+            [k['text'] for k in entry.get('kanji', [])],
+            [k['text'] for k in entry.get('kana', [])])
+
+
+def build_xref_index(entries_dir, jobs=1):
     """Scan all entry JSON files and return (kanji_to_seqs, kana_to_seqs).
 
     Each dict maps a headword text to the sorted list of seq numbers that
@@ -307,14 +332,11 @@ def build_xref_index(entries_dir):
     """
     kanji_to_seqs = {}
     kana_to_seqs = {}
-    for path in iter_json_files(entries_dir):
-        with open(path, encoding='utf-8') as f:
-            entry = json.load(f)
-        seq = entry['seq']
-        for k in entry.get('kanji', []):
-            kanji_to_seqs.setdefault(k['text'], []).append(seq)
-        for k in entry.get('kana', []):
-            kana_to_seqs.setdefault(k['text'], []).append(seq)
+    for seq, kanji, kana in iter_parsed(iter_json_files(entries_dir), _entry_forms, jobs):
+        for text in kanji:
+            kanji_to_seqs.setdefault(text, []).append(seq)
+        for text in kana:
+            kana_to_seqs.setdefault(text, []).append(seq)
     return kanji_to_seqs, kana_to_seqs
 
 
@@ -519,7 +541,74 @@ def iter_json_files(directory):
                 yield os.path.join(root, name)
 
 
-def process(git_dir, output_dir, nedict_dir=None):
+# Set in each worker by _init_entry_worker; build_sense_fields() needs it.
+_XREF_INDEX = None
+
+
+def _init_entry_worker(xref_index):
+    global _XREF_INDEX
+    _XREF_INDEX = xref_index
+
+
+def _entry_rows(path):
+    """(DictionaryIndex row, DictionaryEntry row) for one entry file."""
+    with open(path, encoding='utf-8') as f:
+        entry = json.load(f)
+
+    seq = entry['seq']
+    senses = entry.get('senses', [])
+    rp, r, wp, w = build_readings_writings(entry)
+    pos, xref, ant, misc, lsrc, dial, sinf, field, stagk, stagr = \
+        build_sense_fields(senses, _XREF_INDEX)
+    kanji_list = entry.get('kanji', [])
+    furigana_map = {k['text']: k['furigana'] for k in kanji_list if k.get('furigana') is not None}
+    furigana = json.dumps(furigana_map, ensure_ascii=False) if furigana_map else None
+    kana_list = entry.get('kana', [])
+    kanji_data = _kanji_data_json(kanji_list)
+    kana_data = _kana_data_json(kana_list)
+    rules = derive_rules(senses)
+    score = compute_score(kanji_list, kana_list)
+
+    index_row = (seq,
+                 to_kana(rp), calculate_parts_kana(rp),
+                 to_kana(r), calculate_parts_kana(r),
+                 wp, calculate_parts(wp),
+                 w, calculate_parts(w))
+    entry_row = (seq, rp, r, wp, w, pos, xref, ant, misc,
+                 lsrc, dial, sinf, field, kanji_data, kana_data,
+                 stagk, stagr, furigana, rules, score)
+    return index_row, entry_row
+
+
+def _proper_noun_rows(path):
+    """(ProperNounIndex row, ProperNounEntry row) for one gitnedict entry file."""
+    with open(path, encoding='utf-8') as f:
+        entry = json.load(f)
+    seq = entry['seq']
+    readings = ' '.join(k['text'] for k in entry.get('kana', []))
+    writings = ' '.join(k['text'] for k in entry.get('kanji', []))
+    types = entry.get('types', [])
+    translations = entry.get('translations', [])
+    types_json = json.dumps(types, ensure_ascii=False) if types else None
+    translations_json = (
+        json.dumps(translations, ensure_ascii=False) if translations else None
+    )
+    index_row = (seq,
+                 to_kana(readings), calculate_parts_kana(readings),
+                 writings, calculate_parts(writings))
+    return index_row, (seq, readings, writings, types_json, translations_json)
+
+
+def _translation_langs(trans_dir):
+    if not os.path.isdir(trans_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(trans_dir)
+        if os.path.isdir(os.path.join(trans_dir, name))
+    )
+
+
+def process(git_dir, output_dir, nedict_dir=None, jobs=1):
     metadata_path = os.path.join(git_dir, 'metadata.json')
     with open(metadata_path, encoding='utf-8') as f:
         metadata = json.load(f)
@@ -528,71 +617,43 @@ def process(git_dir, output_dir, nedict_dir=None):
     db.create_jmdict_tables()
     db.insert_entities(metadata.get('entities', {}))
 
+    # -- translations -------------------------------------------------------
+    # Started first: each {lang}.db is written by its own process while this
+    # one builds jmdict.db. With one job they are written inline at the end.
+    trans_dir = os.path.join(git_dir, 'translations')
+    langs = _translation_langs(trans_dir)
+    trans_pool = None
+    trans_futures = {}
+    if jobs > 1 and langs:
+        trans_pool = concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(langs)))
+        trans_futures = {
+            lang: trans_pool.submit(write_translation_db, output_dir, lang,
+                                    os.path.join(trans_dir, lang))
+            for lang in langs
+        }
+
     # -- entries -----------------------------------------------------------
     entries_dir = os.path.join(git_dir, 'entries')
     print('Building xref index…', flush=True)
-    xref_index = build_xref_index(entries_dir)
+    xref_index = build_xref_index(entries_dir, jobs)
     print(f'  {len(xref_index[0])} kanji forms, {len(xref_index[1])} kana forms indexed', flush=True)
 
     entry_count = 0
-    for path in iter_json_files(entries_dir):
-        with open(path, encoding='utf-8') as f:
-            entry = json.load(f)
-
-        seq = entry['seq']
-        senses = entry.get('senses', [])
-        rp, r, wp, w = build_readings_writings(entry)
-        pos, xref, ant, misc, lsrc, dial, sinf, field, stagk, stagr = \
-            build_sense_fields(senses, xref_index)
-        kanji_list = entry.get('kanji', [])
-        furigana_map = {k['text']: k['furigana'] for k in kanji_list if k.get('furigana') is not None}
-        furigana = json.dumps(furigana_map, ensure_ascii=False) if furigana_map else None
-        kana_list = entry.get('kana', [])
-        kanji_data = _kanji_data_json(kanji_list)
-        kana_data = _kana_data_json(kana_list)
-        rules = derive_rules(senses)
-        score = compute_score(kanji_list, kana_list)
-
-        db.insert_entry(seq, rp, r, wp, w, pos, xref, ant, misc,
-                        lsrc, dial, sinf, field, kanji_data, kana_data,
-                        stagk, stagr, furigana, rules, score)
+    for rows in iter_parsed(iter_json_files(entries_dir), _entry_rows, jobs,
+                            initializer=_init_entry_worker, initargs=(xref_index,)):
+        db.add_entry(rows)
         entry_count += 1
         if entry_count % 10000 == 0:
             print(f'  {entry_count} entries inserted…', flush=True)
 
     print(f'Entries done: {entry_count}', flush=True)
 
-    # -- translations -------------------------------------------------------
-    trans_dir = os.path.join(git_dir, 'translations')
-    trans_count = 0
-    for path in iter_json_files(trans_dir):
-        with open(path, encoding='utf-8') as f:
-            t = json.load(f)
-        db.insert_translation(t['lang'], t['seq'], t['glosses'])
-        trans_count += 1
-        if trans_count % 50000 == 0:
-            print(f'  {trans_count} translation files inserted…', flush=True)
-
-    print(f'Translations done: {trans_count}', flush=True)
-
     # -- proper nouns (optional) --------------------------------------------
     if nedict_dir:
         nedict_entries_dir = os.path.join(nedict_dir, 'entries')
         noun_count = 0
-        for path in iter_json_files(nedict_entries_dir):
-            with open(path, encoding='utf-8') as f:
-                entry = json.load(f)
-            seq = entry['seq']
-            readings = ' '.join(k['text'] for k in entry.get('kana', []))
-            writings = ' '.join(k['text'] for k in entry.get('kanji', []))
-            types = entry.get('types', [])
-            translations = entry.get('translations', [])
-            types_json = json.dumps(types, ensure_ascii=False) if types else None
-            translations_json = (
-                json.dumps(translations, ensure_ascii=False) if translations else None
-            )
-            db.insert_proper_noun(seq, readings, writings, types_json,
-                                  translations_json)
+        for rows in iter_parsed(iter_json_files(nedict_entries_dir), _proper_noun_rows, jobs):
+            db.add_proper_noun(rows)
             noun_count += 1
             if noun_count % 10000 == 0:
                 print(f'  {noun_count} proper nouns inserted…', flush=True)
@@ -600,20 +661,33 @@ def process(git_dir, output_dir, nedict_dir=None):
 
     db.insert_control(entry_count)
     db.close()
+
+    trans_count = 0
+    for lang in langs:
+        if trans_pool is not None:
+            count = trans_futures[lang].result()
+        else:
+            count = write_translation_db(output_dir, lang, os.path.join(trans_dir, lang))
+        print(f'  {lang}.db: {count} translation files', flush=True)
+        trans_count += count
+    if trans_pool is not None:
+        trans_pool.shutdown()
+    print(f'Translations done: {trans_count}', flush=True)
     print(f'Databases written to {output_dir}', flush=True)
 
 
 HELP = ('usage: git-to-sqlite.py '
         '-i <gitmdict directory> -o <output directory> '
-        '[--nedict <gitnedict directory>]')
+        '[--nedict <gitnedict directory>] [-j|--jobs <n>]')
 
 
 def main(argv):
     git_dir = ''
     output_dir = ''
     nedict_dir = None
+    jobs = 1
     try:
-        opts, _ = getopt.getopt(argv, 'hi:o:', ['idir=', 'odir=', 'nedict='])
+        opts, _ = getopt.getopt(argv, 'hi:o:j:', ['idir=', 'odir=', 'nedict=', 'jobs='])
     except getopt.GetoptError:
         print(HELP)
         sys.exit(2)
@@ -627,10 +701,12 @@ def main(argv):
             output_dir = arg
         elif opt == '--nedict':
             nedict_dir = arg
+        elif opt in ('-j', '--jobs'):
+            jobs = int(arg)
     if not git_dir or not output_dir:
         print(HELP)
         sys.exit(2)
-    process(git_dir, output_dir, nedict_dir)
+    process(git_dir, output_dir, nedict_dir, jobs)
 
 
 if __name__ == '__main__':
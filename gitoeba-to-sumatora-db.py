@@ -5,17 +5,31 @@ __author__ = "Nicolas Centa"
 __license__ = "GPLv3"
 __version__ = "0.1.0"
 
+import concurrent.futures
 import getopt
+import hashlib
+import heapq
 import json
 import os
 import sys
 from collections import defaultdict
 
 import sumatora_schema
-from sumatora_common import iter_json_files
+from sumatora_common import ProfilePass, iter_json_files, iter_parsed, read_json
 
 _KANA_COL = 20
 
+# Must match tatoeba-to-git.py's SHARD_SIZE: sentences/<id // SHARD_SIZE>/<id>.json.
+SHARD_SIZE = 10000
+
+# Sentences per task sent to a --jobs segmentation worker; large enough that
+# pickling overhead is noise next to MeCab, small enough to keep workers busy.
+_SEGMENT_BATCH = 256
+
+# Bump when _reading_of() or _sentence_segments() change what they produce, so
+# segments cached by an older build are discarded instead of reused.
+_SEGMENT_CACHE_FORMAT = 1
+
 # Cap on how many example sentences one entry keeps per language pack, after
 # ranking by _sentence_quality. Shorter, simpler sentences make better
 # dictionary examples than long ones; this is a deterministic stand-in for
@@ -24,10 +38,20 @@ _KANA_COL = 20
 _MAX_EXAMPLES_PER_ENTRY = 8
 
 
-def _sentence_quality(sentence_text):
-    """Lower is better: shorter Japanese sentences read as simpler, more
-    legible dictionary examples than long ones."""
-    return len(sentence_text)
+def _sentence_length(sentence):
+    """Shorter Japanese sentences read as simpler, more legible dictionary
+    examples than long ones."""
+    return len(sentence['text'])
+
+
+# Ranking features, compared in order so later ones only break ties between
+# earlier ones. Each takes a gitoeba sentence dict and returns a number; lower
+# is better.
+_QUALITY_FEATURES = (_sentence_length,)
+
+
+def _sentence_quality(sentence, features=_QUALITY_FEATURES):
+    return tuple(feature(sentence) for feature in features)
 
 
 def _kata_to_hira(s):
@@ -86,11 +110,267 @@ def _sentence_segments(text, tokens):
     return segments
 
 
+class SegmentCache:
+    """On-disk cache of _sentence_segments() output, keyed by a hash of the sentence text.
+
+    Tokenization depends only on the text and the UniDic build, so entries are tagged
+    with _unidic_version() and the whole cache is dropped when the dictionary changes.
+    """
+
+    def __init__(self, path, unidic_version):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sumatora_schema.connect(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS CacheInfo (key TEXT PRIMARY KEY, value TEXT NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS SegmentCache '
+            '(text_hash BLOB PRIMARY KEY, segments TEXT NOT NULL) WITHOUT ROWID'
+        )
+        row = self._conn.execute(
+            "SELECT value FROM CacheInfo WHERE key = 'unidic_version'"
+        ).fetchone()
+        if row is None or row[0] != unidic_version:
+            self._conn.execute('DELETE FROM SegmentCache')
+            self._conn.execute(
+                "INSERT OR REPLACE INTO CacheInfo (key, value) VALUES ('unidic_version', ?)",
+                (unidic_version,),
+            )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(text):
+        return hashlib.sha256(text.encode('utf-8')).digest()
+
+    def get(self, text):
+        row = self._conn.execute(
+            'SELECT segments FROM SegmentCache WHERE text_hash = ?', (self._key(text),),
+        ).fetchone()
+        if row is None:
+            return None
+        return [tuple(segment) for segment in json.loads(row[0])]
+
+    def put_many(self, items):
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO SegmentCache (text_hash, segments) VALUES (?, ?)',
+            ((self._key(text), json.dumps(segments, ensure_ascii=False))
+             for text, segments in items),
+        )
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+
+def _unidic_version(dicdir):
+    """Identifies the UniDic build in dicdir for SegmentCache.
+
+    unidic-to-git.py keeps the ETag / Last-Modified of the zip next to sys.dic; without
+    them, sys.dic's mtime stands in so a replaced dictionary still invalidates the cache.
+    """
+    stat = os.stat(os.path.join(dicdir, 'sys.dic'))
+    parts = [str(_SEGMENT_CACHE_FORMAT), str(stat.st_size)]
+    headers_path = os.path.join(dicdir, 'sys.dic.headers')
+    saved = {}
+    if os.path.exists(headers_path):
+        with open(headers_path) as f:
+            saved = json.load(f)
+    if saved.get('etag') or saved.get('last-modified'):
+        parts += [saved.get('etag', ''), saved.get('last-modified', '')]
+    else:
+        parts.append(str(stat.st_mtime_ns))
+    return '|'.join(parts)
+
+
+# Per-worker tagger for the --jobs process pool, created once by _init_worker.
+_worker_tokenizer = None
+
+
+def _init_worker(unidic_dir):
+    global _worker_tokenizer
+    _worker_tokenizer = MecabTokenizer(unidic_dir)
+
+
+def _segment_batch(batch, tokenizer=None):
+    tokenizer = tokenizer or _worker_tokenizer
+    return [
+        (sent_id, _sentence_segments(text, tokenizer.tokenize(text)))
+        for sent_id, text in batch
+    ]
+
+
+class Segmenter:
+    """Segments sentences jobs at a time, through an optional on-disk SegmentCache.
+
+    One Segmenter serves every language of a build: the worker pool (each worker with
+    its own fugashi tagger, see _init_worker) is started on first use and kept. Nothing
+    is held in memory between calls; a sentence kept by several languages is read back
+    from the SegmentCache, which is why build-sumatora-db.py always passes --cache.
+    """
+
+    def __init__(self, unidic_dir, cache_dir=None, jobs=1):
+        self._unidic_dir = unidic_dir
+        self._jobs = jobs
+        self._cache = None
+        if cache_dir:
+            self._cache = SegmentCache(
+                os.path.join(cache_dir, 'segments.db'), _unidic_version(unidic_dir),
+            )
+        self._tokenizer = None
+        self._pool = None
+        self.cached = self.tokenized = 0
+
+    def segment(self, sent_ids, text_of):
+        """Returns {sentence_id: segments} for sent_ids; text_of(sentence_id) gives
+        the text to look up in the cache or tokenize."""
+        result = {}
+        pending = []
+        texts = {}
+        for sent_id in sent_ids:
+            text = texts[sent_id] = text_of(sent_id)
+            segments = self._cache.get(text) if self._cache else None
+            if segments is None:
+                pending.append((sent_id, text))
+                continue
+            self.cached += 1
+            result[sent_id] = segments
+
+        batches = [pending[i:i + _SEGMENT_BATCH] for i in range(0, len(pending), _SEGMENT_BATCH)]
+        for results in self._run(batches):
+            result.update(results)
+            self.tokenized += len(results)
+            if self._cache:
+                self._cache.put_many((texts[sent_id], segments) for sent_id, segments in results)
+        return result
+
+    def _run(self, batches):
+        if not batches:
+            return []
+        if self._jobs <= 1:
+            if self._tokenizer is None:
+                self._tokenizer = MecabTokenizer(self._unidic_dir)
+            return (_segment_batch(batch, self._tokenizer) for batch in batches)
+        if self._pool is None:
+            # MeCab is CPU-bound and a fugashi tagger can't be shared across processes.
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self._jobs,
+                initializer=_init_worker,
+                initargs=(self._unidic_dir,),
+            )
+        return self._pool.map(_segment_batch, batches)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+        if self._cache:
+            self._cache.close()
+
+
+class ExampleRanker:
+    """Keeps the best `limit` candidate sentences per entry while one language's
+    translations stream past.
+
+    Each entry has a bounded heap whose root is its worst kept candidate, so memory is
+    entries x limit however many candidates a language has. Translation text is held
+    only while its sentence is still kept by at least one entry. Candidates rank by
+    (_sentence_quality, arrival order): equal quality keeps the earlier sentence, as a
+    stable sort over the whole candidate list would.
+    """
+
+    def __init__(self, limit):
+        self._limit = limit
+        self._heaps = defaultdict(list)  # entry_id -> [(inverted rank key, sent_id), ...]
+        self._translations = {}
+        self._refs = defaultdict(int)
+        self._seq = 0
+
+    def add(self, sent_id, translation, quality, entry_ids):
+        # heapq is a min-heap; negating the key puts the worst candidate at the root.
+        key = tuple(-q for q in quality) + (-self._seq,)
+        self._seq += 1
+        kept = 0
+        for entry_id in entry_ids:
+            heap = self._heaps[entry_id]
+            if len(heap) < self._limit:
+                heapq.heappush(heap, (key, sent_id))
+            elif key > heap[0][0]:
+                _key, evicted = heapq.heapreplace(heap, (key, sent_id))
+                self._release(evicted)
+            else:
+                continue
+            kept += 1
+        if kept:
+            self._refs[sent_id] += kept
+            self._translations[sent_id] = translation
+
+    def _release(self, sent_id):
+        self._refs[sent_id] -= 1
+        if not self._refs[sent_id]:
+            del self._refs[sent_id]
+            del self._translations[sent_id]
+
+    def translation(self, sent_id):
+        return self._translations[sent_id]
+
+    def kept_sent_ids(self):
+        return sorted(self._translations)
+
+    def ranked(self):
+        """Yields (entry_id, [sent_id, ...]) with each entry's best sentence first."""
+        for entry_id, heap in self._heaps.items():
+            yield entry_id, [sent_id for _key, sent_id in sorted(heap, reverse=True)]
+
+
 class TokenResolver:
+    """Maps gitoeba tokens to (entry_id, form_id) rows using in-memory form indexes.
+
+    Every word form and sense is loaded once up front, so resolving the hundreds of
+    thousands of sentence tokens is dictionary lookups rather than one EntryForm query
+    plus one Sense query per distinct token. Rows come back in the same order the
+    indexed per-token queries produce, so the first link kept per entry is unchanged.
+    """
+
     def __init__(self, conn):
-        self._conn = conn
         self._cache = {}
-        self._jmdict_source_id = sumatora_schema.source_id(conn, 'jmdict')
+        jmdict_source_id = sumatora_schema.source_id(conn, 'jmdict')
+
+        self._entry_by_source_key = dict(conn.execute(
+            "SELECT source_key, entry_id FROM Entry "
+            "WHERE source_id = ? AND entry_type = 'word'",
+            (jmdict_source_id,),
+        ))
+
+        # text -> [(entry_id, form_id), ...] over all word forms, and
+        # (text, reading) -> [(entry_id, form_id), ...] over writing forms only.
+        # Loaded in EntryFormUnique order, which is the order the per-entry source_key
+        # lookup used to return rows in; the text lookups are then re-sorted by form_id
+        # to match the EntryFormText index order.
+        self._forms_by_text = defaultdict(list)
+        self._writings_by_text_reading = defaultdict(list)
+        for entry_id, form_id, form_type, text, reading in conn.execute(
+            "SELECT f.entry_id, f.form_id, f.form_type, f.text, f.reading FROM EntryForm f "
+            "JOIN Entry e ON e.entry_id = f.entry_id "
+            "WHERE e.entry_type = 'word' "
+            "ORDER BY f.entry_id, f.form_type, f.text, IFNULL(f.reading, '')"
+        ):
+            row = (entry_id, form_id)
+            self._forms_by_text[text].append(row)
+            if form_type == 'writing':
+                self._writings_by_text_reading[(text, reading)].append(row)
+        self._forms_in_entry_order = {
+            text: list(rows) for text, rows in self._forms_by_text.items() if len(rows) > 1
+        }
+        for rows in self._forms_by_text.values():
+            rows.sort(key=lambda row: row[1])
+        for rows in self._writings_by_text_reading.values():
+            rows.sort(key=lambda row: row[1])
+
+        self._sense_by_number = {}
+        for entry_id, display_number, sense_id, source_ord in conn.execute(
+            'SELECT entry_id, display_number, sense_id, source_ord FROM Sense '
+            'WHERE display_number IS NOT NULL ORDER BY sense_id'
+        ):
+            self._sense_by_number.setdefault((entry_id, display_number), (sense_id, source_ord))
 
     def resolve(self, writing, reading, source_entry_id=None):
         key = (writing, reading, source_entry_id)
@@ -98,60 +378,71 @@ class TokenResolver:
             return self._cache[key]
 
         if source_entry_id is not None:
-            rows = self._conn.execute(
-                "SELECT e.entry_id, f.form_id FROM Entry e "
-                "LEFT JOIN EntryForm f ON f.entry_id = e.entry_id AND f.text = ? "
-                "WHERE e.source_id = ? AND e.source_key = ? AND e.entry_type = 'word'",
-                (writing, self._jmdict_source_id, str(source_entry_id)),
-            ).fetchall()
+            entry_id = self._entry_by_source_key.get(str(source_entry_id))
+            if entry_id is None:
+                rows = []
+            else:
+                forms = self._forms_in_entry_order.get(writing) or self._forms_by_text.get(writing, ())
+                rows = [row for row in forms if row[0] == entry_id]
+                if not rows:
+                    rows = [(entry_id, None)]
         elif reading:
-            rows = self._conn.execute(
-                "SELECT f.entry_id, f.form_id FROM EntryForm f "
-                "JOIN Entry e ON e.entry_id = f.entry_id "
-                "WHERE e.entry_type = 'word' AND f.form_type = 'writing' "
-                "AND f.text = ? AND f.reading = ?",
-                (writing, reading),
-            ).fetchall()
+            rows = self._writings_by_text_reading.get((writing, reading), [])
         else:
-            rows = self._conn.execute(
-                "SELECT f.entry_id, f.form_id FROM EntryForm f "
-                "JOIN Entry e ON e.entry_id = f.entry_id "
-                "WHERE e.entry_type = 'word' AND f.text = ?",
-                (writing,),
-            ).fetchall()
+            rows = self._forms_by_text.get(writing, [])
 
         self._cache[key] = rows
         return rows
 
+    def sense_id(self, entry_id, sense_number):
+        """Returns (sense_id, source_ord) for the matched sense, or (None, None).
 
-def _sense_id(conn, entry_id, sense_number):
-    """Returns (sense_id, source_ord) for the matched sense, or (None, None).
+        source_ord travels alongside sense_id all the way to EntryExample.sense_source_ord -
+        sense_id is a rowid, not stable once a pack from one SumatoraIndex release is attached
+        next to a pack from another (see Sense.entry_source_key in sumatora_schema.py); this
+        entry's own source_ord + EntryExample.entry_source_key is the stable substitute.
+        """
+        if sense_number is None:
+            return None, None
+        return self._sense_by_number.get((entry_id, sense_number), (None, None))
 
-    source_ord travels alongside sense_id all the way to EntryExample.sense_source_ord -
-    sense_id is a rowid, not stable once a pack from one SumatoraIndex release is attached
-    next to a pack from another (see Sense.entry_source_key in sumatora_schema.py); this
-    entry's own source_ord + EntryExample.entry_source_key is the stable substitute.
-    """
-    if sense_number is None:
-        return None, None
-    row = conn.execute(
-        'SELECT sense_id, source_ord FROM Sense WHERE entry_id = ? AND display_number = ?',
-        (entry_id, sense_number),
-    ).fetchone()
-    return row if row else (None, None)
+
+def _insert_sentence(conn, source_id, sentence_id, segments):
+    """Shared segment layout: store a sentence's segments once, for every language."""
+    conn.execute(
+        'INSERT OR IGNORE INTO ExampleSentence (source_id, source_key) VALUES (?, ?)',
+        (source_id, str(sentence_id)),
+    )
+    example_sentence_id = conn.execute(
+        'SELECT sentence_id FROM ExampleSentence WHERE source_id = ? AND source_key = ?',
+        (source_id, str(sentence_id)),
+    ).fetchone()[0]
+    if not conn.execute(
+        'SELECT 1 FROM ExampleSentenceSegment WHERE sentence_id = ? LIMIT 1',
+        (example_sentence_id,),
+    ).fetchone():
+        conn.executemany(
+            'INSERT INTO ExampleSentenceSegment (sentence_id, ord, base, ruby) '
+            'VALUES (?, ?, ?, ?)',
+            [(example_sentence_id, i, base, ruby) for i, (base, ruby) in enumerate(segments)],
+        )
+    return example_sentence_id
 
 
-def _insert_example(conn, source_id, sentence_id, lang, translation, segments):
+def _insert_example(conn, source_id, sentence_id, lang, translation, segments,
+                    example_sentence_id=None):
+    """Inserts one translated example. Its segments are copied into ExampleSegment,
+    unless example_sentence_id (from _insert_sentence) already holds them."""
     conn.execute(
-        'INSERT OR IGNORE INTO Example (source_id, source_key, lang, translation) '
-        'VALUES (?, ?, ?, ?)',
-        (source_id, str(sentence_id), lang, translation),
+        'INSERT OR IGNORE INTO Example (source_id, source_key, lang, translation, sentence_id) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (source_id, str(sentence_id), lang, translation, example_sentence_id),
     )
     example_id = conn.execute(
         'SELECT example_id FROM Example WHERE source_id = ? AND source_key = ? AND lang = ?',
         (source_id, str(sentence_id), lang),
     ).fetchone()[0]
-    if not conn.execute(
+    if example_sentence_id is None and not conn.execute(
         'SELECT 1 FROM ExampleSegment WHERE example_id = ? LIMIT 1',
         (example_id,),
     ).fetchone():
@@ -162,11 +453,27 @@ def _insert_example(conn, source_id, sentence_id, lang, translation, segments):
     return example_id
 
 
-def process(gitoeba_dir, unidic_dir, db_path):
+def _read_sentence_links(path):
+    """Read one gitoeba sentence for token resolution: (id, quality, tokens), where each
+    token is (writing, reading, entryId, senseNumber, matched text)."""
+    sentence = read_json(path)
+    tokens = [
+        (token['writing'], token.get('reading'), token.get('entryId'), token.get('senseNumber'),
+         token.get('expression') or token['writing'])
+        for token in sentence.get('indices', [])
+    ]
+    return sentence['id'], _sentence_quality(sentence), tokens
+
+
+def _read_translation(path):
+    translation = read_json(path)
+    return translation['id'], translation['translation']
+
+
+def process(gitoeba_dir, unidic_dir, db_path, cache_dir=None, jobs=1, shared_segments=False):
     conn = sumatora_schema.open_or_init_db(db_path)
     source_id = sumatora_schema.source_id(conn, 'tatoeba')
     resolver = TokenResolver(conn)
-    tokenizer = MecabTokenizer(unidic_dir)
     # entry_id is a rowid reassigned from scratch on every build, so EntryExample denormalizes
     # the entry's stable source_key onto every row instead (see sumatora_schema.py) - this is
     # the one place that maps entry_id -> source_key before EntryExample splits away from Entry.
@@ -175,87 +482,92 @@ def process(gitoeba_dir, unidic_dir, db_path):
     sentences_dir = os.path.join(gitoeba_dir, 'sentences')
     translations_dir = os.path.join(gitoeba_dir, 'translations')
 
-    print('Loading sentences...', flush=True)
-    sentences = {}
-    for path in iter_json_files(sentences_dir):
+    def load_sentence(sent_id):
+        path = os.path.join(sentences_dir, str(sent_id // SHARD_SIZE), f'{sent_id}.json')
         with open(path, encoding='utf-8') as f:
-            sentence = json.load(f)
-        sentences[sentence['id']] = sentence
-    print(f'  {len(sentences)} sentences loaded', flush=True)
+            return json.load(f)
 
-    print('Resolving tokens and segmenting Japanese text...', flush=True)
+    # Only the entry links and rank key of each linked sentence are kept; the text is
+    # read back later for the sentences that survive ranking in some language.
+    print('Resolving tokens...', flush=True)
+    timing = ProfilePass('resolve tokens')
     entry_cache = {}
-    segment_cache = {}
-    for sent_id, sentence in sentences.items():
+    quality_by_sent = {}
+    sentence_count = 0
+    for sent_id, quality, tokens in iter_parsed(
+        iter_json_files(sentences_dir), _read_sentence_links, jobs,
+    ):
+        sentence_count += 1
         entry_links = {}
-        for token in sentence.get('indices', []):
-            matched_text = token.get('expression') or token['writing']
-            for entry_id, form_id in resolver.resolve(
-                token['writing'], token.get('reading'), token.get('entryId'),
-            ):
-                sense_id, sense_source_ord = _sense_id(conn, entry_id, token.get('senseNumber'))
+        for writing, reading, source_key, sense_number, matched_text in tokens:
+            for entry_id, form_id in resolver.resolve(writing, reading, source_key):
+                sense_id, sense_source_ord = resolver.sense_id(entry_id, sense_number)
                 entry_links.setdefault(entry_id, (form_id, matched_text, sense_id, sense_source_ord))
         if entry_links:
             entry_cache[sent_id] = entry_links
-            segment_cache[sent_id] = _sentence_segments(
-                sentence['text'], tokenizer.tokenize(sentence['text']),
-            )
-    print(f'  {len(entry_cache)} sentences have v2 entry links', flush=True)
+            quality_by_sent[sent_id] = quality
+    timing.done(items=sentence_count)
+    print(f'  {sentence_count} sentences, {len(entry_cache)} have v2 entry links', flush=True)
 
     lang_dirs = sorted(
         d for d in os.listdir(translations_dir)
         if os.path.isdir(os.path.join(translations_dir, d))
     ) if os.path.isdir(translations_dir) else []
 
+    segmenter = Segmenter(unidic_dir, cache_dir, jobs)
+    example_sentence_id_by_sent = {}
     example_count = link_count = 0
     for lang in lang_dirs:
+        timing = ProfilePass(f'examples {lang}')
         lang_dir = os.path.join(translations_dir, lang)
 
-        # Collect every candidate (sentence, translation) for this language
-        # before writing anything, so examples can be ranked and capped per
-        # entry — EntryExample.ord then means "best example first" instead of
-        # arbitrary file-iteration order, and entries with many Tatoeba
-        # matches don't get an unbounded example list.
-        translation_by_sent = {}
-        for path in iter_json_files(lang_dir):
-            with open(path, encoding='utf-8') as f:
-                translation = json.load(f)
-            sent_id = translation['id']
+        # Rank every candidate (sentence, translation) for this language before
+        # writing anything, so examples are capped per entry and EntryExample.ord
+        # means "best example first" instead of arbitrary file-iteration order.
+        ranker = ExampleRanker(_MAX_EXAMPLES_PER_ENTRY)
+        for sent_id, translation in iter_parsed(
+            iter_json_files(lang_dir), _read_translation, jobs,
+        ):
             if sent_id not in entry_cache:
                 continue
-            translation_by_sent[sent_id] = translation['translation']
-
-        by_entry = defaultdict(list)  # entry_id -> [(quality, sent_id, form_id, matched_text, sense_id, sense_source_ord), ...]
-        for sent_id in translation_by_sent:
-            quality = _sentence_quality(sentences[sent_id]['text'])
-            for entry_id, (form_id, matched_text, sense_id, sense_source_ord) in entry_cache[sent_id].items():
-                by_entry[entry_id].append((quality, sent_id, form_id, matched_text, sense_id, sense_source_ord))
-
-        kept_sent_ids = set()
-        ranked_by_entry = {}
-        for entry_id, candidates in by_entry.items():
-            candidates.sort(key=lambda c: c[0])
-            top = candidates[:_MAX_EXAMPLES_PER_ENTRY]
-            ranked_by_entry[entry_id] = top
-            kept_sent_ids.update(sent_id for _quality, sent_id, *_rest in top)
+            ranker.add(sent_id, translation, quality_by_sent[sent_id], entry_cache[sent_id])
+
+        kept_sent_ids = ranker.kept_sent_ids()
+        # A shared sentence already stored by an earlier language keeps its segments;
+        # _insert_example() ignores segments once it has an example_sentence_id.
+        to_segment = [
+            sent_id for sent_id in kept_sent_ids
+            if sent_id not in example_sentence_id_by_sent
+        ] if shared_segments else kept_sent_ids
+        segments_by_sent = segmenter.segment(
+            to_segment, lambda sent_id: load_sentence(sent_id)['text'],
+        )
 
         example_id_by_sent = {}
-        lang_examples = 0
         for sent_id in kept_sent_ids:
+            example_sentence_id = None
+            if shared_segments:
+                example_sentence_id = example_sentence_id_by_sent.get(sent_id)
+                if example_sentence_id is None:
+                    example_sentence_id = _insert_sentence(
+                        conn, source_id, sent_id, segments_by_sent[sent_id],
+                    )
+                    example_sentence_id_by_sent[sent_id] = example_sentence_id
             example_id_by_sent[sent_id] = _insert_example(
                 conn,
                 source_id,
                 sent_id,
                 lang,
-                translation_by_sent[sent_id],
-                segment_cache[sent_id],
+                ranker.translation(sent_id),
+                segments_by_sent.get(sent_id),
+                example_sentence_id,
             )
-            lang_examples += 1
-        example_count += lang_examples
+        example_count += len(kept_sent_ids)
 
-        for entry_id, ranked in ranked_by_entry.items():
+        for entry_id, ranked in ranker.ranked():
             entry_source_key = entry_source_key_by_id[entry_id]
-            for ord_, (_quality, sent_id, form_id, matched_text, sense_id, sense_source_ord) in enumerate(ranked):
+            for ord_, sent_id in enumerate(ranked):
+                form_id, matched_text, sense_id, sense_source_ord = entry_cache[sent_id][entry_id]
                 conn.execute(
                     'INSERT OR IGNORE INTO EntryExample '
                     '(entry_id, example_id, ord, matched_text, sense_id, entry_source_key, '
@@ -264,27 +576,40 @@ def process(gitoeba_dir, unidic_dir, db_path):
                      entry_source_key, sense_source_ord),
                 )
                 link_count += 1
-        print(f'  {lang}: {lang_examples} examples, <= {_MAX_EXAMPLES_PER_ENTRY} per entry', flush=True)
+        timing.done(items=len(kept_sent_ids))
+        print(f'  {lang}: {len(kept_sent_ids)} examples, <= {_MAX_EXAMPLES_PER_ENTRY} per entry',
+              flush=True)
+    segmenter.close()
+    print(f'  segments: {segmenter.cached} cached, {segmenter.tokenized} tokenized', flush=True)
 
     sumatora_schema.set_build_metadata(
         conn,
         tatoeba_example_count=str(example_count),
         tatoeba_entry_link_count=str(link_count),
+        example_segment_layout='shared' if shared_segments else 'per_example',
     )
     conn.commit()
     conn.close()
     print(f'Done: {example_count} examples, {link_count} entry links -> {db_path}', flush=True)
 
 
-HELP = 'usage: gitoeba-to-sumatora-db.py -i <gitoeba directory> -u <unidic dicdir> -d <sumatora.db path>'
+HELP = ('usage: gitoeba-to-sumatora-db.py -i <gitoeba directory> -u <unidic dicdir> '
+        '-d <sumatora.db path> [--cache <segment cache directory>] [-j|--jobs <n>] '
+        '[--shared-segments]')
 
 
 def main(argv):
     gitoeba_dir = ''
     unidic_dir = ''
     db_path = ''
+    cache_dir = None
+    jobs = 1
+    shared_segments = False
     try:
-        opts, _ = getopt.getopt(argv, 'hi:u:d:', ['idir=', 'unidic=', 'db='])
+        opts, _ = getopt.getopt(
+            argv, 'hi:u:d:j:',
+            ['idir=', 'unidic=', 'db=', 'cache=', 'jobs=', 'shared-segments'],
+        )
     except getopt.GetoptError:
         print(HELP)
         sys.exit(2)
@@ -298,10 +623,16 @@ def main(argv):
             unidic_dir = arg
         elif opt in ('-d', '--db'):
             db_path = arg
+        elif opt == '--cache':
+            cache_dir = arg
+        elif opt in ('-j', '--jobs'):
+            jobs = int(arg)
+        elif opt == '--shared-segments':
+            shared_segments = True
     if not gitoeba_dir or not unidic_dir or not db_path:
         print(HELP)
         sys.exit(2)
-    process(gitoeba_dir, unidic_dir, db_path)
+    process(gitoeba_dir, unidic_dir, db_path, cache_dir, jobs, shared_segments)
 
 
 if __name__ == '__main__':
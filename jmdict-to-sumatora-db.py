@@ -14,7 +14,7 @@ Three full passes over gitmdict/entries/ are required:
            ignorant (uninformed) solver in furigana_solver.py.
            Builds seq_to_entry_id plus kanji_index (text -> [(seq, entry_id,
            form_id, reading), ...]) and kana_index (text -> [(seq, entry_id,
-           form_id), ...]) used by pass 2 to resolve cross-references, since a
+           form_id), ...]), both array-backed FormIndexes, used by pass 2 to resolve cross-references, since a
            xref can point at an entry processed either before or after the
            current one in file order. kanji_index carries the reading of each
            row so a "headword・reading" xref resolves to the form_id for that
@@ -50,8 +50,9 @@ the SumatoraIndex build plan in ~/.claude/plans/):
     the entry), which is strictly more precise than v1 without extra source data.
   - This is the last stage-2 script in the build order that touches
     SearchTerm/SenseGloss (kanjidic2 and jmnedict run before it, pitch and
-    gitoeba run after but don't touch these tables), so it rebuilds both FTS5
-    indexes at the end.
+    gitoeba run after but don't touch these tables), so when run on its own it
+    rebuilds and optimizes both FTS5 indexes at the end. build-sumatora-db.py
+    passes --skip-fts-rebuild and does that once itself after the last loader.
 
 This program is free software: you can redistribute it and/or modify it under
 the terms of the GNU General Public License as published by the Free Software
@@ -63,15 +64,21 @@ __author__ = "Nicolas Centa"
 __license__ = "GPLv3"
 __version__ = "0.1.0"
 
+import functools
 import getopt
 import json
 import os
 import sys
+from array import array
+from bisect import bisect_left
 from collections import defaultdict
 
 import sumatora_schema
 from furigana_solver import build_knowledge, compute_furigana
-from sumatora_common import TagCache, hira_to_kata, is_priority_code, iter_json_files, parse_bracket_furigana
+from sumatora_common import (
+    BatchInserter, ProfilePass, RowWriter, TagCache, hira_to_kata, is_priority_code, iter_json_files, iter_parsed,
+    parse_bracket_furigana, read_json,
+)
 
 # Kanji/reading-element info tags that mark a form as irregular or rarely used.
 _IRREGULAR_TAGS = frozenset({'iK', 'rK', 'io', 'ik', 'ok', 'rk'})
@@ -171,6 +178,152 @@ def _parse_xref_text(text):
     return parts[0] if parts else text, None, sense_num
 
 
+class _TextIds:
+    """Interns form texts and readings to dense ints, shared by both FormIndexes so a
+    kana string that is both a kana form and a kanji form's reading is stored once."""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, text):
+        text_id = self.ids.get(text)
+        if text_id is None:
+            text_id = self.ids[text] = len(self.strings)
+            self.strings.append(text)
+        return text_id
+
+
+class FormIndex:
+    """text -> [(seq, entry_id, form_id[, reading]), ...] without a tuple per row.
+
+    Rows live in parallel array('i') columns. Each text's rows are chained through a
+    `next` column from a per-text head, in insertion order, so get() yields the same
+    rows in the same order a defaultdict(list) of tuples would. That costs about 20
+    bytes a row instead of a tuple and list slot per row, plus a list per text.
+    """
+
+    def __init__(self, text_ids, with_reading):
+        self._text_ids = text_ids
+        self._with_reading = with_reading
+        self._head = array('i')
+        self._tail = array('i')
+        self._seq = array('i')
+        self._entry_id = array('i')
+        self._form_id = array('i')
+        self._reading = array('i')
+        self._next = array('i')
+        self._text_count = 0
+
+    def add(self, text, seq, entry_id, form_id, reading=None):
+        text_id = self._text_ids.intern(text)
+        if text_id >= len(self._head):
+            grow = text_id + 1 - len(self._head)
+            self._head.extend([-1] * grow)
+            self._tail.extend([-1] * grow)
+        row = len(self._seq)
+        self._seq.append(seq)
+        self._entry_id.append(entry_id)
+        self._form_id.append(form_id)
+        if self._with_reading:
+            self._reading.append(-1 if reading is None else self._text_ids.intern(reading))
+        self._next.append(-1)
+        if self._head[text_id] == -1:
+            self._head[text_id] = row
+            self._text_count += 1
+        else:
+            self._next[self._tail[text_id]] = row
+        self._tail[text_id] = row
+
+    def get(self, text, default=()):
+        text_id = self._text_ids.ids.get(text)
+        if text_id is None or text_id >= len(self._head) or self._head[text_id] == -1:
+            return default
+        return self._rows(self._head[text_id])
+
+    def _rows(self, row):
+        strings = self._text_ids.strings
+        while row != -1:
+            if self._with_reading:
+                reading_id = self._reading[row]
+                yield (self._seq[row], self._entry_id[row], self._form_id[row],
+                       None if reading_id == -1 else strings[reading_id])
+            else:
+                yield self._seq[row], self._entry_id[row], self._form_id[row]
+            row = self._next[row]
+
+    def __len__(self):
+        return self._text_count
+
+
+class EntryFormTable:
+    """entry_id -> [(form_id, form_type, text, reading), ...] in EntryForm.ord order.
+
+    Recorded by pass 1 as it inserts forms, so pass 2 never reads EntryForm back. Uses
+    the same array-column layout as FormIndex; pass 1 assigns entry_ids in increasing
+    order, so each entry's rows form one contiguous run found by bisect.
+    """
+
+    def __init__(self, text_ids):
+        self._text_ids = text_ids
+        self._entry_ids = array('i')
+        self._starts = array('i')
+        self._form_ids = array('i')
+        self._is_reading = array('b')
+        self._texts = array('i')
+        self._readings = array('i')
+
+    def add(self, entry_id, form_id, form_type, text, reading):
+        if not self._entry_ids or self._entry_ids[-1] != entry_id:
+            self._entry_ids.append(entry_id)
+            self._starts.append(len(self._form_ids))
+        self._form_ids.append(form_id)
+        self._is_reading.append(form_type == 'reading')
+        self._texts.append(self._text_ids.intern(text))
+        self._readings.append(-1 if reading is None else self._text_ids.intern(reading))
+
+    def forms(self, entry_id):
+        i = bisect_left(self._entry_ids, entry_id)
+        if i == len(self._entry_ids) or self._entry_ids[i] != entry_id:
+            return []
+        end = self._starts[i + 1] if i + 1 < len(self._starts) else len(self._form_ids)
+        strings = self._text_ids.strings
+        return [
+            (self._form_ids[row],
+             'reading' if self._is_reading[row] else 'writing',
+             strings[self._texts[row]],
+             None if self._readings[row] == -1 else strings[self._readings[row]])
+            for row in range(self._starts[i], end)
+        ]
+
+
+class SeqToEntryId:
+    """JMdict seq -> entry_id as two array('i') columns, searched with bisect once
+    freeze() has sorted them by seq."""
+
+    def __init__(self):
+        self._seqs = array('i')
+        self._entry_ids = array('i')
+
+    def add(self, seq, entry_id):
+        self._seqs.append(seq)
+        self._entry_ids.append(entry_id)
+
+    def freeze(self):
+        order = sorted(range(len(self._seqs)), key=self._seqs.__getitem__)
+        self._seqs = array('i', (self._seqs[i] for i in order))
+        self._entry_ids = array('i', (self._entry_ids[i] for i in order))
+
+    def __getitem__(self, seq):
+        i = bisect_left(self._seqs, seq)
+        if i == len(self._seqs) or self._seqs[i] != seq:
+            raise KeyError(seq)
+        return self._entry_ids[i]
+
+    def __len__(self):
+        return len(self._seqs)
+
+
 def _resolve_reference(text, kanji_index, kana_index):
     """Resolve one xref/ant string to (target_entry_id, target_form_id, sense_num).
 
@@ -216,86 +369,117 @@ def _insert_search_term(c, entry_id, form_id, text, normalized, script, priority
     )
 
 
-def _pass1_forms(c, entries_dir, src, entities, tags, knowledge):
-    """Entry + EntryForm + FormTag + FormFuriganaSegment. Returns the indices pass 2 needs."""
-    seq_to_entry_id = {}
-    # text -> [(seq, entry_id, form_id, reading), ...]; reading distinguishes
-    # which of a kanji form's several valid readings each row is (needed by
-    # _resolve_reference to pick the right form_id for a "headword・reading"
-    # xref instead of collapsing all readings of one seq into one row).
-    kanji_index = defaultdict(list)
-    kana_index = defaultdict(list)  # text -> [(seq, entry_id, form_id), ...]
+# kanjidic2 knowledge for compute_furigana in whichever process runs _parse_forms,
+# set by _init_parser.
+_knowledge = None
 
-    count = 0
-    for path in iter_json_files(entries_dir):
-        with open(path, encoding='utf-8') as f:
-            entry = json.load(f)
-        seq = entry['seq']
-        kanji_list = entry.get('kanji', [])
-        kana_list = entry.get('kana', [])
 
-        c.execute(
-            "INSERT INTO Entry (source_id, source_key, entry_type, score) VALUES (?, ?, 'word', ?)",
-            (src, str(seq), compute_entry_score(kanji_list, kana_list)),
-        )
-        entry_id = c.lastrowid
-        seq_to_entry_id[seq] = entry_id
-
-        # Build every candidate form first (kanji x reading pairs, then kana
-        # forms) so is_primary can be chosen by score across the whole entry
-        # instead of by whichever form JMdict happens to list first.
-        pending = []
-        kana_by_text = {kn['text']: kn for kn in kana_list}
-        for k in kanji_list:
-            readings = _applicable_readings(k['text'], kana_list) or [None]
-            is_search_only = int(_SEARCH_ONLY_KANJI_TAG in k.get('tags', []))
-            for reading in readings:
-                # Score this specific (kanji, reading) pair, not the kanji element
-                # alone: ke_pri/ke_inf and re_pri/re_inf are independent per JMdict,
-                # so a common kanji paired with a rare reading (or vice versa) is
-                # not itself a common pairing, and an irregular tag on either side
-                # should demote the pair the same way.
-                kn = kana_by_text.get(reading)
-                if kn is None:
-                    pair_common = k['common']
-                    pair_tags = set(k.get('tags', []))
-                else:
-                    pair_common = k['common'] and kn['common']
-                    pair_tags = set(k.get('tags', [])) | set(kn.get('tags', []))
-                pending.append({
-                    'form_type': 'writing',
-                    'text': k['text'],
-                    'reading': reading,
-                    'is_common': int(pair_common),
-                    'score': _form_score(pair_common, pair_tags),
-                    'is_search_only': is_search_only,
-                    'tags': k.get('tags', []),
-                    'furigana': compute_furigana(k['text'], reading, knowledge) if reading else None,
-                })
-        for k in kana_list:
+def _init_parser(knowledge):
+    global _knowledge
+    _knowledge = knowledge
+
+
+def _parse_forms(path):
+    """Read one gitmdict entry for pass 1: (seq, entry score, candidate forms).
+
+    Every candidate form (kanji x reading pairs, then kana forms) is built before any
+    is inserted, so is_primary can be chosen by score across the whole entry instead
+    of by whichever form JMdict happens to list first.
+    """
+    entry = read_json(path)
+    kanji_list = entry.get('kanji', [])
+    kana_list = entry.get('kana', [])
+
+    pending = []
+    kana_by_text = {kn['text']: kn for kn in kana_list}
+    for k in kanji_list:
+        readings = _applicable_readings(k['text'], kana_list) or [None]
+        is_search_only = int(_SEARCH_ONLY_KANJI_TAG in k.get('tags', []))
+        for reading in readings:
+            # Score this specific (kanji, reading) pair, not the kanji element
+            # alone: ke_pri/ke_inf and re_pri/re_inf are independent per JMdict,
+            # so a common kanji paired with a rare reading (or vice versa) is
+            # not itself a common pairing, and an irregular tag on either side
+            # should demote the pair the same way.
+            kn = kana_by_text.get(reading)
+            if kn is None:
+                pair_common = k['common']
+                pair_tags = set(k.get('tags', []))
+            else:
+                pair_common = k['common'] and kn['common']
+                pair_tags = set(k.get('tags', [])) | set(kn.get('tags', []))
             pending.append({
-                'form_type': 'reading',
+                'form_type': 'writing',
                 'text': k['text'],
-                'reading': None,
-                'is_common': int(k['common']),
-                'score': _form_score(k['common'], k.get('tags', [])),
-                'is_search_only': int(_SEARCH_ONLY_KANA_TAG in k.get('tags', [])),
+                'reading': reading,
+                'is_common': int(pair_common),
+                'score': _form_score(pair_common, pair_tags),
+                'is_search_only': is_search_only,
                 'tags': k.get('tags', []),
-                'furigana': None,
+                'furigana': compute_furigana(k['text'], reading, _knowledge) if reading else None,
             })
+    for k in kana_list:
+        pending.append({
+            'form_type': 'reading',
+            'text': k['text'],
+            'reading': None,
+            'is_common': int(k['common']),
+            'score': _form_score(k['common'], k.get('tags', [])),
+            'is_search_only': int(_SEARCH_ONLY_KANA_TAG in k.get('tags', [])),
+            'tags': k.get('tags', []),
+            'furigana': None,
+        })
+    return entry['seq'], compute_entry_score(kanji_list, kana_list), pending
+
+
+_ENTRY_SQL = (
+    "INSERT INTO Entry (entry_id, source_id, source_key, entry_type, score) "
+    "VALUES (?, ?, ?, 'word', ?)"
+)
+_FORM_SQL = (
+    'INSERT INTO EntryForm '
+    '(form_id, entry_id, ord, form_type, text, reading, is_primary, is_common, '
+    'is_search_only, score) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+_FURIGANA_SQL = 'INSERT INTO FormFuriganaSegment (form_id, ord, base, ruby) VALUES (?, ?, ?, ?)'
+_FORM_TAG_SQL = 'INSERT INTO FormTag (form_id, tag_id) VALUES (?, ?)'
+
+
+def _pass1_forms(batch, entries_dir, src, entities, tags, knowledge, jobs=1):
+    """Entry + EntryForm + FormTag + FormFuriganaSegment. Returns the indices pass 2 needs.
+
+    Rows go through batch (a BatchInserter on a RowWriter), so their ids come from
+    batch.next_id() and SQLite writes one batch while the next entries are parsed.
+    """
+    seq_to_entry_id = SeqToEntryId()
+    text_ids = _TextIds()
+    entry_forms = EntryFormTable(text_ids)
+    # text -> [(seq, entry_id, form_id, reading), ...]; reading distinguishes
+    # which of a kanji form's several valid readings each row is (needed by
+    # _resolve_reference to pick the right form_id for a "headword・reading"
+    # xref instead of collapsing all readings of one seq into one row).
+    kanji_index = FormIndex(text_ids, with_reading=True)
+    kana_index = FormIndex(text_ids, with_reading=False)  # text -> [(seq, entry_id, form_id), ...]
+
+    count = 0
+    for seq, score, pending in iter_parsed(
+        iter_json_files(entries_dir), _parse_forms, jobs,
+        initializer=_init_parser, initargs=(knowledge,),
+    ):
+        entry_id = batch.next_id('Entry', 'entry_id')
+        batch.add(_ENTRY_SQL, (entry_id, src, str(seq), score))
+        seq_to_entry_id.add(seq, entry_id)
 
         primary_idx = _select_primary(pending)
 
         for form_ord, f in enumerate(pending):
-            c.execute(
-                'INSERT INTO EntryForm '
-                '(entry_id, ord, form_type, text, reading, is_primary, is_common, '
-                'is_search_only, score) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                (entry_id, form_ord, f['form_type'], f['text'], f['reading'],
-                 1 if form_ord == primary_idx else 0, f['is_common'],
-                 f['is_search_only'], f['score']),
-            )
-            form_id = c.lastrowid
+            form_id = batch.next_id('EntryForm', 'form_id')
+            batch.add(_FORM_SQL, (
+                form_id, entry_id, form_ord, f['form_type'], f['text'], f['reading'],
+                1 if form_ord == primary_idx else 0, f['is_common'],
+                f['is_search_only'], f['score'],
+            ))
+            entry_forms.add(entry_id, form_id, f['form_type'], f['text'], f['reading'])
 
             if f['form_type'] == 'writing':
                 if f['furigana']:
@@ -305,111 +489,123 @@ def _pass1_forms(c, entries_dir, src, entities, tags, knowledge):
                 else:
                     segments = []
                 for seg_ord, (base, ruby) in enumerate(segments):
-                    c.execute(
-                        'INSERT INTO FormFuriganaSegment (form_id, ord, base, ruby) '
-                        'VALUES (?, ?, ?, ?)',
-                        (form_id, seg_ord, base, ruby),
-                    )
+                    batch.add(_FURIGANA_SQL, (form_id, seg_ord, base, ruby))
 
             for t in f['tags']:
                 if is_priority_code(t):
                     continue
                 tag_id = tags.get_or_create('form', t, entities.get(t, t))
-                c.execute('INSERT INTO FormTag (form_id, tag_id) VALUES (?, ?)', (form_id, tag_id))
+                batch.add(_FORM_TAG_SQL, (form_id, tag_id))
 
             if f['form_type'] == 'writing':
-                kanji_index[f['text']].append((seq, entry_id, form_id, f['reading']))
+                kanji_index.add(f['text'], seq, entry_id, form_id, f['reading'])
             else:
-                kana_index[f['text']].append((seq, entry_id, form_id))
+                kana_index.add(f['text'], seq, entry_id, form_id)
 
         count += 1
         if count % 10000 == 0:
             print(f'  pass 1: {count} entries processed…', flush=True)
 
-    return seq_to_entry_id, kanji_index, kana_index
+    seq_to_entry_id.freeze()
+    return seq_to_entry_id, entry_forms, kanji_index, kana_index
+
+
+def _read_senses(path, translations_dir, langs):
+    """Read one gitmdict entry for pass 2, with [(lang, glosses), ...] for every
+    language that has a translation file for it."""
+    entry = read_json(path)
+    seq = entry['seq']
+    translations = []
+    for lang in langs:
+        tpath = os.path.join(translations_dir, lang, str(seq // 10000), f'{seq}.json')
+        if os.path.exists(tpath):
+            translations.append((lang, read_json(tpath)['glosses']))
+    return entry, translations
 
 
-def _pass2_senses(c, entries_dir, translations_dir, entities, tags,
-                   seq_to_entry_id, kanji_index, kana_index):
+_SENSE_GROUP_SQL = (
+    'INSERT INTO SenseGroup (sense_group_id, entry_id, ord, display_number) VALUES (?, ?, ?, ?)'
+)
+_SENSE_SQL = (
+    'INSERT INTO Sense (sense_id, entry_id, sense_group_id, source_ord, ord, display_number, '
+    'entry_source_key) VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+_SENSE_GROUP_TAG_SQL = 'INSERT OR IGNORE INTO SenseGroupTag (sense_group_id, tag_id) VALUES (?, ?)'
+_SENSE_NOTE_SQL = 'INSERT INTO SenseNote (sense_id, ord, text) VALUES (?, ?, ?)'
+_LANGUAGE_SOURCE_SQL = (
+    'INSERT INTO SenseLanguageSource (sense_id, ord, lang, text, is_full, is_wasei) '
+    'VALUES (?, ?, ?, ?, ?, ?)'
+)
+_APPLIES_TO_FORM_SQL = 'INSERT INTO SenseAppliesToForm (sense_id, form_id) VALUES (?, ?)'
+_REFERENCE_SQL = (
+    'INSERT INTO SenseReference '
+    '(sense_id, ord, reference_type, display_text, target_entry_id, '
+    'target_form_id, target_sense_number) VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+_GLOSS_SQL = 'INSERT INTO SenseGloss (sense_id, lang, ord, text) VALUES (?, ?, ?, ?)'
+_FORM_RULE_SQL = 'INSERT OR IGNORE INTO FormRule (form_id, rule) VALUES (?, ?)'
+
+
+def _pass2_senses(batch, entries_dir, translations_dir, entities, tags,
+                  seq_to_entry_id, entry_forms, kanji_index, kana_index, jobs=1):
+    """Sense* + SenseGloss + FormRule rows, written through batch like _pass1_forms."""
     langs = sorted(os.listdir(translations_dir)) if os.path.isdir(translations_dir) else []
+    read_senses = functools.partial(_read_senses, translations_dir=translations_dir, langs=langs)
 
     count = 0
-    for path in iter_json_files(entries_dir):
-        with open(path, encoding='utf-8') as f:
-            entry = json.load(f)
+    for entry, translations in iter_parsed(iter_json_files(entries_dir), read_senses, jobs):
         seq = entry['seq']
         entry_id = seq_to_entry_id[seq]
         senses = entry.get('senses', [])
-        shard = seq // 10000
 
-        all_form_ids = [row[0] for row in
-                        c.execute('SELECT form_id FROM EntryForm WHERE entry_id = ?', (entry_id,))]
+        forms = entry_forms.forms(entry_id)
+        all_form_ids = [form_id for form_id, _form_type, _text, _reading in forms]
         form_rules = defaultdict(set)
         sense_ids = []
 
         for i, s in enumerate(senses):
-            c.execute(
-                'INSERT INTO SenseGroup (entry_id, ord, display_number) VALUES (?, ?, ?)',
-                (entry_id, i, i + 1),
-            )
-            sense_group_id = c.lastrowid
-            c.execute(
-                'INSERT INTO Sense (entry_id, sense_group_id, source_ord, ord, display_number, '
-                'entry_source_key) VALUES (?, ?, ?, ?, ?, ?)',
-                (entry_id, sense_group_id, i, i, i + 1, str(seq)),
-            )
-            sense_id = c.lastrowid
+            sense_group_id = batch.next_id('SenseGroup', 'sense_group_id')
+            batch.add(_SENSE_GROUP_SQL, (sense_group_id, entry_id, i, i + 1))
+            sense_id = batch.next_id('Sense', 'sense_id')
+            batch.add(_SENSE_SQL, (sense_id, entry_id, sense_group_id, i, i, i + 1, str(seq)))
             sense_ids.append(sense_id)
 
             for category, field in (('pos', 'partOfSpeech'), ('misc', 'misc'),
                                      ('field', 'field'), ('dialect', 'dialect')):
                 for code in s.get(field, []):
                     tag_id = tags.get_or_create(category, code, entities.get(code, code))
-                    c.execute(
-                        'INSERT OR IGNORE INTO SenseGroupTag (sense_group_id, tag_id) VALUES (?, ?)',
-                        (sense_group_id, tag_id),
-                    )
+                    batch.add(_SENSE_GROUP_TAG_SQL, (sense_group_id, tag_id))
 
             for ord_n, note in enumerate(s.get('info', [])):
-                c.execute(
-                    'INSERT INTO SenseNote (sense_id, ord, text) VALUES (?, ?, ?)',
-                    (sense_id, ord_n, note),
-                )
+                batch.add(_SENSE_NOTE_SQL, (sense_id, ord_n, note))
 
             for ord_l, ls in enumerate(s.get('languageSource', [])):
-                c.execute(
-                    'INSERT INTO SenseLanguageSource (sense_id, ord, lang, text, is_full, is_wasei) '
-                    'VALUES (?, ?, ?, ?, ?, ?)',
-                    (sense_id, ord_l, ls['lang'], ls.get('text') or None,
-                     int(ls.get('full', True)), int(ls.get('wasei', False))),
-                )
+                batch.add(_LANGUAGE_SOURCE_SQL, (
+                    sense_id, ord_l, ls['lang'], ls.get('text') or None,
+                    int(ls.get('full', True)), int(ls.get('wasei', False)),
+                ))
 
             stagk, stagr = s.get('stagk', []), s.get('stagr', [])
             if stagk or stagr:
                 restricted = set()
                 for text in stagk:
-                    for row in c.execute(
-                        "SELECT form_id FROM EntryForm WHERE entry_id = ? AND form_type = 'writing' AND text = ?",
-                        (entry_id, text),
-                    ):
-                        restricted.add(row[0])
+                    restricted.update(
+                        form_id for form_id, form_type, form_text, _reading in forms
+                        if form_type == 'writing' and form_text == text
+                    )
                 for text in stagr:
                     # stagr restricts by reading regardless of kanji form, so this
                     # must also catch 'writing' rows paired with that reading (e.g.
                     # 発条/ばね) — matching only kana-only 'reading' rows would make
                     # a client filtering by a matched writing form_id miss the
                     # restriction entirely.
-                    for row in c.execute(
-                        "SELECT form_id FROM EntryForm WHERE entry_id = ? AND "
-                        "((form_type = 'reading' AND text = ?) OR (form_type = 'writing' AND reading = ?))",
-                        (entry_id, text, text),
-                    ):
-                        restricted.add(row[0])
-                for form_id in restricted:
-                    c.execute(
-                        'INSERT INTO SenseAppliesToForm (sense_id, form_id) VALUES (?, ?)',
-                        (sense_id, form_id),
+                    restricted.update(
+                        form_id for form_id, form_type, form_text, reading in forms
+                        if (form_type == 'reading' and form_text == text)
+                        or (form_type == 'writing' and reading == text)
                     )
+                for form_id in restricted:
+                    batch.add(_APPLIES_TO_FORM_SQL, (sense_id, form_id))
                 applicable_forms = restricted
             else:
                 applicable_forms = all_form_ids
@@ -424,49 +620,28 @@ def _pass2_senses(c, entries_dir, translations_dir, entities, tags,
                     tgt_entry_id, tgt_form_id, sense_num = _resolve_reference(
                         text, kanji_index, kana_index,
                     )
-                    c.execute(
-                        'INSERT INTO SenseReference '
-                        '(sense_id, ord, reference_type, display_text, target_entry_id, '
-                        'target_form_id, target_sense_number) VALUES (?, ?, ?, ?, ?, ?, ?)',
-                        (sense_id, ord_r, ref_type, text, tgt_entry_id, tgt_form_id, sense_num),
-                    )
+                    batch.add(_REFERENCE_SQL, (
+                        sense_id, ord_r, ref_type, text, tgt_entry_id, tgt_form_id, sense_num,
+                    ))
 
-        for lang in langs:
-            tpath = os.path.join(translations_dir, lang, str(shard), f'{seq}.json')
-            if not os.path.exists(tpath):
-                continue
-            with open(tpath, encoding='utf-8') as f:
-                glosses = json.load(f)['glosses']
+        for lang, glosses in translations:
             for idx, gloss_list in enumerate(glosses):
                 if idx < len(sense_ids):
                     sid = sense_ids[idx]
                 else:
                     # More senses in this language than in the English structural
                     # data (rare) — hold the overflow gloss in its own bare Sense.
-                    c.execute(
-                        'INSERT INTO SenseGroup (entry_id, ord) VALUES (?, ?)',
-                        (entry_id, idx),
-                    )
-                    sgid = c.lastrowid
-                    c.execute(
-                        'INSERT INTO Sense (entry_id, sense_group_id, source_ord, ord, '
-                        'entry_source_key) VALUES (?, ?, ?, ?, ?)',
-                        (entry_id, sgid, idx, idx, str(seq)),
-                    )
-                    sid = c.lastrowid
+                    sgid = batch.next_id('SenseGroup', 'sense_group_id')
+                    batch.add(_SENSE_GROUP_SQL, (sgid, entry_id, idx, None))
+                    sid = batch.next_id('Sense', 'sense_id')
+                    batch.add(_SENSE_SQL, (sid, entry_id, sgid, idx, idx, None, str(seq)))
                     sense_ids.append(sid)
                 for gord, text in enumerate(gloss_list):
-                    c.execute(
-                        'INSERT INTO SenseGloss (sense_id, lang, ord, text) VALUES (?, ?, ?, ?)',
-                        (sid, lang, gord, text),
-                    )
+                    batch.add(_GLOSS_SQL, (sid, lang, gord, text))
 
         for form_id, rules in form_rules.items():
             for rule in rules:
-                c.execute(
-                    'INSERT OR IGNORE INTO FormRule (form_id, rule) VALUES (?, ?)',
-                    (form_id, rule),
-                )
+                batch.add(_FORM_RULE_SQL, (form_id, rule))
 
         count += 1
         if count % 10000 == 0:
@@ -538,33 +713,50 @@ def _insert_search_terms(conn, c, entries_dir, seq_to_entry_id):
             _insert_search_term(c, entry_id, form_id, text, hira_to_kata(text), 'kana', is_common)
 
 
-def process(gitmdict_dir, db_path, kanjidic2_dir=None):
-    conn = sumatora_schema.open_or_init_db(db_path)
+def process(gitmdict_dir, db_path, kanjidic2_dir=None, rebuild_fts=True, jobs=1):
+    conn = sumatora_schema.open_or_init_db(db_path, check_same_thread=False)
     c = conn.cursor()
     src = sumatora_schema.source_id(conn, 'jmdict')
 
     with open(f'{gitmdict_dir}/metadata.json', encoding='utf-8') as f:
         entities = json.load(f).get('entities', {})
 
-    tags = TagCache(conn)
     entries_dir = f'{gitmdict_dir}/entries'
     translations_dir = f'{gitmdict_dir}/translations'
     knowledge = build_knowledge(kanjidic2_dir) if kanjidic2_dir else None
 
     print('Pass 1: Entry/EntryForm/FormTag/FormFuriganaSegment…', flush=True)
-    seq_to_entry_id, kanji_index, kana_index = _pass1_forms(c, entries_dir, src, entities, tags, knowledge)
+    timing = ProfilePass('pass 1: forms')
+    writer = RowWriter(conn)
+    batch = BatchInserter(conn, writer=writer)
+    seq_to_entry_id, entry_forms, kanji_index, kana_index = _pass1_forms(
+        batch, entries_dir, src, entities, TagCache(conn, batch), knowledge, jobs,
+    )
+    batch.flush()
+    writer.close()
+    timing.done(items=len(seq_to_entry_id))
     print(f'  {len(seq_to_entry_id)} entries, {len(kanji_index)} kanji forms, '
           f'{len(kana_index)} kana forms indexed', flush=True)
 
     print('Building SearchTerm/SearchSuffix…', flush=True)
+    timing = ProfilePass('search terms')
     _insert_search_terms(conn, c, entries_dir, seq_to_entry_id)
+    timing.done()
 
     print('Pass 2: Sense/SenseGloss/SenseReference/FormRule…', flush=True)
-    _pass2_senses(c, entries_dir, translations_dir, entities, tags,
-                  seq_to_entry_id, kanji_index, kana_index)
+    timing = ProfilePass('pass 2: senses')
+    writer = RowWriter(conn)
+    batch = BatchInserter(conn, writer=writer)
+    _pass2_senses(batch, entries_dir, translations_dir, entities, TagCache(conn, batch),
+                  seq_to_entry_id, entry_forms, kanji_index, kana_index, jobs)
+    batch.flush()
+    writer.close()
+    timing.done(items=len(seq_to_entry_id))
 
     print('Resolving cross-reference preview text…', flush=True)
+    timing = ProfilePass('reference previews')
     _resolve_reference_previews(c)
+    timing.done()
 
     for rule, label in _RULE_LABELS.items():
         c.execute(
@@ -572,9 +764,11 @@ def process(gitmdict_dir, db_path, kanjidic2_dir=None):
             (rule, label),
         )
 
-    print('Rebuilding SearchTermFts/GlossSearchFts…', flush=True)
-    c.execute("INSERT INTO SearchTermFts(SearchTermFts) VALUES ('rebuild')")
-    c.execute("INSERT INTO GlossSearchFts(GlossSearchFts) VALUES ('rebuild')")
+    if rebuild_fts:
+        print('Rebuilding SearchTermFts/GlossSearchFts…', flush=True)
+        timing = ProfilePass('finalize FTS')
+        sumatora_schema.finalize_fts(conn)
+        timing.done()
 
     sumatora_schema.set_build_metadata(conn, jmdict_entry_count=str(len(seq_to_entry_id)))
     conn.commit()
@@ -586,7 +780,7 @@ def process(gitmdict_dir, db_path, kanjidic2_dir=None):
 HELP = (
     'usage: jmdict-to-sumatora-db.py '
     '-i <gitmdict directory> -d <sumatora.db path> '
-    '[-k <gitjidic2 directory>]'
+    '[-k <gitjidic2 directory>] [-j|--jobs <n>] [--skip-fts-rebuild]'
 )
 
 
@@ -594,8 +788,12 @@ def main(argv):
     gitmdict_dir = ''
     db_path = ''
     kanjidic2_dir = None
+    rebuild_fts = True
+    jobs = 1
     try:
-        opts, _ = getopt.getopt(argv, 'hi:d:k:', ['idir=', 'db=', 'kanjidic2='])
+        opts, _ = getopt.getopt(
+            argv, 'hi:d:k:j:', ['idir=', 'db=', 'kanjidic2=', 'jobs=', 'skip-fts-rebuild'],
+        )
     except getopt.GetoptError:
         print(HELP)
         sys.exit(2)
@@ -609,10 +807,14 @@ def main(argv):
             db_path = arg
         elif opt in ('-k', '--kanjidic2'):
             kanjidic2_dir = arg
+        elif opt in ('-j', '--jobs'):
+            jobs = int(arg)
+        elif opt == '--skip-fts-rebuild':
+            rebuild_fts = False
     if not gitmdict_dir or not db_path:
         print(HELP)
         sys.exit(2)
-    process(gitmdict_dir, db_path, kanjidic2_dir)
+    process(gitmdict_dir, db_path, kanjidic2_dir, rebuild_fts, jobs)
 
 
 if __name__ == '__main__':
@@ -103,6 +103,10 @@ def ensure_cached(url, cache_dir):
     if os.path.exists(headers_path):
         with open(headers_path) as f:
             saved = json.load(f)
+    if saved.get('synthetic'):
+        # Written by generate-synthetic-sources.py; the server copy would replace it.
+        print(f'  {name} is a synthetic fixture, not revalidated', flush=True)
+        return path
 
     req = urllib.request.Request(url)
     if saved.get('etag'):
@@ -39,7 +39,10 @@ import sys
 
 import sumatora_schema
 from furigana_solver import applicable_readings, build_knowledge, compute_furigana
-from sumatora_common import TagCache, hira_to_kata, is_priority_code, iter_json_files, parse_bracket_furigana
+from sumatora_common import (
+    BatchInserter, ProfilePass, RowWriter, TagCache, hira_to_kata, is_priority_code,
+    iter_json_files, iter_parsed, parse_bracket_furigana, read_json,
+)
 
 
 def _select_primary(candidates):
@@ -53,129 +56,148 @@ def _select_primary(candidates):
     return max(range(len(candidates)), key=lambda i: candidates[i]['is_common'])
 
 
-def process(gitnedict_dir, db_path, kanjidic2_dir=None):
-    conn = sumatora_schema.open_or_init_db(db_path)
-    c = conn.cursor()
+# kanjidic2 knowledge for compute_furigana in whichever process runs _parse_entry,
+# set by _init_parser.
+_knowledge = None
+
+
+def _init_parser(knowledge):
+    global _knowledge
+    _knowledge = knowledge
+
+
+def _parse_entry(path):
+    """Read one gitnedict entry and buffer its candidate forms (furigana included).
+
+    Every candidate form is built before any is inserted so is_primary can be chosen
+    by is_common across the whole entry instead of by JMnedict source order.
+    """
+    entry = read_json(path)
+    kana_list = entry.get('kana', [])
+    pending = []
+    for k in entry.get('kanji', []):
+        is_common = bool([t for t in k.get('tags', []) if is_priority_code(t)])
+        readings = applicable_readings(k['text'], kana_list) or [None]
+        for reading in readings:
+            pending.append({
+                'form_type': 'writing',
+                'text': k['text'],
+                'reading': reading,
+                'is_common': int(is_common),
+                'tags': k.get('tags', []),
+                'furigana': compute_furigana(k['text'], reading, _knowledge) if reading else None,
+            })
+    for r in kana_list:
+        pending.append({
+            'form_type': 'reading',
+            'text': r['text'],
+            'reading': None,
+            'is_common': 0,
+            'tags': [],
+            'furigana': None,
+        })
+    entry['forms'] = pending
+    return entry
+
+
+_ENTRY_SQL = "INSERT INTO Entry (entry_id, source_id, source_key, entry_type) VALUES (?, ?, ?, 'name')"
+_FORM_SQL = (
+    'INSERT INTO EntryForm '
+    '(form_id, entry_id, ord, form_type, text, reading, is_primary, is_common) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+)
+_FURIGANA_SQL = 'INSERT INTO FormFuriganaSegment (form_id, ord, base, ruby) VALUES (?, ?, ?, ?)'
+_FORM_TAG_SQL = 'INSERT INTO FormTag (form_id, tag_id) VALUES (?, ?)'
+_SEARCH_TERM_SQL = (
+    'INSERT INTO SearchTerm (entry_id, form_id, term, normalized, script, priority) '
+    'VALUES (?, ?, ?, ?, ?, ?)'
+)
+_TRANSLATION_SQL = 'INSERT INTO NameTranslation (entry_id, ord, text) VALUES (?, ?, ?)'
+_ENTRY_TAG_SQL = 'INSERT INTO EntryTag (entry_id, tag_id) VALUES (?, ?)'
+
+
+def process(gitnedict_dir, db_path, kanjidic2_dir=None, rebuild_fts=True, jobs=1):
+    conn = sumatora_schema.open_or_init_db(db_path, check_same_thread=False)
     src = sumatora_schema.source_id(conn, 'jmnedict')
 
     with open(f'{gitnedict_dir}/metadata.json', encoding='utf-8') as f:
         entities = json.load(f).get('entities', {})
 
-    tags = TagCache(conn)
     knowledge = build_knowledge(kanjidic2_dir) if kanjidic2_dir else None
+    writer = RowWriter(conn)
+    batch = BatchInserter(conn, writer=writer)
+    tags = TagCache(conn, batch)
 
+    timing = ProfilePass('names')
     entries_dir = f'{gitnedict_dir}/entries'
     count = 0
-    for path in iter_json_files(entries_dir):
-        with open(path, encoding='utf-8') as f:
-            entry = json.load(f)
-
+    for entry in iter_parsed(
+        iter_json_files(entries_dir), _parse_entry, jobs,
+        initializer=_init_parser, initargs=(knowledge,),
+    ):
         seq = entry['seq']
-        c.execute(
-            "INSERT INTO Entry (source_id, source_key, entry_type) VALUES (?, ?, 'name')",
-            (src, str(seq)),
-        )
-        entry_id = c.lastrowid
-
-        kana_list = entry.get('kana', [])
-
-        # Buffer every candidate form first so is_primary can be chosen by
-        # is_common across the whole entry instead of by JMnedict source order.
-        pending = []
-        for k in entry.get('kanji', []):
-            is_common = bool([t for t in k.get('tags', []) if is_priority_code(t)])
-            readings = applicable_readings(k['text'], kana_list) or [None]
-            for reading in readings:
-                pending.append({
-                    'form_type': 'writing',
-                    'text': k['text'],
-                    'reading': reading,
-                    'is_common': int(is_common),
-                    'tags': k.get('tags', []),
-                    'furigana': compute_furigana(k['text'], reading, knowledge) if reading else None,
-                })
-        for r in kana_list:
-            pending.append({
-                'form_type': 'reading',
-                'text': r['text'],
-                'reading': None,
-                'is_common': 0,
-                'tags': [],
-                'furigana': None,
-            })
+        entry_id = batch.next_id('Entry', 'entry_id')
+        batch.add(_ENTRY_SQL, (entry_id, src, str(seq)))
 
+        pending = entry['forms']
         primary_idx = _select_primary(pending) if pending else None
 
         for ord_, f in enumerate(pending):
-            c.execute(
-                'INSERT INTO EntryForm '
-                '(entry_id, ord, form_type, text, reading, is_primary, is_common) '
-                'VALUES (?, ?, ?, ?, ?, ?, ?)',
-                (entry_id, ord_, f['form_type'], f['text'], f['reading'],
-                 1 if ord_ == primary_idx else 0, f['is_common']),
-            )
-            form_id = c.lastrowid
+            form_id = batch.next_id('EntryForm', 'form_id')
+            batch.add(_FORM_SQL, (
+                form_id, entry_id, ord_, f['form_type'], f['text'], f['reading'],
+                1 if ord_ == primary_idx else 0, f['is_common'],
+            ))
 
             if f['furigana']:
                 for seg_ord, (base, ruby) in enumerate(parse_bracket_furigana(f['furigana'])):
-                    c.execute(
-                        'INSERT INTO FormFuriganaSegment (form_id, ord, base, ruby) '
-                        'VALUES (?, ?, ?, ?)',
-                        (form_id, seg_ord, base, ruby),
-                    )
+                    batch.add(_FURIGANA_SQL, (form_id, seg_ord, base, ruby))
 
             for t in f['tags']:
                 if is_priority_code(t):
                     continue
                 label = entities.get(t, t)
                 tag_id = tags.get_or_create('form', t, label)
-                c.execute(
-                    'INSERT INTO FormTag (form_id, tag_id) VALUES (?, ?)',
-                    (form_id, tag_id),
-                )
+                batch.add(_FORM_TAG_SQL, (form_id, tag_id))
 
             script = 'writing' if f['form_type'] == 'writing' else 'kana'
-            _insert_search_term(c, entry_id, form_id, f['text'], script, bool(f['is_common']))
+            _add_search_term(batch, entry_id, form_id, f['text'], script, bool(f['is_common']))
 
         for ord_t, text in enumerate(entry.get('translations', [])):
-            c.execute(
-                'INSERT INTO NameTranslation (entry_id, ord, text) VALUES (?, ?, ?)',
-                (entry_id, ord_t, text),
-            )
+            batch.add(_TRANSLATION_SQL, (entry_id, ord_t, text))
 
         for name_type in entry.get('types', []):
             label = entities.get(name_type, name_type)
             tag_id = tags.get_or_create('name_type', name_type, label)
-            c.execute(
-                'INSERT INTO EntryTag (entry_id, tag_id) VALUES (?, ?)',
-                (entry_id, tag_id),
-            )
+            batch.add(_ENTRY_TAG_SQL, (entry_id, tag_id))
 
         count += 1
         if count % 10000 == 0:
             print(f'  {count} names inserted…', flush=True)
+    batch.flush()
+    writer.close()
+    timing.done(items=count)
 
     sumatora_schema.set_build_metadata(conn, jmnedict_entry_count=str(count))
-    c.execute("INSERT INTO SearchTermFts(SearchTermFts) VALUES ('rebuild')")
+    if rebuild_fts:
+        timing = ProfilePass('finalize FTS')
+        sumatora_schema.finalize_fts(conn, ('SearchTermFts',))
+        timing.done()
     conn.commit()
     conn.close()
 
     print(f'Done: {count} names → {db_path}', flush=True)
 
 
-def _insert_search_term(c, entry_id, form_id, text, script, is_common):
+def _add_search_term(batch, entry_id, form_id, text, script, is_common):
     normalized = hira_to_kata(text) if script == 'kana' else text
-    c.execute(
-        'INSERT INTO SearchTerm (entry_id, form_id, term, normalized, script, priority) '
-        'VALUES (?, ?, ?, ?, ?, ?)',
-        (entry_id, form_id, text, normalized, script, 1 if is_common else 0),
-    )
+    batch.add(_SEARCH_TERM_SQL, (entry_id, form_id, text, normalized, script, 1 if is_common else 0))
 
 
 HELP = (
     'usage: jmnedict-to-sumatora-db.py '
     '-i <gitnedict directory> -d <sumatora.db path> '
-    '[-k <gitjidic2 directory>]'
+    '[-k <gitjidic2 directory>] [-j|--jobs <n>] [--skip-fts-rebuild]'
 )
 
 
@@ -183,8 +205,12 @@ def main(argv):
     gitnedict_dir = ''
     db_path = ''
     kanjidic2_dir = None
+    rebuild_fts = True
+    jobs = 1
     try:
-        opts, _ = getopt.getopt(argv, 'hi:d:k:', ['idir=', 'db=', 'kanjidic2='])
+        opts, _ = getopt.getopt(
+            argv, 'hi:d:k:j:', ['idir=', 'db=', 'kanjidic2=', 'jobs=', 'skip-fts-rebuild'],
+        )
     except getopt.GetoptError:
         print(HELP)
         sys.exit(2)
@@ -198,10 +224,14 @@ def main(argv):
             db_path = arg
         elif opt in ('-k', '--kanjidic2'):
             kanjidic2_dir = arg
+        elif opt in ('-j', '--jobs'):
+            jobs = int(arg)
+        elif opt == '--skip-fts-rebuild':
+            rebuild_fts = False
     if not gitnedict_dir or not db_path:
         print(HELP)
         sys.exit(2)
-    process(gitnedict_dir, db_path, kanjidic2_dir)
+    process(gitnedict_dir, db_path, kanjidic2_dir, rebuild_fts, jobs)
 
 
 if __name__ == '__main__':
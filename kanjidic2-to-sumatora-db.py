@@ -26,84 +26,89 @@ __license__ = "GPLv3"
 __version__ = "0.1.0"
 
 import getopt
-import json
 import sys
 
 import sumatora_schema
-from sumatora_common import iter_json_files
+from sumatora_common import (
+    BatchInserter, ProfilePass, RowWriter, iter_json_files, iter_parsed, read_json,
+)
 
 
-def process(gitjidic2_dir, db_path):
-    conn = sumatora_schema.open_or_init_db(db_path)
-    c = conn.cursor()
+_ENTRY_SQL = (
+    "INSERT INTO Entry (entry_id, source_id, source_key, entry_type, sort_key) "
+    "VALUES (?, ?, ?, 'kanji', ?)"
+)
+_FORM_SQL = (
+    'INSERT INTO EntryForm '
+    '(form_id, entry_id, ord, form_type, text, is_primary, is_common) '
+    "VALUES (?, ?, 0, 'writing', ?, 1, 0)"
+)
+# One statement for both writing and gloss terms, so search_id keeps following
+# per-character order when the batch is flushed.
+_SEARCH_TERM_SQL = (
+    'INSERT INTO SearchTerm (entry_id, form_id, term, normalized, script, priority) '
+    'VALUES (?, ?, ?, ?, ?, 0)'
+)
+_KANJI_SQL = (
+    'INSERT INTO KanjiEntry '
+    '(character, entry_id, strokes, grade, jlpt, frequency, radical) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+_READING_SQL = (
+    'INSERT INTO KanjiReading (character, reading_type, ord, text) VALUES (?, ?, ?, ?)'
+)
+_MEANING_SQL = 'INSERT INTO KanjiMeaning (character, lang, ord, text) VALUES (?, ?, ?, ?)'
+
+
+def process(gitjidic2_dir, db_path, rebuild_fts=True, jobs=1):
+    conn = sumatora_schema.open_or_init_db(db_path, check_same_thread=False)
     src = sumatora_schema.source_id(conn, 'kanjidic2')
+    writer = RowWriter(conn)
+    batch = BatchInserter(conn, writer=writer)
 
+    timing = ProfilePass('characters')
     chars_dir = f'{gitjidic2_dir}/characters'
     count = 0
-    for path in iter_json_files(chars_dir):
-        with open(path, encoding='utf-8') as f:
-            data = json.load(f)
+    for data in iter_parsed(iter_json_files(chars_dir), read_json, jobs):
         char = data.get('char')
         if not char:
             continue
 
-        c.execute(
-            "INSERT INTO Entry (source_id, source_key, entry_type, sort_key) "
-            "VALUES (?, ?, 'kanji', ?)",
-            (src, char, char),
-        )
-        entry_id = c.lastrowid
-        c.execute(
-            'INSERT INTO EntryForm '
-            '(entry_id, ord, form_type, text, is_primary, is_common) '
-            "VALUES (?, 0, 'writing', ?, 1, 0)",
-            (entry_id, char),
-        )
-        form_id = c.lastrowid
-        c.execute(
-            "INSERT INTO SearchTerm (entry_id, form_id, term, normalized, script, priority) "
-            "VALUES (?, ?, ?, ?, 'writing', 0)",
-            (entry_id, form_id, char, char),
-        )
-
-        c.execute(
-            'INSERT INTO KanjiEntry '
-            '(character, entry_id, strokes, grade, jlpt, frequency, radical) '
-            'VALUES (?, ?, ?, ?, ?, ?, ?)',
-            (char, entry_id, data.get('strokes'), data.get('grade'), data.get('jlpt'),
-             data.get('freq'), data.get('radical')),
-        )
+        entry_id = batch.next_id('Entry', 'entry_id')
+        batch.add(_ENTRY_SQL, (entry_id, src, char, char))
+        form_id = batch.next_id('EntryForm', 'form_id')
+        batch.add(_FORM_SQL, (form_id, entry_id, char))
+        batch.add(_SEARCH_TERM_SQL, (entry_id, form_id, char, char, 'writing'))
+
+        batch.add(_KANJI_SQL, (
+            char, entry_id, data.get('strokes'), data.get('grade'), data.get('jlpt'),
+            data.get('freq'), data.get('radical'),
+        ))
 
         readings = [('on', r) for r in data.get('on', [])] + \
                    [('kun', r) for r in data.get('kun', [])]
         for ord_, (reading_type, text) in enumerate(readings):
-            c.execute(
-                'INSERT INTO KanjiReading (character, reading_type, ord, text) '
-                'VALUES (?, ?, ?, ?)',
-                (char, reading_type, ord_, text),
-            )
+            batch.add(_READING_SQL, (char, reading_type, ord_, text))
 
         for ord_, text in enumerate(data.get('meanings', [])):
-            c.execute(
-                'INSERT INTO KanjiMeaning (character, lang, ord, text) VALUES (?, ?, ?, ?)',
-                (char, 'eng', ord_, text),
-            )
-            c.execute(
-                "INSERT INTO SearchTerm "
-                "(entry_id, form_id, term, normalized, script, priority) "
-                "VALUES (?, NULL, ?, ?, 'gloss', 0)",
-                (entry_id, text, text.lower()),
-            )
+            batch.add(_MEANING_SQL, (char, 'eng', ord_, text))
+            batch.add(_SEARCH_TERM_SQL, (entry_id, None, text, text.lower(), 'gloss'))
 
         count += 1
         if count % 2000 == 0:
             print(f'  {count} characters inserted…', flush=True)
+    batch.flush()
+    writer.close()
+    timing.done(items=count)
 
     sumatora_schema.set_build_metadata(
         conn,
         kanjidic2_char_count=str(count),
     )
-    c.execute("INSERT INTO SearchTermFts(SearchTermFts) VALUES ('rebuild')")
+    if rebuild_fts:
+        timing = ProfilePass('finalize FTS')
+        sumatora_schema.finalize_fts(conn, ('SearchTermFts',))
+        timing.done()
     conn.commit()
     conn.close()
 
@@ -112,15 +117,17 @@ def process(gitjidic2_dir, db_path):
 
 HELP = (
     'usage: kanjidic2-to-sumatora-db.py '
-    '-i <gitjidic2 directory> -d <sumatora.db path>'
+    '-i <gitjidic2 directory> -d <sumatora.db path> [-j|--jobs <n>] [--skip-fts-rebuild]'
 )
 
 
 def main(argv):
     gitjidic2_dir = ''
     db_path = ''
+    rebuild_fts = True
+    jobs = 1
     try:
-        opts, _ = getopt.getopt(argv, 'hi:d:', ['idir=', 'db='])
+        opts, _ = getopt.getopt(argv, 'hi:d:j:', ['idir=', 'db=', 'jobs=', 'skip-fts-rebuild'])
     except getopt.GetoptError:
         print(HELP)
         sys.exit(2)
@@ -132,10 +139,14 @@ def main(argv):
             gitjidic2_dir = arg
         elif opt in ('-d', '--db'):
             db_path = arg
+        elif opt in ('-j', '--jobs'):
+            jobs = int(arg)
+        elif opt == '--skip-fts-rebuild':
+            rebuild_fts = False
     if not gitjidic2_dir or not db_path:
         print(HELP)
         sys.exit(2)
-    process(gitjidic2_dir, db_path)
+    process(gitjidic2_dir, db_path, rebuild_fts, jobs)
 
 
 if __name__ == '__main__':
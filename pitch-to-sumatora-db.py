@@ -6,48 +6,24 @@ __license__ = "GPLv3"
 __version__ = "0.1.0"
 
 import getopt
-import json
 import os
 import sys
 
 import sumatora_schema
-from sumatora_common import iter_json_files
-
-
-def _form_matches(conn, word, reading):
-    """Yield (form_id, confidence) for exact word+reading and reading fallback hits."""
-    seen = set()
-    for (form_id,) in conn.execute(
-        "SELECT f.form_id FROM EntryForm f JOIN Entry e ON e.entry_id = f.entry_id "
-        "WHERE e.entry_type = 'word' AND f.form_type = 'writing' "
-        "AND f.text = ? AND f.reading = ?",
-        (word, reading),
-    ):
-        seen.add(form_id)
-        yield form_id, 'exact'
-
-    for (form_id,) in conn.execute(
-        "SELECT f.form_id FROM EntryForm f JOIN Entry e ON e.entry_id = f.entry_id "
-        "WHERE e.entry_type = 'word' AND f.form_type = 'reading' AND f.text = ?",
-        (reading,),
-    ):
-        if form_id not in seen:
-            seen.add(form_id)
-            confidence = 'exact' if word == reading else 'reading_fallback'
-            yield form_id, confidence
-
-
-def process(gitch_dir, db_path):
-    conn = sumatora_schema.open_or_init_db(db_path)
-    c = conn.cursor()
-    src = sumatora_schema.source_id(conn, 'pitch')
+from sumatora_common import ProfilePass, iter_json_files, iter_parsed, read_json
+
 
-    entries_dir = os.path.join(gitch_dir, 'entries')
-    pitch_count = pattern_count = link_count = 0
+def _load_pitches(gitch_dir, jobs=1):
+    """Return ({(word, reading): positions}, occurrence counts) from the gitch entries.
 
-    for path in iter_json_files(entries_dir):
-        with open(path, encoding='utf-8') as f:
-            data = json.load(f)
+    A (word, reading) pair seen again later keeps its first-seen position in the dict
+    (and so its pitch_id order) but takes the later occurrence's positions, the same as
+    re-inserting it over the earlier one would.
+    """
+    pitches_by_pair = {}
+    occurrences = {}
+    pattern_count = 0
+    for data in iter_parsed(iter_json_files(os.path.join(gitch_dir, 'entries')), read_json, jobs):
         word = data.get('word')
         if not word:
             continue
@@ -56,34 +32,116 @@ def process(gitch_dir, db_path):
             pitches = item.get('pitches')
             if not reading or pitches is None:
                 continue
+            positions = sorted(set(int(p) for p in pitches))
+            pitches_by_pair[(word, reading)] = positions
+            occurrences[(word, reading)] = occurrences.get((word, reading), 0) + 1
+            pattern_count += len(positions)
+    return pitches_by_pair, occurrences, pattern_count
+
+
+def _stage(conn, pitches_by_pair, occurrences):
+    conn.execute(
+        'CREATE TEMP TABLE PitchStage ('
+        'seq INTEGER PRIMARY KEY, word TEXT NOT NULL, reading TEXT NOT NULL, '
+        'occurrences INTEGER NOT NULL)'
+    )
+    conn.execute(
+        'CREATE TEMP TABLE PitchStagePattern ('
+        'seq INTEGER NOT NULL, ord INTEGER NOT NULL, position INTEGER NOT NULL)'
+    )
+    conn.executemany(
+        'INSERT INTO PitchStage (seq, word, reading, occurrences) VALUES (?, ?, ?, ?)',
+        ((seq, word, reading, occurrences[(word, reading)])
+         for seq, (word, reading) in enumerate(pitches_by_pair)),
+    )
+    conn.executemany(
+        'INSERT INTO PitchStagePattern (seq, ord, position) VALUES (?, ?, ?)',
+        ((seq, ord_, position)
+         for seq, positions in enumerate(pitches_by_pair.values())
+         for ord_, position in enumerate(positions)),
+    )
+    conn.execute('CREATE INDEX temp.PitchStagePair ON PitchStage(word, reading)')
+
+
+def _link_forms(conn, src):
+    """Link every staged pitch to its EntryForm rows; returns the number of links made,
+    counted once per gitch occurrence of the (word, reading) pair.
+
+    A writing form whose text and reading both match is an 'exact' link. A reading form
+    whose text matches the pitch reading is a 'reading_fallback' link, or 'exact' when the
+    pitch itself is kana-only (word == reading). Both joins go through EntryFormText.
+    """
+    staged = (
+        'FROM PitchStage s '
+        'JOIN PitchAccent a ON a.word = s.word AND a.reading = s.reading AND a.source_id = ? '
+    )
+    word_forms = (
+        "JOIN EntryForm f ON f.text = s.word AND f.reading = s.reading "
+        "AND f.form_type = 'writing' "
+        "JOIN Entry e ON e.entry_id = f.entry_id AND e.entry_type = 'word'"
+    )
+    reading_forms = (
+        "JOIN EntryForm f ON f.text = s.reading AND f.form_type = 'reading' "
+        "JOIN Entry e ON e.entry_id = f.entry_id AND e.entry_type = 'word'"
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO FormPitch (form_id, pitch_id, confidence) "
+        "SELECT f.form_id, a.pitch_id, 'exact' " + staged + word_forms,
+        (src,),
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO FormPitch (form_id, pitch_id, confidence) "
+        "SELECT f.form_id, a.pitch_id, "
+        "CASE WHEN s.word = s.reading THEN 'exact' ELSE 'reading_fallback' END "
+        + staged + reading_forms,
+        (src,),
+    )
+    link_count = 0
+    for joins in (word_forms, reading_forms):
+        link_count += conn.execute(
+            'SELECT IFNULL(SUM(s.occurrences), 0) ' + staged + joins, (src,),
+        ).fetchone()[0]
+    return link_count
+
 
-            c.execute(
-                'INSERT OR IGNORE INTO PitchAccent (word, reading, source_id) VALUES (?, ?, ?)',
-                (word, reading, src),
-            )
-            pitch_id = c.execute(
-                'SELECT pitch_id FROM PitchAccent WHERE word = ? AND reading = ? AND source_id = ?',
-                (word, reading, src),
-            ).fetchone()[0]
-            c.execute('DELETE FROM PitchPattern WHERE pitch_id = ?', (pitch_id,))
-            for ord_, position in enumerate(sorted(set(int(p) for p in pitches))):
-                c.execute(
-                    'INSERT INTO PitchPattern (pitch_id, ord, position) VALUES (?, ?, ?)',
-                    (pitch_id, ord_, position),
-                )
-                pattern_count += 1
-
-            for form_id, confidence in _form_matches(conn, word, reading):
-                c.execute(
-                    'INSERT OR REPLACE INTO FormPitch (form_id, pitch_id, confidence) '
-                    'VALUES (?, ?, ?)',
-                    (form_id, pitch_id, confidence),
-                )
-                link_count += 1
-
-            pitch_count += 1
-            if pitch_count % 10000 == 0:
-                print(f'  {pitch_count} pitch accents inserted...', flush=True)
+def process(gitch_dir, db_path, jobs=1):
+    conn = sumatora_schema.open_or_init_db(db_path)
+    src = sumatora_schema.source_id(conn, 'pitch')
+
+    print('Loading pitch entries...', flush=True)
+    timing = ProfilePass('load pitch entries')
+    pitches_by_pair, occurrences, pattern_count = _load_pitches(gitch_dir, jobs)
+    pitch_count = sum(occurrences.values())
+    timing.done(items=pitch_count)
+    print(f'  {pitch_count} pitch accents ({len(pitches_by_pair)} distinct)', flush=True)
+
+    timing = ProfilePass('insert pitch accents')
+    _stage(conn, pitches_by_pair, occurrences)
+    conn.execute(
+        'INSERT OR IGNORE INTO PitchAccent (word, reading, source_id) '
+        'SELECT word, reading, ? FROM PitchStage ORDER BY seq',
+        (src,),
+    )
+    conn.execute(
+        'DELETE FROM PitchPattern WHERE pitch_id IN ('
+        'SELECT a.pitch_id FROM PitchStage s JOIN PitchAccent a '
+        'ON a.word = s.word AND a.reading = s.reading AND a.source_id = ?)',
+        (src,),
+    )
+    conn.execute(
+        'INSERT INTO PitchPattern (pitch_id, ord, position) '
+        'SELECT a.pitch_id, p.ord, p.position FROM PitchStagePattern p '
+        'JOIN PitchStage s ON s.seq = p.seq '
+        'JOIN PitchAccent a ON a.word = s.word AND a.reading = s.reading AND a.source_id = ?',
+        (src,),
+    )
+    timing.done()
+    print('Linking pitch accents to forms...', flush=True)
+    timing = ProfilePass('link forms')
+    link_count = _link_forms(conn, src)
+    timing.done(items=link_count)
+    conn.execute('DROP TABLE PitchStagePattern')
+    conn.execute('DROP TABLE PitchStage')
 
     sumatora_schema.set_build_metadata(
         conn,
@@ -96,14 +154,15 @@ def process(gitch_dir, db_path):
     print(f'Done: {pitch_count} pitch accents, {link_count} form links -> {db_path}', flush=True)
 
 
-HELP = 'usage: pitch-to-sumatora-db.py -i <gitch directory> -d <sumatora.db path>'
+HELP = 'usage: pitch-to-sumatora-db.py -i <gitch directory> -d <sumatora.db path> [-j|--jobs <n>]'
 
 
 def main(argv):
     gitch_dir = ''
     db_path = ''
+    jobs = 1
     try:
-        opts, _ = getopt.getopt(argv, 'hi:d:', ['idir=', 'db='])
+        opts, _ = getopt.getopt(argv, 'hi:d:j:', ['idir=', 'db=', 'jobs='])
     except getopt.GetoptError:
         print(HELP)
         sys.exit(2)
@@ -115,10 +174,12 @@ def main(argv):
             gitch_dir = arg
         elif opt in ('-d', '--db'):
             db_path = arg
+        elif opt in ('-j', '--jobs'):
+            jobs = int(arg)
     if not gitch_dir or not db_path:
         print(HELP)
         sys.exit(2)
-    process(gitch_dir, db_path)
+    process(gitch_dir, db_path, jobs)
 
 
 if __name__ == '__main__':
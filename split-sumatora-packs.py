@@ -13,13 +13,17 @@ __version__ = "0.1.0"
 import getopt
 import os
 import shutil
-import sqlite3
 import sys
 
+import sumatora_schema
+from sumatora_common import ProfilePass
+
 
 HELP = (
     'usage: split-sumatora-packs.py -i <sumatora.db> -o <output directory> '
-    '[--lang <code>] [--all-languages]'
+    '[--lang <code>] [--all-languages] [--web-only] [--web-page-size <bytes>] '
+    '[--prefix-top-threshold <n>] [--prefix-top-cap <n>] '
+    '[--web-search-fts-prefix <lengths>] [--web-gloss-fts-prefix <lengths>]'
 )
 
 # WebSearchPrefixTop materializes only prefixes broad enough to make a live
@@ -34,10 +38,18 @@ _PREFIX_TOP_THRESHOLD = 50
 _PREFIX_TOP_CAP = 80
 _PREFIX_TOP_MAX_LEN = 8
 
+# Page size and FTS5 prefix indexes of the two web packs. These and the two
+# _PREFIX_TOP settings can be overridden from the command line so
+# sumatora-web-range-sim.py can sweep them (--web-only rebuilds just the web packs).
+_WEB_PAGE_SIZE = 16384
+_WEB_SEARCH_FTS_PREFIX = '1 2 3 4'
+_WEB_GLOSS_FTS_PREFIX = '1 2 3 4 5 6 7 8'
+
 _DROP_CORE = (
     'PitchPattern', 'FormPitch', 'PitchAccent',
     'KanjiMeaning', 'KanjiReading', 'KanjiEntry',
     'EntryExample', 'ExampleSegment', 'Example',
+    'ExampleSentenceSegment', 'ExampleSentence',
     'SearchSuffix',
     'NameTranslation',
 )
@@ -47,6 +59,7 @@ _DROP_GLOSS = (
     'PitchPattern', 'FormPitch', 'PitchAccent',
     'KanjiMeaning', 'KanjiReading', 'KanjiEntry',
     'EntryExample', 'ExampleSegment', 'Example',
+    'ExampleSentenceSegment', 'ExampleSentence',
     'NameTranslation',
     'SearchTermFts', 'SearchTerm',
     'FormFuriganaSegment', 'FormTag', 'EntryForm', 'EntryTag',
@@ -61,6 +74,7 @@ _DROP_NAMES = (
     'PitchPattern', 'FormPitch', 'PitchAccent',
     'KanjiMeaning', 'KanjiReading', 'KanjiEntry',
     'EntryExample', 'ExampleSegment', 'Example',
+    'ExampleSentenceSegment', 'ExampleSentence',
     'SenseReference', 'SenseAppliesToForm', 'SenseLanguageSource', 'SenseNote',
     'SenseGroupTag', 'Sense', 'SenseGroup', 'FormRule',
     'DeinflectionRule',
@@ -72,6 +86,7 @@ _DROP_SUFFIX = tuple(
         'PitchPattern', 'FormPitch', 'PitchAccent',
         'KanjiMeaning', 'KanjiReading', 'KanjiEntry',
         'EntryExample', 'ExampleSegment', 'Example',
+        'ExampleSentenceSegment', 'ExampleSentence',
         'NameTranslation',
         'SenseReference', 'SenseAppliesToForm', 'SenseLanguageSource', 'SenseNote',
         'SenseGroupTag', 'Sense', 'SenseGroup', 'FormRule',
@@ -83,6 +98,7 @@ _DROP_PITCH = (
     'SearchSuffix', 'GlossSearchFts', 'SenseGloss',
     'KanjiMeaning', 'KanjiReading', 'KanjiEntry',
     'EntryExample', 'ExampleSegment', 'Example',
+    'ExampleSentenceSegment', 'ExampleSentence',
     'NameTranslation',
     'SenseReference', 'SenseAppliesToForm', 'SenseLanguageSource', 'SenseNote',
     'SenseGroupTag', 'Sense', 'SenseGroup', 'FormRule',
@@ -94,6 +110,7 @@ _DROP_KANJI = (
     'SearchSuffix', 'GlossSearchFts', 'SenseGloss',
     'PitchPattern', 'FormPitch', 'PitchAccent',
     'EntryExample', 'ExampleSegment', 'Example',
+    'ExampleSentenceSegment', 'ExampleSentence',
     'NameTranslation',
     'SenseReference', 'SenseAppliesToForm', 'SenseLanguageSource', 'SenseNote',
     'SenseGroupTag', 'Sense', 'SenseGroup', 'FormRule',
@@ -113,7 +130,7 @@ _DROP_EXAMPLES = (
 
 
 def _connect(path):
-    conn = sqlite3.connect(path)
+    conn = sumatora_schema.connect(path)
     conn.execute('PRAGMA foreign_keys = OFF')
     return conn
 
@@ -137,27 +154,28 @@ def _copy(src, dst):
 
 
 def _rebuild_search_fts(conn):
-    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'SearchTermFts'").fetchone():
-        conn.execute("INSERT INTO SearchTermFts(SearchTermFts) VALUES ('rebuild')")
+    sumatora_schema.finalize_fts(conn, ('SearchTermFts',))
 
 
-def _web_search(src, out_dir):
+def _web_search(src, out_dir, page_size=_WEB_PAGE_SIZE,
+                prefix_threshold=_PREFIX_TOP_THRESHOLD, prefix_cap=_PREFIX_TOP_CAP,
+                fts_prefix=_WEB_SEARCH_FTS_PREFIX):
     """Build the small, range-request-friendly index used by the PWA."""
     path = os.path.join(out_dir, 'sumatora_web_search.db')
     os.makedirs(out_dir, exist_ok=True)
     if os.path.exists(path):
         os.unlink(path)
 
-    conn = sqlite3.connect(path)
+    conn = sumatora_schema.connect(path)
     try:
         # Larger pages reduce HTTP round trips while remaining small enough
         # for random cold reads. Prefix indexes deliberately trade file size
         # for latency on the common one-to-four-character web queries.
-        conn.execute('PRAGMA page_size = 16384')
+        conn.execute(f'PRAGMA page_size = {int(page_size)}')
         conn.execute('PRAGMA journal_mode = OFF')
         conn.execute('PRAGMA synchronous = OFF')
         conn.executescript(
-            """
+            f"""
             CREATE TABLE WebSearchResult (
                 search_id  INTEGER PRIMARY KEY,
                 source_key INTEGER NOT NULL,
@@ -196,7 +214,7 @@ def _web_search(src, out_dir):
                 content='',
                 columnsize=0,
                 detail=column,
-                prefix='1 2 3 4'
+                prefix='{fts_prefix}'
             );
             """
         )
@@ -268,7 +286,7 @@ def _web_search(src, out_dir):
                     GROUP BY wr.script_order, prefix, wr.entry_id
                 ) AS dedup
             )
-            WHERE group_size > {_PREFIX_TOP_THRESHOLD} AND rn <= {_PREFIX_TOP_CAP}
+            WHERE group_size > {int(prefix_threshold)} AND rn <= {int(prefix_cap)}
             """
         )
         conn.execute('DROP TABLE temp.web_search_vocab')
@@ -283,7 +301,9 @@ def _web_search(src, out_dir):
         conn.close()
 
 
-def _web_gloss(core_path, gloss_path, out_dir, lang):
+def _web_gloss(core_path, gloss_path, out_dir, lang, page_size=_WEB_PAGE_SIZE,
+               prefix_threshold=_PREFIX_TOP_THRESHOLD, prefix_cap=_PREFIX_TOP_CAP,
+               fts_prefix=_WEB_GLOSS_FTS_PREFIX):
     """Build the small, range-request-friendly reverse-gloss prefix index
     used by the PWA's online mode, for one already-built gloss language pack.
 
@@ -319,13 +339,13 @@ def _web_gloss(core_path, gloss_path, out_dir, lang):
     if os.path.exists(path):
         os.unlink(path)
 
-    conn = sqlite3.connect(path)
+    conn = sumatora_schema.connect(path)
     try:
-        conn.execute('PRAGMA page_size = 16384')
+        conn.execute(f'PRAGMA page_size = {int(page_size)}')
         conn.execute('PRAGMA journal_mode = OFF')
         conn.execute('PRAGMA synchronous = OFF')
         conn.executescript(
-            """
+            f"""
             CREATE TABLE WebGlossPrefixTop (
                 prefix     TEXT NOT NULL,
                 sense_ord  INTEGER NOT NULL,
@@ -361,7 +381,7 @@ def _web_gloss(core_path, gloss_path, out_dir, lang):
                 content='',
                 columnsize=0,
                 detail=none,
-                prefix='1 2 3 4 5 6 7 8'
+                prefix='{fts_prefix}'
             );
             """
         )
@@ -399,7 +419,7 @@ def _web_gloss(core_path, gloss_path, out_dir, lang):
                     GROUP BY prefix, s.entry_id
                 ) AS dedup
             )
-            WHERE group_size > {_PREFIX_TOP_THRESHOLD} AND rn <= {_PREFIX_TOP_CAP}
+            WHERE group_size > {int(prefix_threshold)} AND rn <= {int(prefix_cap)}
             """
         )
         conn.execute(
@@ -425,7 +445,7 @@ def _web_gloss(core_path, gloss_path, out_dir, lang):
                     GROUP BY term, s.entry_id
                 ) AS dedup
             )
-            WHERE group_size > {_PREFIX_TOP_THRESHOLD} AND rn <= {_PREFIX_TOP_CAP}
+            WHERE group_size > {int(prefix_threshold)} AND rn <= {int(prefix_cap)}
             """
         )
         conn.execute('DROP TABLE temp.web_gloss_vocab')
@@ -462,8 +482,7 @@ def _web_gloss(core_path, gloss_path, out_dir, lang):
 
 
 def _rebuild_gloss_fts(conn):
-    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'GlossSearchFts'").fetchone():
-        conn.execute("INSERT INTO GlossSearchFts(GlossSearchFts) VALUES ('rebuild')")
+    sumatora_schema.finalize_fts(conn, ('GlossSearchFts',))
 
 
 def _delete_entries_not(conn, entry_type):
@@ -609,6 +628,15 @@ def _examples(src, out_dir, lang):
     conn.execute(
         'DELETE FROM ExampleSegment WHERE example_id NOT IN (SELECT example_id FROM Example)'
     )
+    # Shared segment layout: keep only the sentences this language's examples use.
+    conn.execute(
+        'DELETE FROM ExampleSentence WHERE sentence_id NOT IN '
+        '(SELECT sentence_id FROM Example WHERE sentence_id IS NOT NULL)'
+    )
+    conn.execute(
+        'DELETE FROM ExampleSentenceSegment WHERE sentence_id NOT IN '
+        '(SELECT sentence_id FROM ExampleSentence)'
+    )
     _vacuum(conn)
     conn.close()
 
@@ -619,9 +647,30 @@ def _langs(conn, table, column='lang'):
     return [r[0] for r in conn.execute(f'SELECT DISTINCT {column} FROM {table} ORDER BY {column}')]
 
 
-def split(src, out_dir, requested_langs, all_languages):
+def _pack(name, build, *args, **kwargs):
+    print(name, flush=True)
+    timing = ProfilePass(name)
+    build(*args, **kwargs)
+    timing.done()
+
+
+def _web_glosses(out_dir, gloss_langs, web_params):
+    for lang in gloss_langs:
+        _pack(
+            f'web gloss {lang}', _web_gloss,
+            os.path.join(out_dir, 'sumatora_core.db'),
+            os.path.join(out_dir, f'sumatora_gloss_{lang}.db'),
+            out_dir, lang, **web_params.get('gloss', {}),
+        )
+
+
+def split(src, out_dir, requested_langs, all_languages, web_only=False, web_params=None):
+    """web_params: {'search': {...}, 'gloss': {...}} keyword overrides for
+    _web_search() and _web_gloss(). web_only rebuilds just the web packs, over the
+    core and gloss packs already in out_dir."""
+    web_params = web_params or {}
     os.makedirs(out_dir, exist_ok=True)
-    with sqlite3.connect(src) as conn:
+    with sumatora_schema.connect(src) as conn:
         gloss_langs = _langs(conn, 'SenseGloss')
         example_langs = _langs(conn, 'Example')
     if not all_languages:
@@ -629,31 +678,23 @@ def split(src, out_dir, requested_langs, all_languages):
         gloss_langs = [lang for lang in gloss_langs if lang in wanted]
         example_langs = [lang for lang in example_langs if lang in wanted]
 
-    print('core', flush=True)
-    _core(src, out_dir)
-    print('web search', flush=True)
-    _web_search(src, out_dir)
-    print('names', flush=True)
-    _names(src, out_dir)
-    print('suffix', flush=True)
-    _suffix(src, out_dir)
-    print('pitch', flush=True)
-    _pitch(src, out_dir)
-    print('kanji', flush=True)
-    _kanji(src, out_dir)
+    if web_only:
+        _pack('web search', _web_search, src, out_dir, **web_params.get('search', {}))
+        _web_glosses(out_dir, gloss_langs, web_params)
+        return
+
+    _pack('core', _core, src, out_dir)
+    _pack('web search', _web_search, src, out_dir, **web_params.get('search', {}))
+    _pack('names', _names, src, out_dir)
+    _pack('suffix', _suffix, src, out_dir)
+    _pack('pitch', _pitch, src, out_dir)
+    _pack('kanji', _kanji, src, out_dir)
 
     for lang in gloss_langs:
-        print(f'gloss {lang}', flush=True)
-        _gloss(src, out_dir, lang)
-        print(f'web gloss {lang}', flush=True)
-        _web_gloss(
-            os.path.join(out_dir, 'sumatora_core.db'),
-            os.path.join(out_dir, f'sumatora_gloss_{lang}.db'),
-            out_dir, lang,
-        )
+        _pack(f'gloss {lang}', _gloss, src, out_dir, lang)
+    _web_glosses(out_dir, gloss_langs, web_params)
     for lang in example_langs:
-        print(f'examples {lang}', flush=True)
-        _examples(src, out_dir, lang)
+        _pack(f'examples {lang}', _examples, src, out_dir, lang)
 
 
 def main(argv):
@@ -661,9 +702,14 @@ def main(argv):
     out_dir = ''
     langs = []
     all_languages = False
+    web_only = False
+    web_params = {'search': {}, 'gloss': {}}
     try:
         opts, _ = getopt.getopt(
-            argv, 'hi:o:l:', ['input=', 'output=', 'lang=', 'all-languages'],
+            argv, 'hi:o:l:',
+            ['input=', 'output=', 'lang=', 'all-languages', 'web-only', 'web-page-size=',
+             'prefix-top-threshold=', 'prefix-top-cap=', 'web-search-fts-prefix=',
+             'web-gloss-fts-prefix='],
         )
     except getopt.GetoptError:
         print(HELP)
@@ -680,10 +726,25 @@ def main(argv):
             langs.append(arg)
         elif opt == '--all-languages':
             all_languages = True
+        elif opt == '--web-only':
+            web_only = True
+        elif opt == '--web-page-size':
+            for params in web_params.values():
+                params['page_size'] = int(arg)
+        elif opt == '--prefix-top-threshold':
+            for params in web_params.values():
+                params['prefix_threshold'] = int(arg)
+        elif opt == '--prefix-top-cap':
+            for params in web_params.values():
+                params['prefix_cap'] = int(arg)
+        elif opt == '--web-search-fts-prefix':
+            web_params['search']['fts_prefix'] = ' '.join(str(int(n)) for n in arg.split())
+        elif opt == '--web-gloss-fts-prefix':
+            web_params['gloss']['fts_prefix'] = ' '.join(str(int(n)) for n in arg.split())
     if not src or not out_dir:
         print(HELP)
         sys.exit(2)
-    split(src, out_dir, langs, all_languages)
+    split(src, out_dir, langs, all_languages, web_only, web_params)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""Benchmark schema-v2 lookups (sumatora_lookup.py) tier by tier.
+
+    sumatora-benchmark.py -d output/sumatora.db -k output/packs -o bench.json
+
+The query mix is sampled, with a fixed seed, from the build being measured:
+
+    tokens     EntryExample.matched_text, the sentence surfaces gitoeba linked
+               to entries
+    headwords  primary word forms, with is_common forms weighted _COMMON_WEIGHT
+               times heavier
+    glosses    single words taken from SenseGloss texts
+    prefixes   the first 1-4 characters of a headword sample
+
+Every tier in TIERS runs alone (tiers=(tier,)) over the whole mix, against the
+monolithic sumatora.db (-d) and/or the split packs (-k). Each pass below gets a
+fresh Lookup, so the SQLite page cache starts empty and the OS cache is whatever
+earlier runs left warm. Two passes are made per target and tier:
+
+    timing        plain search() calls; p50/p95/p99/max latency, overall and by
+                  query class, plus the share of queries with results
+    instrumented  the same queries with a progress handler and trace callback.
+                  The handler counts VM steps: Python's sqlite3 does not expose
+                  sqlite3_stmt_status, so this stands in for rows scanned. The
+                  bytes the process reads (/proc/self/io rchar) are converted to
+                  pages read from the database files. VM steps per result
+                  exposes a query that walks far more rows than it returns,
+                  even through an index (a SEARCH over every row of a
+                  language is as bad as a SCAN). EXPLAIN QUERY PLAN of the
+                  first traced statements lists the tier's plan and any full
+                  table scans, leaving out FTS5's own shadow tables.
+
+The JSON report (-o) holds all of it; --compare <older report> prints how p50 and
+p95 moved per target and tier, for release-over-release checks.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+"""
+
+__author__ = "Nicolas Centa"
+__license__ = "GPLv3"
+__version__ = "0.1.0"
+
+import getopt
+import heapq
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+
+from sumatora_lookup import TIERS, Lookup, connect_readonly
+
+QUERY_CLASSES = ('tokens', 'headwords', 'glosses', 'prefixes')
+
+_COMMON_WEIGHT = 5
+# The progress handler runs every _PROGRESS_STEP VM instructions.
+_PROGRESS_STEP = 16
+# Traced statements per target and tier that get an EXPLAIN QUERY PLAN.
+_PLAN_SAMPLES = 50
+
+# FTS5 shadow tables: reading them (SCAN ..._config on every MATCH) is normal.
+_FTS5_SHADOW = re.compile(r'_(config|data|idx|docsize|content)$')
+
+_GLOSS_WORD = re.compile(r'[^\W\d_]{3,}')
+
+
+def _sources(path, lang):
+    """(forms db, gloss db, examples db) of a sumatora.db or pack directory."""
+    if not os.path.isdir(path):
+        return path, path, path
+
+    def pack(name):
+        pack_path = os.path.join(path, name)
+        return pack_path if os.path.exists(pack_path) else None
+
+    return (os.path.join(path, 'sumatora_core.db'), pack(f'sumatora_gloss_{lang}.db'),
+            pack(f'sumatora_examples_{lang}.db'))
+
+
+def _sample(rng, rows, k):
+    """Uniform reservoir sample of k items from an iterable."""
+    sample = []
+    for i, row in enumerate(rows):
+        if i < k:
+            sample.append(row)
+        else:
+            j = rng.randrange(i + 1)
+            if j < k:
+                sample[j] = row
+    return sample
+
+
+def _weighted_sample(rng, rows, k):
+    """Weighted sample of k items from (item, weight) pairs without replacement
+    (Efraimidis-Spirakis: keep the k largest random() ** (1 / weight))."""
+    return [item for _key, item in heapq.nlargest(
+        k, ((rng.random() ** (1.0 / weight), item) for item, weight in rows),
+    )]
+
+
+def _rows(path, sql, params=()):
+    if path is None:
+        return
+    conn = connect_readonly(path)
+    try:
+        yield from conn.execute(sql, params)
+    except sqlite3.OperationalError:
+        # A pack without the table (an examples pack that was never built).
+        return
+    finally:
+        conn.close()
+
+
+def build_corpus(path, lang, per_class, seed):
+    """{query class: [query, ...]} sampled from a sumatora.db or pack directory."""
+    rng = random.Random(seed)
+    forms_db, gloss_db, examples_db = _sources(path, lang)
+    corpus = {}
+    corpus['tokens'] = [row[0] for row in _sample(rng, _rows(
+        examples_db,
+        "SELECT DISTINCT matched_text FROM EntryExample WHERE matched_text <> ''",
+    ), per_class)]
+    headwords = _weighted_sample(rng, (
+        (text, _COMMON_WEIGHT if is_common else 1) for text, is_common in _rows(
+            forms_db,
+            'SELECT ef.text, ef.is_common FROM EntryForm ef '
+            'JOIN Entry e ON e.entry_id = ef.entry_id '
+            "WHERE e.entry_type = 'word' AND ef.is_primary = 1",
+        )
+    ), per_class * 2)
+    corpus['headwords'] = headwords[:per_class]
+    corpus['glosses'] = []
+    for (text,) in _sample(rng, _rows(
+        gloss_db, 'SELECT text FROM SenseGloss WHERE lang = ?', (lang,),
+    ), per_class):
+        words = _GLOSS_WORD.findall(text)
+        if words:
+            corpus['glosses'].append(rng.choice(words).lower())
+    corpus['prefixes'] = [
+        text[:rng.randint(1, min(4, len(text)))] for text in headwords[per_class:]
+    ]
+    return corpus
+
+
+def _percentiles(values):
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+
+    def pct(p):
+        return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 3)
+
+    return {'count': len(values), 'p50': pct(0.50), 'p95': pct(0.95), 'p99': pct(0.99),
+            'max': round(values[-1] * 1000, 3)}
+
+
+def _read_bytes():
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _plans(conn, statements):
+    """Distinct EXPLAIN QUERY PLAN details of statements, and the full scans among
+    them (SCAN of a table or index, not of a virtual table such as json_each or an
+    FTS index, nor of an FTS5 shadow table)."""
+    details = set()
+    for sql in statements:
+        try:
+            details.update(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql))
+        except sqlite3.Error:
+            continue
+    return {
+        'plan': sorted(details),
+        'full_scans': sorted(
+            d for d in details
+            if d.startswith('SCAN ') and 'VIRTUAL TABLE' not in d
+            and not _FTS5_SHADOW.search(d.split()[1])
+        ),
+    }
+
+
+def bench_tier(path, langs, tier, corpus, limit):
+    queries = [(cls, q) for cls in QUERY_CLASSES for q in corpus.get(cls, [])]
+    count = len(queries) or 1
+
+    lookup = Lookup(path, langs)
+    try:
+        latencies = {cls: [] for cls in QUERY_CLASSES}
+        hits = 0
+        for cls, query in queries:
+            started = time.perf_counter()
+            results = lookup.search(query, (tier,), limit)
+            latencies[cls].append(time.perf_counter() - started)
+            hits += bool(results)
+    finally:
+        lookup.close()
+
+    report = {
+        'latency_ms': _percentiles([s for values in latencies.values() for s in values]),
+        'latency_ms_by_class': {
+            cls: _percentiles(values) for cls, values in latencies.items()
+        },
+        'hit_rate': round(hits / count, 4),
+    }
+
+    # The timing pass left its Lookup's page cache warm: counting pages on it would
+    # measure almost nothing, so the instrumented pass opens its own.
+    lookup = Lookup(path, langs)
+    conn = lookup.conn
+    try:
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        steps = [0]
+
+        def progress():
+            steps[0] += 1
+            return 0
+
+        statements = []
+
+        def trace(sql):
+            if len(statements) < _PLAN_SAMPLES and sql.lstrip().upper().startswith(
+                    ('SELECT', 'WITH')):
+                statements.append(sql)
+
+        conn.set_progress_handler(progress, _PROGRESS_STEP)
+        conn.set_trace_callback(trace)
+        result_count = 0
+        read_before = _read_bytes()
+        for _cls, query in queries:
+            result_count += len(lookup.search(query, (tier,), limit))
+        read_after = _read_bytes()
+        conn.set_progress_handler(None, 0)
+        conn.set_trace_callback(None)
+
+        report['vm_steps_per_query'] = round(steps[0] * _PROGRESS_STEP / count, 1)
+        report['vm_steps_per_result'] = (
+            round(steps[0] * _PROGRESS_STEP / result_count, 1) if result_count else None)
+        if read_before is not None and read_after is not None:
+            report['bytes_read_per_query'] = round((read_after - read_before) / count, 1)
+            report['pages_read_per_query'] = round(
+                (read_after - read_before) / page_size / count, 2)
+        report.update(_plans(conn, statements))
+        return report
+    finally:
+        lookup.close()
+
+
+def run(targets, langs, corpus, tiers, limit):
+    report = {}
+    for name, path in targets:
+        print(f'Benchmarking {name}: {path}', flush=True)
+        report[name] = {'path': path, 'tiers': {}}
+        for tier in tiers:
+            result = bench_tier(path, langs, tier, corpus, limit)
+            report[name]['tiers'][tier] = result
+            latency = result['latency_ms']
+            print(f'  {tier:<14} p50 {latency.get("p50", 0):>8.3f} ms  '
+                  f'p95 {latency.get("p95", 0):>8.3f} ms  p99 {latency.get("p99", 0):>8.3f} ms  '
+                  f'{result["vm_steps_per_query"]:>10.0f} steps  '
+                  f'{result["vm_steps_per_result"] or 0:>8.0f} steps/result  '
+                  f'{result.get("pages_read_per_query", 0):>8.2f} pages  '
+                  f'hits {result["hit_rate"]:.0%}', flush=True)
+            for scan in result['full_scans']:
+                print(f'    full scan: {scan}', flush=True)
+    return report
+
+
+def compare(old, new):
+    """Print p50/p95 movement between two reports, per target and tier."""
+    for name, target in new['targets'].items():
+        old_target = old.get('targets', {}).get(name)
+        if old_target is None:
+            continue
+        print(f'{name}: {old.get("created_at")} -> {new["created_at"]}')
+        for tier, result in target['tiers'].items():
+            before = old_target['tiers'].get(tier, {}).get('latency_ms', {})
+            after = result['latency_ms']
+            moves = []
+            for key in ('p50', 'p95'):
+                if before.get(key) and after.get(key):
+                    moves.append(f'{key} {before[key]:.3f} -> {after[key]:.3f} ms '
+                                 f'({(after[key] - before[key]) / before[key]:+.0%})')
+            print(f'  {tier:<14} ' + ('  '.join(moves) or 'no baseline'))
+
+
+HELP = (
+    'usage: sumatora-benchmark.py [-d <sumatora.db>] [-k <pack directory>] '
+    '[-l|--lang <code>[,<code>...]] [-n|--per-class <queries>] [-s|--seed <n>] '
+    '[-t|--tiers <tier>[,<tier>...]] [--limit <n>] [-o|--output <report.json>] '
+    '[--compare <older report.json>]'
+)
+
+
+def main(argv):
+    db_path = ''
+    packs_path = ''
+    langs = ('eng',)
+    per_class = 500
+    seed = 1
+    tiers = TIERS
+    limit = 50
+    output = ''
+    compare_path = ''
+    try:
+        opts, _ = getopt.getopt(
+            argv, 'hd:k:l:n:s:t:o:',
+            ['db=', 'packs=', 'lang=', 'per-class=', 'seed=', 'tiers=', 'limit=',
+             'output=', 'compare='],
+        )
+    except getopt.GetoptError:
+        print(HELP)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(HELP)
+            sys.exit()
+        elif opt in ('-d', '--db'):
+            db_path = arg
+        elif opt in ('-k', '--packs'):
+            packs_path = arg
+        elif opt in ('-l', '--lang'):
+            langs = tuple(lang for lang in arg.split(',') if lang)
+        elif opt in ('-n', '--per-class'):
+            per_class = int(arg)
+        elif opt in ('-s', '--seed'):
+            seed = int(arg)
+        elif opt in ('-t', '--tiers'):
+            tiers = tuple(tier for tier in arg.split(',') if tier)
+            unknown = [tier for tier in tiers if tier not in TIERS]
+            if unknown:
+                print(f'unknown tier(s): {", ".join(unknown)}')
+                sys.exit(2)
+        elif opt == '--limit':
+            limit = int(arg)
+        elif opt in ('-o', '--output'):
+            output = arg
+        elif opt == '--compare':
+            compare_path = arg
+    targets = [(name, path) for name, path in (('monolithic', db_path), ('packs', packs_path))
+               if path]
+    if not targets:
+        print(HELP)
+        sys.exit(2)
+
+    # Both targets get the same queries, drawn from the first one.
+    corpus = build_corpus(targets[0][1], langs[0], per_class, seed)
+    print('Query mix: ' + ', '.join(f'{len(corpus[c])} {c}' for c in QUERY_CLASSES), flush=True)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'sqlite_version': sqlite3.sqlite_version,
+        'seed': seed,
+        'per_class': per_class,
+        'limit': limit,
+        'langs': list(langs),
+        'queries': {cls: len(queries) for cls, queries in corpus.items()},
+        'targets': run(targets, langs, corpus, tiers, limit),
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'Report written to {output}', flush=True)
+    if compare_path:
+        with open(compare_path, encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
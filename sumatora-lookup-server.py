@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""Serve schema-v2 lookups (sumatora_lookup.py) as a local HTTP JSON service.
+
+    sumatora-lookup-server.py -d <sumatora.db or pack directory> [-p 8080]
+
+Stdlib only: asyncio accepts and parses HTTP/1.1 requests (keep-alive included),
+and the blocking SQLite work runs on a thread pool. Each worker thread owns one
+read-only Lookup, with the installed packs ATTACHed, created the first time that
+thread serves a request. Connections are never shared between threads.
+
+    GET  /lookup?q=<query>[&tiers=exact_writing,prefix][&limit=50][&types=word,name]
+    POST /lookup/batch  {"queries": ["...", ...], "tiers": [...], "limit": 20, "types": [...]}
+    GET  /stats         request latency percentiles and per-tier hit counts
+    GET  /health
+
+A batch runs all its queries on one worker, one after another, so a client that
+needs many words (a whole sentence's tokens, say) pays one request's overhead.
+
+Results go through one ResultCache shared by every worker (--cache-mb, 0 to turn
+it off). Lookup traffic is dominated by a few thousand common words, and
+--warmup <frequency list> searches the most frequent ones before the server
+starts listening. /stats includes the cache's hit/miss counts.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+"""
+
+__author__ = "Nicolas Centa"
+__license__ = "GPLv3"
+__version__ = "0.1.0"
+
+import asyncio
+import collections
+import concurrent.futures
+import getopt
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+from sumatora_lookup import TIERS, CachedLookup, Lookup, ResultCache, read_frequency_list
+
+# Most recent request latencies kept per endpoint for the /stats percentiles.
+_LATENCY_WINDOW = 10000
+_MAX_BODY = 4 * 1024 * 1024
+_MAX_BATCH = 1000
+# Result limit when a request has none; --warmup caches results for this limit, since
+# the limit is part of the ResultCache key.
+_DEFAULT_LIMIT = 50
+
+# /stats keys request latencies by route; any other path counts as _UNMATCHED, so
+# requests for arbitrary paths cannot add keys.
+_ROUTES = frozenset({'/lookup', '/lookup/batch', '/stats', '/health'})
+_UNMATCHED = '<unmatched>'
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Stats:
+    """Request latencies (a sliding window per endpoint) and per-tier hit counts."""
+
+    def __init__(self, cache=None):
+        self._cache = cache
+        self._lock = threading.Lock()
+        self._latencies = collections.defaultdict(
+            lambda: collections.deque(maxlen=_LATENCY_WINDOW))
+        self._requests = collections.Counter()
+        self._tier_hits = collections.Counter()
+        self._queries = 0
+        self._misses = 0
+        self._started = time.time()
+
+    def record_request(self, endpoint, seconds):
+        with self._lock:
+            self._latencies[endpoint].append(seconds)
+            self._requests[endpoint] += 1
+
+    def record_results(self, results):
+        with self._lock:
+            self._queries += 1
+            if not results:
+                self._misses += 1
+            for result in results:
+                self._tier_hits[result['match_kind']] += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = {
+                endpoint: _percentiles(sorted(window))
+                for endpoint, window in self._latencies.items()
+            }
+            return {
+                'uptime_seconds': round(time.time() - self._started, 1),
+                'requests': dict(self._requests),
+                'latency_ms': latencies,
+                'queries': self._queries,
+                'queries_without_results': self._misses,
+                'tier_hits': {tier: self._tier_hits[tier] for tier in TIERS},
+                'cache': self._cache.stats() if self._cache else None,
+            }
+
+
+def _percentiles(values):
+    if not values:
+        return {}
+
+    def pct(p):
+        return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 3)
+
+    return {'count': len(values), 'p50': pct(0.50), 'p95': pct(0.95), 'p99': pct(0.99),
+            'max': round(values[-1] * 1000, 3)}
+
+
+class LookupPool:
+    """Runs searches on a thread pool; every worker thread gets its own Lookup,
+    wrapped in a CachedLookup over the pool's shared cache when there is one."""
+
+    def __init__(self, path, langs, workers, cache=None):
+        self._path = path
+        self._langs = langs
+        self._cache = cache
+        self._local = threading.local()
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='lookup',
+        )
+
+    def _lookup(self):
+        lookup = getattr(self._local, 'lookup', None)
+        if lookup is None:
+            lookup = Lookup(self._path, self._langs)
+            if self._cache is not None:
+                lookup = CachedLookup(lookup, self._cache)
+            self._local.lookup = lookup
+        return lookup
+
+    def search_many(self, queries, tiers, limit, entry_types):
+        lookup = self._lookup()
+        return [lookup.search(q, tiers, limit, entry_types) for q in queries]
+
+
+def _list_param(name, value, default, allowed=None):
+    if value is None:
+        return default
+    if isinstance(value, str):
+        items = value.split(',')
+    elif isinstance(value, list) and all(isinstance(item, str) for item in value):
+        items = value
+    else:
+        raise HttpError(400, f'{name} must be a comma-separated string or a list of strings')
+    items = tuple(item for item in items if item)
+    if allowed is not None:
+        unknown = [item for item in items if item not in allowed]
+        if unknown:
+            raise HttpError(400, f'unknown value(s): {", ".join(unknown)}')
+    return items or default
+
+
+def _int_param(value, default, upper):
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, 'limit must be an integer')
+    return max(1, min(value, upper))
+
+
+class LookupServer:
+
+    def __init__(self, pool, stats, default_limit=_DEFAULT_LIMIT, max_limit=200):
+        self._pool = pool
+        self._stats = stats
+        self._default_limit = default_limit
+        self._max_limit = max_limit
+
+    async def _search(self, queries, params):
+        tiers = _list_param('tiers', params.get('tiers'), TIERS, TIERS)
+        entry_types = _list_param('types', params.get('types'), ('word',))
+        limit = _int_param(params.get('limit'), self._default_limit, self._max_limit)
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(
+            self._pool.executor, self._pool.search_many, queries, tiers, limit, entry_types,
+        )
+        for query_results in results:
+            self._stats.record_results(query_results)
+        return results
+
+    async def route(self, method, path, query, body):
+        if path == '/lookup':
+            if method != 'GET':
+                raise HttpError(405, 'use GET')
+            params = {k: v[-1] for k, v in urllib.parse.parse_qs(query).items()}
+            if not params.get('q'):
+                raise HttpError(400, 'missing q')
+            results = await self._search([params['q']], params)
+            return {'query': params['q'], 'results': results[0]}
+        if path == '/lookup/batch':
+            if method != 'POST':
+                raise HttpError(405, 'use POST')
+            try:
+                params = json.loads(body or b'{}')
+            except ValueError:
+                raise HttpError(400, 'body is not JSON')
+            queries = params.get('queries') if isinstance(params, dict) else None
+            if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+                raise HttpError(400, 'queries must be a list of strings')
+            if len(queries) > _MAX_BATCH:
+                raise HttpError(413, f'at most {_MAX_BATCH} queries per batch')
+            results = await self._search(queries, params)
+            return {'results': [{'query': q, 'results': r} for q, r in zip(queries, results)]}
+        if path == '/stats':
+            return self._stats.snapshot()
+        if path == '/health':
+            return {'status': 'ok'}
+        raise HttpError(404, f'no such endpoint: {path}')
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get('content-length') or '0'
+                if not length.isascii() or not length.isdigit():
+                    await self._respond(writer, 400, {'error': 'invalid Content-Length'}, False)
+                    break
+                length = int(length)
+                if length > _MAX_BODY:
+                    await self._respond(writer, 413, {'error': 'body too large'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version == 'HTTP/1.1')
+
+                path, _, query = target.partition('?')
+                started = time.perf_counter()
+                try:
+                    status, payload = 200, await self.route(method, path, query, body)
+                except HttpError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    status, payload = 500, {'error': f'{type(e).__name__}: {e}'}
+                self._stats.record_request(
+                    path if path in _ROUTES else _UNMATCHED, time.perf_counter() - started)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f'HTTP/1.1 {status} {_REASONS.get(status, "")}\r\n'
+            'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+            '\r\n'.encode('latin-1') + body
+        )
+        await writer.drain()
+
+
+async def serve(db_path, host, port, langs, workers, cache_bytes, warmup_path, warmup_top):
+    cache = ResultCache(cache_bytes) if cache_bytes > 0 else None
+    pool = LookupPool(db_path, langs, workers, cache)
+    if cache is not None and warmup_path:
+        queries = read_frequency_list(warmup_path, warmup_top)
+        print(f'Warming the result cache with {len(queries)} queries...', flush=True)
+        await asyncio.get_running_loop().run_in_executor(
+            pool.executor, pool.search_many, queries, TIERS, _DEFAULT_LIMIT, ('word',),
+        )
+        print(f'  {cache.stats()["entries"]} results cached', flush=True)
+    server = LookupServer(pool, Stats(cache))
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f'Serving {db_path} on http://{host}:{port} '
+          f'({workers} lookup threads, langs: {",".join(langs)})', flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        pool.executor.shutdown(wait=True)
+
+
+HELP = (
+    'usage: sumatora-lookup-server.py -d <sumatora.db or pack directory> '
+    '[--host <address>] [-p|--port <port>] [-l|--lang <code>[,<code>...]] '
+    '[-j|--jobs <lookup threads>] [--cache-mb <n>] '
+    '[--warmup <frequency list> [--warmup-top <n>]]'
+)
+
+
+def main(argv):
+    db_path = ''
+    host = '127.0.0.1'
+    port = 8080
+    langs = ('eng',)
+    workers = os.cpu_count() or 1
+    cache_mb = 64
+    warmup_path = None
+    warmup_top = 5000
+    try:
+        opts, _ = getopt.getopt(
+            argv, 'hd:p:l:j:',
+            ['db=', 'host=', 'port=', 'lang=', 'jobs=', 'cache-mb=', 'warmup=', 'warmup-top='],
+        )
+    except getopt.GetoptError:
+        print(HELP)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(HELP)
+            sys.exit()
+        elif opt in ('-d', '--db'):
+            db_path = arg
+        elif opt == '--host':
+            host = arg
+        elif opt in ('-p', '--port'):
+            port = int(arg)
+        elif opt in ('-l', '--lang'):
+            langs = tuple(lang for lang in arg.split(',') if lang)
+        elif opt in ('-j', '--jobs'):
+            workers = int(arg)
+        elif opt == '--cache-mb':
+            cache_mb = int(arg)
+        elif opt == '--warmup':
+            warmup_path = arg
+        elif opt == '--warmup-top':
+            warmup_top = int(arg)
+    if not db_path:
+        print(HELP)
+        sys.exit(2)
+    try:
+        asyncio.run(serve(
+            db_path, host, port, langs, workers, cache_mb * 1024 * 1024,
+            warmup_path, warmup_top,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
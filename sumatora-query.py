@@ -20,6 +20,8 @@ import json
 import sqlite3
 import os
 
+from sumatora_lookup import Lookup
+
 # ---------------------------------------------------------------------------
 # FTS search tiers — tried in priority order.
 # Each tuple is (fts5_column, form_type) where form_type is 'kanji' or 'kana'.
@@ -162,6 +164,20 @@ def test_query(a_dir, a_lang, a_expr):
     conn.close()
 
 
+def test_query_v2(a_path, a_lang, a_expr):
+    """Same report for a schema-v2 sumatora.db or split-pack directory."""
+    lookup = Lookup(a_path, langs=(a_lang,))
+    for result in lookup.search(a_expr):
+        form = result['form'] or {}
+        print(f"seq={result['source_key']}  score={result['score']}  "
+              f"tier={result['match_kind']}  matched={result['matched_text']!r}  "
+              f"form_type={form.get('form_type')}")
+        for sense in result['senses']:
+            for g in sense['glosses'].get(a_lang, []):
+                print(f'  {g}')
+    lookup.close()
+
+
 parser = argparse.ArgumentParser()
 
 parser.add_argument('dir')
@@ -170,4 +186,7 @@ parser.add_argument('expr')
 
 args = parser.parse_args()
 
-test_query(args.dir, args.lang, args.expr)
+if os.path.exists(os.path.join(args.dir, 'jmdict.db')):
+    test_query(args.dir, args.lang, args.expr)
+else:
+    test_query_v2(args.dir, args.lang, args.expr)
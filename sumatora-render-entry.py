@@ -176,7 +176,7 @@ def restriction_label(conn, entry_id, sense_id, forms):
 def example_for_sense(conn, entry_id, sense_id, first_sense_id, lang):
     """Tatoeba example linked to this sense, falling back onto the entry's
     first sense for examples with no senseNumber in the source corpus (see
-    gitoeba-to-sumatora-db.py's _sense_id()) — purely a display choice, not a
+    gitoeba-to-sumatora-db.py's TokenResolver.sense_id()) — purely a display choice, not a
     claim that the source data actually ties the sentence to that sense."""
     row = conn.execute(
         "SELECT ee.example_id, ee.matched_text FROM EntryExample ee "
@@ -187,9 +187,16 @@ def example_for_sense(conn, entry_id, sense_id, first_sense_id, lang):
     if not row:
         return None
     example_id, matched_text = row
+    # Segments live in ExampleSegment, or in ExampleSentenceSegment for DBs built with
+    # the shared segment layout (see Example.sentence_id in sumatora_schema.py).
     seg_rows = conn.execute(
-        "SELECT base, ruby FROM ExampleSegment WHERE example_id = ? ORDER BY ord",
-        (example_id,),
+        "SELECT base, ruby FROM ("
+        "SELECT ord, base, ruby FROM ExampleSegment WHERE example_id = ? "
+        "UNION ALL "
+        "SELECT s.ord, s.base, s.ruby FROM Example e "
+        "JOIN ExampleSentenceSegment s ON s.sentence_id = e.sentence_id "
+        "WHERE e.example_id = ?) ORDER BY ord",
+        (example_id, example_id),
     ).fetchall()
     if not seg_rows:
         return None
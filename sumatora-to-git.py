@@ -156,9 +156,16 @@ def example_for_sense(conn, entry_id, sense_id, first_sense_id):
 
 
 def example_japanese(conn, example_id):
+    # Segments live in ExampleSegment, or in ExampleSentenceSegment for DBs built with
+    # the shared segment layout (see Example.sentence_id in sumatora_schema.py).
     segs = conn.execute(
-        "SELECT base, ruby FROM ExampleSegment WHERE example_id = ? ORDER BY ord",
-        (example_id,)).fetchall()
+        "SELECT base, ruby FROM ("
+        "SELECT ord, base, ruby FROM ExampleSegment WHERE example_id = ? "
+        "UNION ALL "
+        "SELECT s.ord, s.base, s.ruby FROM Example e "
+        "JOIN ExampleSentenceSegment s ON s.sentence_id = e.sentence_id "
+        "WHERE e.example_id = ?) ORDER BY ord",
+        (example_id, example_id)).fetchall()
     if not segs:
         return None
     return {
@@ -0,0 +1,733 @@
+#!/usr/bin/env python3
+"""Count the HTTP range requests the PWA's online search makes against the web packs.
+
+    sumatora-web-range-sim.py -k output/packs -o range.json
+    sumatora-web-range-sim.py -i output/sumatora.db -k output/packs \\
+        --sweep page_size=4096,8192,16384,32768 --sweep prefix_threshold=25,50,100
+
+sumatora_web_search.db and sumatora_web_gloss_{lang}.db (split-sumatora-packs.py's
+_web_search() and _web_gloss()) are read by the PWA through SQLite WASM over
+HTTP range requests. This tool opens them through a read-only SQLite VFS that
+models that HTTP VFS. The VFS is registered with ctypes on the libsqlite3 the
+sqlite3 module itself uses. Every xRead is served from a RangeClient:
+
+    - reads are split into chunk_size pieces (the pack's page size by default)
+      and looked up in an LRU of cache_bytes (the PWA's HTTP VFS cache, 16 MiB);
+    - the missing run of chunks is fetched as one request, i.e. one round trip;
+    - a request that starts right after the previous one doubles the read-ahead,
+      up to max_chunks chunks (sequential reads, such as an FTS5 posting list,
+      merge into super-pages); any other request resets it to one chunk.
+
+The replay follows the PWA's strategy (Database.md, Web Search Pack and Web Gloss
+Pack). Every query is typed one character at a time and each keystroke is
+searched:
+
+    forward  WebSearchFts phrase match (exact), then WebSearchPrefixTop for the
+             query's script, falling back to a live WebSearchFts prefix match
+    reverse  only when the forward search finds nothing: WebGlossExactTop, else
+             GlossAll/GlossAllFts exact, then WebGlossPrefixTop, else
+             GlossAll/GlossAllFts prefix
+
+For each keystroke it records round trips, bytes transferred and SQLite pages
+read. It also records an estimated wait: round trips * --rtt-ms plus bytes at
+--mbps. The caches live for the whole replay, like one PWA session: the HTTP VFS
+cache above, and SQLite's own page cache in front of it, sized like the PWA's
+SQLite WASM build (_PAGE_CACHE_KIB). --cold empties both before every query by
+clearing the RangeClients and reopening the packs; the reads the reopen makes
+(header and schema) are not counted against the query.
+
+Queries come from a list (-q, one per line) or are sampled from the core and
+gloss packs: readings of common words, and single gloss words. --sweep
+<parameter>=<v1>,<v2>,... rebuilds the web packs once per value with
+split-sumatora-packs.py --web-only, from the monolithic sumatora.db (-i) and the
+core/gloss packs in -k. Parameters are varied one at a time around the defaults.
+The report (-o) names the setting with the lowest estimated total wait.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+"""
+
+__author__ = "Nicolas Centa"
+__license__ = "GPLv3"
+__version__ = "0.1.0"
+
+import atexit
+import collections
+import ctypes
+import ctypes.util
+import getopt
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from sumatora_common import hira_to_kata
+from sumatora_lookup import _fts_phrase, connect_readonly, read_frequency_list
+
+# The PWA's result page size (MAX_ONLINE_RESULTS).
+_MAX_RESULTS = 54
+
+_SQLITE_OK = 0
+_SQLITE_IOERR = 10
+_SQLITE_READONLY = 8
+_SQLITE_NOTFOUND = 12
+_SQLITE_CANTOPEN = 14
+_SQLITE_IOERR_SHORT_READ = 522
+_SQLITE_OPEN_READONLY = 0x00000001
+_SQLITE_OPEN_MAIN_DB = 0x00000100
+_SQLITE_IOCAP_IMMUTABLE = 0x00002000
+
+_VFS_NAME = b'sumatora_range'
+
+# sweep parameter -> split-sumatora-packs.py option
+_SWEEP_OPTIONS = {
+    'page_size': '--web-page-size',
+    'prefix_threshold': '--prefix-top-threshold',
+    'prefix_cap': '--prefix-top-cap',
+    'search_fts_prefix': '--web-search-fts-prefix',
+    'gloss_fts_prefix': '--web-gloss-fts-prefix',
+}
+
+_KANA = re.compile(r'^[぀-ヿー]+$')
+_LATIN = re.compile(r'^[A-Za-z]+$')
+_GLOSS_WORD = re.compile(r'[A-Za-z]{3,}')
+
+_FORWARD_EXACT_SQL = (
+    'SELECT wr.source_key FROM WebSearchFts f '
+    'JOIN WebSearchResult wr ON wr.search_id = f.rowid '
+    'WHERE WebSearchFts MATCH ? '
+    'ORDER BY wr.script_order, wr.priority DESC, wr.entry_score DESC, wr.entry_id LIMIT ?'
+)
+_FORWARD_TOP_SQL = (
+    'SELECT source_key FROM WebSearchPrefixTop WHERE script_order = ? AND prefix = ? '
+    'ORDER BY priority_class DESC, entry_score DESC, entry_id LIMIT ?'
+)
+_GLOSS_EXACT_TOP_SQL = (
+    'SELECT source_key FROM WebGlossExactTop WHERE term = ? '
+    'ORDER BY sense_ord, entry_id LIMIT ?'
+)
+_GLOSS_PREFIX_TOP_SQL = (
+    'SELECT source_key FROM WebGlossPrefixTop WHERE prefix = ? '
+    'ORDER BY sense_ord, entry_id LIMIT ?'
+)
+_GLOSS_ALL_SQL = (
+    'SELECT ga.source_key FROM GlossAll ga '
+    'WHERE ga.rowid IN (SELECT rowid FROM GlossAllFts WHERE GlossAllFts MATCH ?) LIMIT ?'
+)
+
+
+# SQLite WASM keeps SQLite's default page cache, cache_size = -2000 (2000 KiB);
+# set explicitly so the model does not depend on the local libsqlite3's default.
+_PAGE_CACHE_KIB = 2000
+
+
+class RangeClient:
+    """Counting stand-in for the PWA's HTTP VFS over one file."""
+
+    def __init__(self, path, cache_bytes, chunk_size, max_chunks):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self._file = open(path, 'rb')
+        self._cache = collections.OrderedDict()  # chunk number -> bytes
+        self._cache_chunks = max(1, cache_bytes // chunk_size)
+        self._next_chunk = None
+        self._readahead = 1
+        self.requests = self.bytes = self.reads = 0
+
+    def clear(self):
+        self._cache.clear()
+        self._next_chunk = None
+        self._readahead = 1
+
+    def _fetch(self, first, count):
+        if first == self._next_chunk:
+            self._readahead = min(self._readahead * 2, self.max_chunks)
+        else:
+            self._readahead = 1
+        count = max(count, self._readahead)
+        last_chunk = (self.size - 1) // self.chunk_size
+        count = min(count, last_chunk + 1 - first)
+        self._file.seek(first * self.chunk_size)
+        data = self._file.read(count * self.chunk_size)
+        self.requests += 1
+        self.bytes += len(data)
+        self._next_chunk = first + count
+        chunks = [data[i * self.chunk_size:(i + 1) * self.chunk_size] for i in range(count)]
+        for i, chunk in enumerate(chunks):
+            self._cache[first + i] = chunk
+            self._cache.move_to_end(first + i)
+        while len(self._cache) > self._cache_chunks:
+            self._cache.popitem(last=False)
+        return chunks
+
+    def read(self, offset, amount):
+        self.reads += 1
+        end = min(offset + amount, self.size)
+        if offset >= end:
+            return b''
+        first = offset // self.chunk_size
+        last = (end - 1) // self.chunk_size
+        pieces = []
+        chunk = first
+        while chunk <= last:
+            if chunk in self._cache:
+                self._cache.move_to_end(chunk)
+                pieces.append(self._cache[chunk])
+                chunk += 1
+                continue
+            missing = chunk
+            while missing <= last and missing not in self._cache:
+                missing += 1
+            pieces += self._fetch(chunk, missing - chunk)[:missing - chunk]
+            chunk = missing
+        data = b''.join(pieces)
+        start = offset - first * self.chunk_size
+        return data[start:start + (end - offset)]
+
+    def close(self):
+        self._file.close()
+
+
+class _File(ctypes.Structure):
+    pass
+
+
+_XClose = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_File))
+_XRead = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_File), ctypes.c_void_p,
+                          ctypes.c_int, ctypes.c_int64)
+_XWrite = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_File), ctypes.c_void_p,
+                           ctypes.c_int, ctypes.c_int64)
+_XTruncate = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_File), ctypes.c_int64)
+_XSync = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_File), ctypes.c_int)
+_XFileSize = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_File),
+                              ctypes.POINTER(ctypes.c_int64))
+_XLock = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_File), ctypes.c_int)
+_XCheckReservedLock = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_File),
+                                       ctypes.POINTER(ctypes.c_int))
+_XFileControl = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_File), ctypes.c_int,
+                                 ctypes.c_void_p)
+_XSectorSize = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_File))
+
+
+class _IoMethods(ctypes.Structure):
+    _fields_ = [
+        ('iVersion', ctypes.c_int),
+        ('xClose', _XClose),
+        ('xRead', _XRead),
+        ('xWrite', _XWrite),
+        ('xTruncate', _XTruncate),
+        ('xSync', _XSync),
+        ('xFileSize', _XFileSize),
+        ('xLock', _XLock),
+        ('xUnlock', _XLock),
+        ('xCheckReservedLock', _XCheckReservedLock),
+        ('xFileControl', _XFileControl),
+        ('xSectorSize', _XSectorSize),
+        ('xDeviceCharacteristics', _XSectorSize),
+    ]
+
+
+_File._fields_ = [('pMethods', ctypes.POINTER(_IoMethods)), ('handle', ctypes.c_int)]
+
+
+class _Vfs(ctypes.Structure):
+    pass
+
+
+_XOpen = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_Vfs), ctypes.c_char_p,
+                          ctypes.POINTER(_File), ctypes.c_int, ctypes.POINTER(ctypes.c_int))
+_XDelete = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_Vfs), ctypes.c_char_p, ctypes.c_int)
+_XAccess = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_Vfs), ctypes.c_char_p, ctypes.c_int,
+                            ctypes.POINTER(ctypes.c_int))
+_XFullPathname = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(_Vfs), ctypes.c_char_p,
+                                  ctypes.c_int, ctypes.c_void_p)
+
+# Loader, randomness, sleep and clock entries are copied from the default VFS.
+_Vfs._fields_ = [
+    ('iVersion', ctypes.c_int),
+    ('szOsFile', ctypes.c_int),
+    ('mxPathname', ctypes.c_int),
+    ('pNext', ctypes.c_void_p),
+    ('zName', ctypes.c_char_p),
+    ('pAppData', ctypes.c_void_p),
+    ('xOpen', _XOpen),
+    ('xDelete', _XDelete),
+    ('xAccess', _XAccess),
+    ('xFullPathname', _XFullPathname),
+    ('xDlOpen', ctypes.c_void_p),
+    ('xDlError', ctypes.c_void_p),
+    ('xDlSym', ctypes.c_void_p),
+    ('xDlClose', ctypes.c_void_p),
+    ('xRandomness', ctypes.c_void_p),
+    ('xSleep', ctypes.c_void_p),
+    ('xCurrentTime', ctypes.c_void_p),
+    ('xGetLastError', ctypes.c_void_p),
+]
+
+
+class RangeVfs:
+    """The registered VFS. Files opened through it are served by the RangeClient
+    registered for their path with add(); nothing else can be opened."""
+
+    def __init__(self):
+        self.clients = {}  # absolute path -> RangeClient
+        self._open_files = {}  # handle -> RangeClient
+        self._next_handle = 1
+        self._connections = []
+
+        lib = ctypes.CDLL(ctypes.util.find_library('sqlite3'))
+        lib.sqlite3_vfs_find.restype = ctypes.POINTER(_Vfs)
+        lib.sqlite3_vfs_find.argtypes = [ctypes.c_char_p]
+        lib.sqlite3_vfs_register.argtypes = [ctypes.POINTER(_Vfs), ctypes.c_int]
+        default = lib.sqlite3_vfs_find(None).contents
+
+        # Every callback object must stay referenced for as long as SQLite may call it.
+        self._methods = _IoMethods(
+            1, _XClose(self._close), _XRead(self._read), _XWrite(self._readonly),
+            _XTruncate(self._readonly), _XSync(self._ok), _XFileSize(self._file_size),
+            _XLock(self._ok), _XLock(self._ok), _XCheckReservedLock(self._check_lock),
+            _XFileControl(self._file_control), _XSectorSize(self._zero),
+            _XSectorSize(self._immutable),
+        )
+        self._vfs = _Vfs(
+            1, ctypes.sizeof(_File), default.mxPathname, None, _VFS_NAME, None,
+            _XOpen(self._open), _XDelete(self._delete), _XAccess(self._access),
+            _XFullPathname(self._full_pathname),
+            default.xDlOpen, default.xDlError, default.xDlSym, default.xDlClose,
+            default.xRandomness, default.xSleep, default.xCurrentTime, default.xGetLastError,
+        )
+        lib.sqlite3_vfs_register(ctypes.byref(self._vfs), 0)
+        # A connection still open at interpreter teardown would call xClose after
+        # the callbacks above are gone.
+        atexit.register(self._close_connections)
+
+    def _close_connections(self):
+        for conn in self._connections:
+            conn.close()
+
+    def add(self, client):
+        self.clients[os.path.abspath(client.path)] = client
+
+    def connect(self, path):
+        conn = sqlite3.connect(
+            f'file:{os.path.abspath(path)}?vfs={_VFS_NAME.decode()}&mode=ro&immutable=1',
+            uri=True, check_same_thread=False,
+        )
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute(f'PRAGMA cache_size = -{_PAGE_CACHE_KIB}')
+        self._connections.append(conn)
+        return conn
+
+    def disconnect(self, conn):
+        self._connections.remove(conn)
+        conn.close()
+
+    @staticmethod
+    def _guard(fn):
+        try:
+            return fn()
+        except Exception as e:
+            print(f'range VFS error: {type(e).__name__}: {e}', file=sys.stderr, flush=True)
+            return _SQLITE_IOERR
+
+    def _open(self, _vfs, name, file, flags, out_flags):
+        file.contents.pMethods = None
+        if not name or not flags & _SQLITE_OPEN_MAIN_DB:
+            return _SQLITE_CANTOPEN
+        client = self.clients.get(os.path.abspath(name.decode('utf-8')))
+        if client is None:
+            return _SQLITE_CANTOPEN
+        handle = self._next_handle
+        self._next_handle += 1
+        self._open_files[handle] = client
+        file.contents.handle = handle
+        file.contents.pMethods = ctypes.pointer(self._methods)
+        if out_flags:
+            out_flags[0] = _SQLITE_OPEN_READONLY
+        return _SQLITE_OK
+
+    def _delete(self, _vfs, _name, _sync_dir):
+        return _SQLITE_READONLY
+
+    def _access(self, _vfs, name, _flags, result):
+        result[0] = int(os.path.abspath(name.decode('utf-8')) in self.clients)
+        return _SQLITE_OK
+
+    def _full_pathname(self, _vfs, name, size, out):
+        path = os.path.abspath(name.decode('utf-8')).encode('utf-8') + b'\0'
+        if len(path) > size:
+            return _SQLITE_CANTOPEN
+        ctypes.memmove(out, path, len(path))
+        return _SQLITE_OK
+
+    def _close(self, file):
+        self._open_files.pop(file.contents.handle, None)
+        return _SQLITE_OK
+
+    def _read(self, file, buffer, amount, offset):
+        def read():
+            data = self._open_files[file.contents.handle].read(offset, amount)
+            ctypes.memmove(buffer, data, len(data))
+            if len(data) < amount:
+                ctypes.memset(buffer + len(data), 0, amount - len(data))
+                return _SQLITE_IOERR_SHORT_READ
+            return _SQLITE_OK
+        return self._guard(read)
+
+    def _file_size(self, file, size):
+        size[0] = self._open_files[file.contents.handle].size
+        return _SQLITE_OK
+
+    def _check_lock(self, _file, result):
+        result[0] = 0
+        return _SQLITE_OK
+
+    @staticmethod
+    def _file_control(_file, _op, _arg):
+        return _SQLITE_NOTFOUND
+
+    @staticmethod
+    def _readonly(*_args):
+        return _SQLITE_READONLY
+
+    @staticmethod
+    def _ok(*_args):
+        return _SQLITE_OK
+
+    @staticmethod
+    def _zero(_file):
+        return 0
+
+    @staticmethod
+    def _immutable(_file):
+        return _SQLITE_IOCAP_IMMUTABLE
+
+
+def _page_size(path):
+    conn = connect_readonly(path)
+    try:
+        return conn.execute('PRAGMA page_size').fetchone()[0]
+    finally:
+        conn.close()
+
+
+class WebSession:
+    """The PWA's web-pack search, replayed over RangeClients."""
+
+    def __init__(self, vfs, pack_dir, lang, cache_bytes, max_chunks):
+        self._vfs = vfs
+        self.clients = []
+        self._search = self._gloss = None
+        self._gloss_v2 = False
+        self._search_path = os.path.join(pack_dir, 'sumatora_web_search.db')
+        self._gloss_path = os.path.join(pack_dir, f'sumatora_web_gloss_{lang}.db')
+        if not os.path.exists(self._search_path):
+            raise FileNotFoundError(self._search_path)
+        for path in (self._search_path, self._gloss_path):
+            if os.path.exists(path):
+                client = RangeClient(path, cache_bytes, _page_size(path), max_chunks)
+                vfs.add(client)
+                self.clients.append(client)
+        self._open()
+
+    def _open(self):
+        self._search = self._vfs.connect(self._search_path)
+        if os.path.exists(self._gloss_path):
+            self._gloss = self._vfs.connect(self._gloss_path)
+            self._gloss_v2 = self._gloss.execute('PRAGMA user_version').fetchone()[0] >= 2
+
+    def _disconnect(self):
+        for conn in (self._search, self._gloss):
+            if conn is not None:
+                self._vfs.disconnect(conn)
+        self._search = self._gloss = None
+
+    def totals(self):
+        return (sum(c.requests for c in self.clients), sum(c.bytes for c in self.clients),
+                sum(c.reads for c in self.clients))
+
+    def clear(self):
+        """Empty the HTTP cache and SQLite's page cache, as a fresh page load would."""
+        self._disconnect()
+        for client in self.clients:
+            client.clear()
+        self._open()
+
+    def _forward(self, query):
+        kana = hira_to_kata(query)
+        rows = self._search.execute(
+            _FORWARD_EXACT_SQL,
+            ('normalized : (' + ' OR '.join(_fts_phrase(v) for v in sorted({query, kana})) + ')',
+             _MAX_RESULTS),
+        ).fetchall()
+        if len(rows) >= _MAX_RESULTS:
+            return rows
+        if _LATIN.match(query):
+            script_order, prefix = 2, query.lower()
+        elif _KANA.match(query):
+            script_order, prefix = 1, kana
+        else:
+            script_order, prefix = 0, query
+        top = self._search.execute(
+            _FORWARD_TOP_SQL, (script_order, prefix, _MAX_RESULTS),
+        ).fetchall()
+        if top:
+            return rows + top
+        return rows + self._search.execute(
+            _FORWARD_EXACT_SQL, ('normalized : ' + _fts_phrase(prefix) + '*', _MAX_RESULTS),
+        ).fetchall()
+
+    def _reverse(self, query):
+        if self._gloss is None:
+            return []
+        term = query.lower()
+        rows = self._gloss.execute(_GLOSS_EXACT_TOP_SQL, (term, _MAX_RESULTS)).fetchall()
+        if not rows and self._gloss_v2:
+            rows = self._gloss.execute(
+                _GLOSS_ALL_SQL, (_fts_phrase(term), _MAX_RESULTS)).fetchall()
+        if len(rows) >= _MAX_RESULTS:
+            return rows
+        top = self._gloss.execute(_GLOSS_PREFIX_TOP_SQL, (term, _MAX_RESULTS)).fetchall()
+        if not top and self._gloss_v2:
+            top = self._gloss.execute(
+                _GLOSS_ALL_SQL, (_fts_phrase(term) + '*', _MAX_RESULTS)).fetchall()
+        return rows + top
+
+    def search(self, query):
+        """(results, round trips, bytes, pages read) of one keystroke's search."""
+        before = self.totals()
+        results = self._forward(query)
+        if not results:
+            results = self._reverse(query)
+        after = self.totals()
+        return len(results), after[0] - before[0], after[1] - before[1], after[2] - before[2]
+
+    def close(self):
+        self._disconnect()
+        for client in self.clients:
+            client.close()
+
+
+def sample_queries(pack_dir, lang, count, seed):
+    """Readings of common words and single gloss words, half each."""
+    rng = random.Random(seed)
+    queries = []
+    core = os.path.join(pack_dir, 'sumatora_core.db')
+    if os.path.exists(core):
+        conn = connect_readonly(core)
+        readings = [row[0] for row in conn.execute(
+            'SELECT DISTINCT ef.text FROM EntryForm ef JOIN Entry e ON e.entry_id = ef.entry_id '
+            "WHERE e.entry_type = 'word' AND ef.form_type = 'reading' AND ef.is_common = 1",
+        )]
+        conn.close()
+        queries += rng.sample(readings, min(len(readings), count // 2))
+    gloss = os.path.join(pack_dir, f'sumatora_gloss_{lang}.db')
+    if os.path.exists(gloss):
+        conn = connect_readonly(gloss)
+        words = sorted({
+            word.lower() for (text,) in conn.execute(
+                'SELECT text FROM SenseGloss WHERE lang = ?', (lang,))
+            for word in _GLOSS_WORD.findall(text)
+        })
+        conn.close()
+        queries += rng.sample(words, min(len(words), count - len(queries)))
+    rng.shuffle(queries)
+    return queries
+
+
+def _summary(values):
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+
+    def pct(p):
+        return values[min(len(values) - 1, int(p * len(values)))]
+
+    return {'count': len(values), 'mean': round(sum(values) / len(values), 2),
+            'p50': pct(0.50), 'p95': pct(0.95), 'max': values[-1]}
+
+
+def replay(vfs, pack_dir, lang, queries, cache_bytes, max_chunks, cold, rtt_ms, mbps):
+    session = WebSession(vfs, pack_dir, lang, cache_bytes, max_chunks)
+    try:
+        trips, sizes, pages, waits, worst = [], [], [], [], []
+        for query in queries:
+            if cold:
+                session.clear()
+            for end in range(1, len(query) + 1):
+                keystroke = query[:end]
+                _results, n_trips, n_bytes, n_pages = session.search(keystroke)
+                wait = n_trips * rtt_ms + n_bytes * 8 / (mbps * 1000)
+                trips.append(n_trips)
+                sizes.append(n_bytes)
+                pages.append(n_pages)
+                waits.append(round(wait, 1))
+                worst.append((n_trips, keystroke))
+        pack_bytes = sum(client.size for client in session.clients)
+        return {
+            'keystrokes': len(trips),
+            'round_trips': _summary(trips),
+            'bytes': _summary(sizes),
+            'pages_read': _summary(pages),
+            'estimated_wait_ms': _summary(waits),
+            'total_round_trips': sum(trips),
+            'total_bytes': sum(sizes),
+            'total_estimated_wait_ms': round(sum(waits), 1),
+            'pack_bytes': pack_bytes,
+            'worst_keystrokes': [
+                {'query': q, 'round_trips': n} for n, q in sorted(worst, reverse=True)[:10]
+            ],
+        }
+    finally:
+        session.close()
+
+
+def _build_variant(script_dir, src, pack_dir, lang, work_dir, overrides):
+    """Web packs built with overrides in a scratch directory holding links to
+    pack_dir's core and gloss packs."""
+    out_dir = tempfile.mkdtemp(dir=work_dir)
+    for name in ('sumatora_core.db', f'sumatora_gloss_{lang}.db'):
+        os.symlink(os.path.abspath(os.path.join(pack_dir, name)), os.path.join(out_dir, name))
+    cmd = [sys.executable, os.path.join(script_dir, 'split-sumatora-packs.py'),
+           '-i', src, '-o', out_dir, '--lang', lang, '--web-only']
+    for name, value in overrides.items():
+        cmd += [_SWEEP_OPTIONS[name], str(value)]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    return out_dir
+
+
+HELP = (
+    'usage: sumatora-web-range-sim.py -k <pack directory> [-i <sumatora.db>] '
+    '[-l|--lang <code>] [-q|--queries <file>] [-n|--count <queries>] [-s|--seed <n>] '
+    '[--cache-mb <n>] [--max-chunks <n>] [--cold] [--rtt-ms <ms>] [--mbps <n>] '
+    '[--sweep <parameter>=<v1>,<v2>,...] [-o|--output <report.json>]\n'
+    'sweep parameters: ' + ', '.join(_SWEEP_OPTIONS)
+)
+
+
+def _print_result(label, result):
+    print(f'  {label:<32} trips/keystroke mean {result["round_trips"].get("mean", 0):>6.2f} '
+          f'p95 {result["round_trips"].get("p95", 0):>4}  '
+          f'KiB/keystroke {result["bytes"].get("mean", 0) / 1024:>8.1f}  '
+          f'est. wait {result["total_estimated_wait_ms"] / 1000:>7.1f} s  '
+          f'packs {result["pack_bytes"] / 1024 / 1024:.1f} MiB', flush=True)
+
+
+def main(argv):
+    src = ''
+    pack_dir = ''
+    lang = 'eng'
+    queries_path = ''
+    count = 200
+    seed = 1
+    cache_mb = 16
+    max_chunks = 32
+    cold = False
+    rtt_ms = 50.0
+    mbps = 20.0
+    sweeps = {}
+    output = ''
+    try:
+        opts, _ = getopt.getopt(
+            argv, 'hi:k:l:q:n:s:o:',
+            ['input=', 'packs=', 'lang=', 'queries=', 'count=', 'seed=', 'cache-mb=',
+             'max-chunks=', 'cold', 'rtt-ms=', 'mbps=', 'sweep=', 'output='],
+        )
+    except getopt.GetoptError:
+        print(HELP)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(HELP)
+            sys.exit()
+        elif opt in ('-i', '--input'):
+            src = arg
+        elif opt in ('-k', '--packs'):
+            pack_dir = arg
+        elif opt in ('-l', '--lang'):
+            lang = arg
+        elif opt in ('-q', '--queries'):
+            queries_path = arg
+        elif opt in ('-n', '--count'):
+            count = int(arg)
+        elif opt in ('-s', '--seed'):
+            seed = int(arg)
+        elif opt == '--cache-mb':
+            cache_mb = float(arg)
+        elif opt == '--max-chunks':
+            max_chunks = int(arg)
+        elif opt == '--cold':
+            cold = True
+        elif opt == '--rtt-ms':
+            rtt_ms = float(arg)
+        elif opt == '--mbps':
+            mbps = float(arg)
+        elif opt == '--sweep':
+            name, _, values = arg.partition('=')
+            if name not in _SWEEP_OPTIONS or not values:
+                print(HELP)
+                sys.exit(2)
+            sweeps[name] = [v for v in values.split(',') if v]
+        elif opt in ('-o', '--output'):
+            output = arg
+    if not pack_dir or (sweeps and not src):
+        print(HELP)
+        sys.exit(2)
+
+    queries = (read_frequency_list(queries_path, count) if queries_path
+               else sample_queries(pack_dir, lang, count, seed))
+    print(f'Replaying {len(queries)} queries '
+          f'({sum(len(q) for q in queries)} keystrokes)', flush=True)
+    cache_bytes = int(cache_mb * 1024 * 1024)
+    vfs = RangeVfs()
+
+    def run(directory):
+        return replay(vfs, directory, lang, queries, cache_bytes, max_chunks, cold,
+                      rtt_ms, mbps)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'queries': len(queries),
+        'model': {'cache_bytes': cache_bytes, 'max_chunks': max_chunks, 'cold': cold,
+                  'sqlite_cache_size': -_PAGE_CACHE_KIB, 'rtt_ms': rtt_ms, 'mbps': mbps},
+        'packs': run(pack_dir),
+        'sweep': [],
+    }
+    _print_result('packs as built', report['packs'])
+
+    if sweeps:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        work_dir = tempfile.mkdtemp(prefix='web-range-sim-')
+        try:
+            for name, values in sweeps.items():
+                for value in values:
+                    variant = _build_variant(
+                        script_dir, src, pack_dir, lang, work_dir, {name: value})
+                    result = run(variant)
+                    report['sweep'].append({'parameter': name, 'value': value, **result})
+                    _print_result(f'{name}={value}', result)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        best = min(report['sweep'], key=lambda r: r['total_estimated_wait_ms'])
+        report['best'] = {'parameter': best['parameter'], 'value': best['value'],
+                          'total_estimated_wait_ms': best['total_estimated_wait_ms']}
+        print(f'Lowest estimated wait: {best["parameter"]}={best["value"]}', flush=True)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'Report written to {output}', flush=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,6 +1,18 @@
 """Shared helpers for the SumatoraIndex v2 (schema-v2.md) stage-2 generators."""
 
+import collections
+import concurrent.futures
+import json
 import os
+import queue
+import resource
+import sys
+import threading
+import time
+
+# When set (build-sumatora-db.py sets it for every step), each ProfilePass appends
+# one JSON line to the file it names.
+PROFILE_ENV = 'SUMATORA_BUILD_PROFILE'
 
 
 def iter_json_files(directory):
@@ -12,6 +24,53 @@ def iter_json_files(directory):
                 yield os.path.join(root, name)
 
 
+def read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _parse_chunk(parse, chunk):
+    return [parse(item) for item in chunk]
+
+
+def iter_parsed(items, parse, jobs=1, chunk_size=256, initializer=None, initargs=()):
+    """Yield parse(item) for every item, in input order: the reader half of a stage-2
+    loader's producer/consumer pipeline (RowWriter is the writer half).
+
+    parse should do the per-record work that needs no database - json.load, furigana,
+    row construction - and must be a module-level function so it can be sent to worker
+    processes. With jobs > 1 items are parsed chunk_size at a time on a process pool
+    (initializer/initargs set up per-worker state, the way gitoeba's Segmenter does),
+    keeping at most 2 * jobs chunks in flight so a slow consumer bounds memory instead
+    of the whole input piling up as finished results. With jobs <= 1 everything runs
+    inline, initializer included.
+    """
+    if jobs <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for item in items:
+            yield parse(item)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, initializer=initializer, initargs=initargs,
+    ) as pool:
+        in_flight = collections.deque()
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) < chunk_size:
+                continue
+            in_flight.append(pool.submit(_parse_chunk, parse, chunk))
+            chunk = []
+            if len(in_flight) >= 2 * jobs:
+                yield from in_flight.popleft().result()
+        if chunk:
+            in_flight.append(pool.submit(_parse_chunk, parse, chunk))
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
 def hira_to_kata(s):
     return ''.join(
         chr(ord(c) + 0x60) if 'ぁ' <= c <= 'ゖ' else c
@@ -92,10 +151,20 @@ def is_priority_code(code):
 
 
 class TagCache:
-    """Get-or-create cache for the Tag table, keyed by (category, code)."""
+    """Get-or-create cache for the Tag table, keyed by (category, code).
 
-    def __init__(self, conn):
+    With a BatchInserter, new tags take their tag_id from batch.next_id() and are
+    queued like any other row instead of being inserted on the spot.
+    """
+
+    _INSERT_SQL = (
+        'INSERT INTO Tag (tag_id, code, category, label, description, sort_order) '
+        'VALUES (?, ?, ?, ?, ?, ?)'
+    )
+
+    def __init__(self, conn, batch=None):
         self._conn = conn
+        self._batch = batch
         self._cache = {}
         for tag_id, category, code in conn.execute('SELECT tag_id, category, code FROM Tag'):
             self._cache[(category, code)] = tag_id
@@ -105,11 +174,195 @@ class TagCache:
         tag_id = self._cache.get(key)
         if tag_id is not None:
             return tag_id
-        cur = self._conn.execute(
-            'INSERT INTO Tag (code, category, label, description, sort_order) '
-            'VALUES (?, ?, ?, ?, ?)',
-            (code, category, label, description, sort_order),
-        )
-        tag_id = cur.lastrowid
+        if self._batch is not None:
+            tag_id = self._batch.next_id('Tag', 'tag_id')
+            self._batch.add(
+                self._INSERT_SQL, (tag_id, code, category, label, description, sort_order),
+            )
+        else:
+            tag_id = self._conn.execute(
+                self._INSERT_SQL, (None, code, category, label, description, sort_order),
+            ).lastrowid
         self._cache[key] = tag_id
         return tag_id
+
+
+class RowWriter:
+    """The writer half of a stage-2 loader's producer/consumer pipeline.
+
+    A single thread owns the connection and drains a bounded queue of row batches
+    ({sql: [row, ...]}, flushed in dict order) into executemany calls, all inside the
+    connection's one open transaction, so the producer can parse the next records while
+    SQLite writes the previous ones. Once the first batch is queued the producer must
+    not touch the connection until close(); anything else it needs from it goes through
+    call(). The connection has to
+    be opened with check_same_thread=False. A failed write is re-raised in the producer
+    by the next put(), call() or close().
+    """
+
+    def __init__(self, conn, max_batches=4):
+        self._conn = conn
+        self._queue = queue.Queue(max_batches)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='RowWriter', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            payload, future = item
+            if future is not None:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(payload(self._conn))
+                    except BaseException as e:
+                        future.set_exception(e)
+                continue
+            if self._error is not None:
+                continue
+            try:
+                for sql, rows in payload.items():
+                    self._conn.executemany(sql, rows)
+            except BaseException as e:
+                self._error = e
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def put(self, rows_by_sql):
+        self._check()
+        self._queue.put((rows_by_sql, None))
+
+    def call(self, fn):
+        """Run fn(conn) on the writer thread after every batch already queued, and
+        return its result."""
+        self._check()
+        future = concurrent.futures.Future()
+        self._queue.put((fn, future))
+        return future.result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._check()
+
+
+class BatchInserter:
+    """Buffers INSERT rows per statement and writes them with executemany.
+
+    Row ids come from next_id() instead of lastrowid: it hands out MAX(id) + 1,
+    MAX(id) + 2, ... for a table, the same ids SQLite would pick for an INTEGER
+    PRIMARY KEY inserted in the same order, so child rows can reference a parent
+    that is still sitting in the buffer. Statements are flushed in the order they
+    were first added, and rows of one statement keep their add() order.
+
+    With a RowWriter, flush() hands each batch to the writer thread instead of
+    executing it, and next_id()'s MAX lookups run there too.
+    """
+
+    def __init__(self, conn, batch_size=20000, writer=None):
+        self._conn = conn
+        self._batch_size = batch_size
+        self._writer = writer
+        self._rows = {}
+        self._pending = 0
+        self._next_ids = {}
+
+    def next_id(self, table, id_column):
+        next_id = self._next_ids.get(table)
+        if next_id is None:
+            sql = f'SELECT IFNULL(MAX({id_column}), 0) + 1 FROM {table}'
+            if self._writer is not None:
+                next_id = self._writer.call(lambda conn: conn.execute(sql).fetchone()[0])
+            else:
+                next_id = self._conn.execute(sql).fetchone()[0]
+        self._next_ids[table] = next_id + 1
+        return next_id
+
+    def add(self, sql, row):
+        self._rows.setdefault(sql, []).append(row)
+        self._pending += 1
+        if self._pending >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._writer is not None:
+            if self._rows:
+                self._writer.put(self._rows)
+        else:
+            for sql, rows in self._rows.items():
+                self._conn.executemany(sql, rows)
+        self._rows = {}
+        self._pending = 0
+
+
+def _io_counters():
+    """(bytes read, bytes written) by this process so far: /proc/self/io rchar and
+    wchar, which count page-cache hits too. (None, None) without /proc."""
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(':', 1) for line in f)
+        return int(counters['rchar']), int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def rss_mb(maxrss):
+    """ru_maxrss in MiB: kilobytes on Linux, bytes on macOS."""
+    return round(maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _usage():
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (self_usage.ru_utime + self_usage.ru_stime
+           + children.ru_utime + children.ru_stime)
+    return cpu, max(self_usage.ru_maxrss, children.ru_maxrss)
+
+
+class ProfilePass:
+    """Measure one pass of a build script when PROFILE_ENV is set:
+
+        timing = ProfilePass('pass 1')
+        ...
+        timing.done(items=count)
+
+    done() appends the record: wall and CPU time, peak RSS so far, bytes
+    read/written, and any counts it is given. CPU includes worker processes that
+    have already been joined, such as iter_parsed's pool. Without PROFILE_ENV
+    both calls do nothing.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._path = os.environ.get(PROFILE_ENV)
+        if not self._path:
+            return
+        self._cpu, _ = _usage()
+        self._read, self._written = _io_counters()
+        self._started = time.perf_counter()
+
+    def done(self, **counts):
+        if not self._path:
+            return
+        wall = time.perf_counter() - self._started
+        cpu, maxrss = _usage()
+        read, written = _io_counters()
+        record = {
+            'script': os.path.basename(sys.argv[0]),
+            'pass': self.name,
+            'wall_seconds': round(wall, 3),
+            'cpu_seconds': round(cpu - self._cpu, 3),
+            'peak_rss_mb': rss_mb(maxrss),
+            **counts,
+        }
+        if read is not None:
+            record['bytes_read'] = read - self._read
+            record['bytes_written'] = written - self._written
+        with open(self._path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print(f'  [{self.name}] {wall:.1f}s wall, {record["cpu_seconds"]:.1f}s CPU, '
+              f'peak RSS {record["peak_rss_mb"]:.0f} MiB', flush=True)
@@ -0,0 +1,270 @@
+"""Deinflect Japanese verbs and i-adjectives against FormRule (schema-v2.md).
+
+    deinflector = Deinflector()
+    deinflector.candidates('食べなかった')
+    # [('食べなかった', None, ()), ('食べない', frozenset({'adj-i'}), ('past',)),
+    #  ..., ('食べる', frozenset({'v1'}), ('past', 'negative')), ...]
+    deinflector.lookup(conn, '食べなかった')
+    # [{'entry_id': ..., 'form_id': ..., 'dictionary_form': '食べる', 'rule': 'v1',
+    #   'reasons': ('past', 'negative'), ...}]
+
+The rewrite table works the way Yomitan's does. Each rule turns one inflected
+suffix into the suffix of a less inflected form. It carries the conditions the
+inflected form must satisfy (conditions_in) and the word class the result
+belongs to (conditions_out). Conditions are either the dictionary rule classes
+jmdict-to-sumatora-db.py writes to FormRule (v1, v5, vk, vs, vz, adj-i) or
+intermediate forms (te, ta, masu) that only other rules consume. Rules chain, so
+食べさせられなかった unwinds through past, negative, passive and causative.
+The surface text matches every rule; after that a rule applies only if the
+previous one's conditions_out meets its conditions_in.
+
+lookup() validates all candidates with one query joining SearchTerm and FormRule:
+a candidate survives only where its word class is one of the rule classes of a
+form actually spelled that way. There is no per-candidate query.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+"""
+
+import json
+
+from sumatora_common import hira_to_kata
+
+# The classes FormRule stores (jmdict-to-sumatora-db.py's _POS_TO_RULES values).
+DICTIONARY_RULES = frozenset(('v1', 'v5', 'vk', 'vs', 'vz', 'adj-i'))
+
+# Deinflection chains are short; these only bound pathological input.
+_MAX_DEPTH = 8
+_MAX_CANDIDATES = 512
+
+# (dictionary ending, i-stem, a-stem, e-stem, o-stem, te/ta euphonic stem, た or だ)
+_GODAN = (
+    ('う', 'い', 'わ', 'え', 'お', 'っ', 'た'),
+    ('く', 'き', 'か', 'け', 'こ', 'い', 'た'),
+    ('ぐ', 'ぎ', 'が', 'げ', 'ご', 'い', 'だ'),
+    ('す', 'し', 'さ', 'せ', 'そ', 'し', 'た'),
+    ('つ', 'ち', 'た', 'て', 'と', 'っ', 'た'),
+    ('ぬ', 'に', 'な', 'ね', 'の', 'ん', 'だ'),
+    ('ぶ', 'び', 'ば', 'べ', 'ぼ', 'ん', 'だ'),
+    ('む', 'み', 'ま', 'め', 'も', 'ん', 'だ'),
+    ('る', 'り', 'ら', 'れ', 'ろ', 'っ', 'た'),
+)
+
+# (reason, inflected suffix after the stem, conditions_in) shared by the ichidan,
+# kuru and suru tables below, whose stems don't change between forms.
+_IRREGULAR = {
+    # class: (dictionary ending, [(reason, suffix, conditions_in), ...])
+    'v1': ('る', [
+        ('negative', 'ない', 'adj-i'),
+        ('negative', 'ず', ''),
+        ('past', 'た', 'ta'),
+        ('te', 'て', 'te'),
+        ('polite', 'ます', 'masu'),
+        ('desire', 'たい', 'adj-i'),
+        ('volitional', 'よう', ''),
+        ('potential or passive', 'られる', 'v1'),
+        ('potential', 'れる', 'v1'),
+        ('causative', 'させる', 'v1'),
+        ('imperative', 'ろ', ''),
+        ('imperative', 'よ', ''),
+        ('conditional', 'れば', ''),
+    ]),
+    'vs': ('する', [
+        ('negative', 'しない', 'adj-i'),
+        ('negative', 'せず', ''),
+        ('past', 'した', 'ta'),
+        ('te', 'して', 'te'),
+        ('polite', 'します', 'masu'),
+        ('desire', 'したい', 'adj-i'),
+        ('volitional', 'しよう', ''),
+        ('passive', 'される', 'v1'),
+        ('causative', 'させる', 'v1'),
+        ('imperative', 'しろ', ''),
+        ('imperative', 'せよ', ''),
+        ('conditional', 'すれば', ''),
+    ]),
+    'vz': ('ずる', [
+        ('negative', 'じない', 'adj-i'),
+        ('negative', 'ぜず', ''),
+        ('past', 'じた', 'ta'),
+        ('te', 'じて', 'te'),
+        ('polite', 'じます', 'masu'),
+        ('volitional', 'じよう', ''),
+        ('passive', 'じられる', 'v1'),
+        ('causative', 'じさせる', 'v1'),
+        ('imperative', 'じろ', ''),
+        ('conditional', 'ずれば', ''),
+    ]),
+}
+
+# 来る in kana and in kanji: (reason, kana suffix, kanji suffix, conditions_in)
+_KURU = (
+    ('negative', 'こない', '来ない', 'adj-i'),
+    ('past', 'きた', '来た', 'ta'),
+    ('te', 'きて', '来て', 'te'),
+    ('polite', 'きます', '来ます', 'masu'),
+    ('desire', 'きたい', '来たい', 'adj-i'),
+    ('volitional', 'こよう', '来よう', ''),
+    ('potential or passive', 'こられる', '来られる', 'v1'),
+    ('causative', 'こさせる', '来させる', 'v1'),
+    ('imperative', 'こい', '来い', ''),
+    ('conditional', 'くれば', '来れば', ''),
+)
+
+# Rules on top of other inflections: (reason, suffix in, suffix out, in, out)
+_AUXILIARY = (
+    ('polite past', 'ました', 'ます', 'ta', 'masu'),
+    ('polite negative', 'ません', 'ます', '', 'masu'),
+    ('polite past negative', 'ませんでした', 'ます', '', 'masu'),
+    ('polite volitional', 'ましょう', 'ます', '', 'masu'),
+    ('polite te', 'まして', 'ます', 'te', 'masu'),
+    ('-tara', 'たら', 'た', '', 'ta'),
+    ('-tara', 'だら', 'だ', '', 'ta'),
+    ('-tari', 'たり', 'た', '', 'ta'),
+    ('-tari', 'だり', 'だ', '', 'ta'),
+    ('progressive', 'ている', 'て', 'v1', 'te'),
+    ('progressive', 'でいる', 'で', 'v1', 'te'),
+    ('progressive', 'てる', 'て', 'v1', 'te'),
+    ('progressive', 'でる', 'で', 'v1', 'te'),
+    ('completion', 'てしまう', 'て', 'v5', 'te'),
+    ('completion', 'でしまう', 'で', 'v5', 'te'),
+    ('completion', 'ちゃう', 'て', 'v5', 'te'),
+    ('completion', 'じゃう', 'で', 'v5', 'te'),
+    ('negative te', 'ないで', 'ない', '', 'adj-i'),
+    # i-adjectives (and ない/たい, which inflect like one)
+    ('negative', 'くない', 'い', 'adj-i', 'adj-i'),
+    ('past', 'かった', 'い', 'ta', 'adj-i'),
+    ('te', 'くて', 'い', 'te', 'adj-i'),
+    ('adverb', 'く', 'い', '', 'adj-i'),
+    ('conditional', 'ければ', 'い', '', 'adj-i'),
+    ('noun', 'さ', 'い', '', 'adj-i'),
+)
+
+
+def _rules():
+    """[(reason, suffix in, suffix out, conditions_in, conditions_out)]."""
+    rules = list(_AUXILIARY)
+    for u, i, a, e, o, onbin, ta in _GODAN:
+        te = 'て' if ta == 'た' else 'で'
+        rules += [
+            ('negative', a + 'ない', u, 'adj-i', 'v5'),
+            ('negative', a + 'ず', u, '', 'v5'),
+            ('past', onbin + ta, u, 'ta', 'v5'),
+            ('te', onbin + te, u, 'te', 'v5'),
+            ('polite', i + 'ます', u, 'masu', 'v5'),
+            ('desire', i + 'たい', u, 'adj-i', 'v5'),
+            ('volitional', o + 'う', u, '', 'v5'),
+            ('potential', e + 'る', u, 'v1', 'v5'),
+            ('passive', a + 'れる', u, 'v1', 'v5'),
+            ('causative', a + 'せる', u, 'v1', 'v5'),
+            ('imperative', e, u, '', 'v5'),
+            ('conditional', e + 'ば', u, '', 'v5'),
+            ('masu stem', i, u, '', 'v5'),
+        ]
+    # 行く is the one godan く verb whose te/ta stem is っ, not い.
+    for stem in ('行', 'い'):
+        rules += [
+            ('past', stem + 'った', stem + 'く', 'ta', 'v5'),
+            ('te', stem + 'って', stem + 'く', 'te', 'v5'),
+        ]
+    for rule, (ending, forms) in _IRREGULAR.items():
+        for reason, suffix, conditions_in in forms:
+            rules.append((reason, suffix, ending, conditions_in, rule))
+    for reason, kana, kanji, conditions_in in _KURU:
+        rules.append((reason, kana, 'くる', conditions_in, 'vk'))
+        rules.append((reason, kanji, '来る', conditions_in, 'vk'))
+    return rules
+
+
+_VALIDATE_SQL = (
+    'SELECT st.normalized, st.script, st.entry_id, st.form_id, st.term, fr.rule, '
+    'st.priority, e.score '
+    'FROM {schema}.SearchTerm st '
+    'JOIN {schema}.FormRule fr ON fr.form_id = st.form_id '
+    'JOIN {schema}.Entry e ON e.entry_id = st.entry_id '
+    'WHERE st.normalized IN (SELECT value FROM json_each(?)) '
+    "AND st.script IN ('writing', 'kana') "
+    'AND fr.rule IN (SELECT value FROM json_each(?))'
+)
+
+
+class Deinflector:
+    """The compiled suffix-rewrite table: rules grouped by inflected suffix."""
+
+    def __init__(self, rules=None):
+        self._by_suffix = {}
+        for reason, suffix_in, suffix_out, conditions_in, conditions_out in (rules or _rules()):
+            self._by_suffix.setdefault(suffix_in, []).append((
+                reason, suffix_out,
+                frozenset(conditions_in.split()), frozenset(conditions_out.split()),
+            ))
+        self._lengths = sorted({len(suffix) for suffix in self._by_suffix}, reverse=True)
+
+    def candidates(self, text):
+        """[(term, conditions, reasons), ...] in the order found: text itself (with
+        conditions None), then every rewrite chain, shortest chains first. reasons
+        lists the inflections removed, outermost first."""
+        found = [(text, None, ())]
+        seen = {(text, None)}
+        i = 0
+        while i < len(found) and len(found) < _MAX_CANDIDATES:
+            term, conditions, reasons = found[i]
+            i += 1
+            if len(reasons) >= _MAX_DEPTH:
+                continue
+            for length in self._lengths:
+                if length > len(term):
+                    continue
+                for reason, suffix_out, conditions_in, conditions_out in \
+                        self._by_suffix.get(term[len(term) - length:], ()):
+                    if conditions is not None and not conditions & conditions_in:
+                        continue
+                    new_term = term[:len(term) - length] + suffix_out
+                    if not new_term or (new_term, conditions_out) in seen:
+                        continue
+                    seen.add((new_term, conditions_out))
+                    found.append((new_term, conditions_out, reasons + (reason,)))
+        return found
+
+    def lookup(self, conn, text, schema='main', limit=None):
+        """Dictionary forms of text confirmed by FormRule, as dicts with entry_id,
+        form_id, term (the matching SearchTerm.term), dictionary_form, rule and
+        reasons, ranked by chain length, then SearchTerm.priority and Entry.score."""
+        by_term = {}
+        for order, (term, conditions, reasons) in enumerate(self.candidates(text)):
+            rules = conditions & DICTIONARY_RULES if conditions else None
+            if rules:
+                by_term.setdefault(term, []).append((order, rules, reasons))
+        if not by_term:
+            return []
+
+        terms = {}  # normalized -> (candidate term, script)
+        for term in by_term:
+            terms[(term, 'writing')] = term
+            terms[(hira_to_kata(term), 'kana')] = term
+        rows = conn.execute(
+            _VALIDATE_SQL.format(schema=schema),
+            (json.dumps(sorted({normalized for normalized, _script in terms})),
+             json.dumps(sorted({rule for cands in by_term.values()
+                                for _order, rules, _reasons in cands for rule in rules}))),
+        )
+
+        matches = {}
+        for normalized, script, entry_id, form_id, st_term, rule, priority, score in rows:
+            term = terms.get((normalized, script))
+            if term is None:
+                continue
+            for order, rules, reasons in by_term[term]:
+                if rule not in rules:
+                    continue
+                key = (entry_id, form_id)
+                rank = (len(reasons), order, -priority, -(score or 0), entry_id, form_id)
+                if key not in matches or rank < matches[key][0]:
+                    matches[key] = (rank, {
+                        'entry_id': entry_id, 'form_id': form_id, 'term': st_term,
+                        'dictionary_form': term, 'rule': rule, 'reasons': reasons,
+                    })
+        ranked = [match for _rank, match in sorted(matches.values(), key=lambda m: m[0])]
+        return ranked[:limit] if limit is not None else ranked
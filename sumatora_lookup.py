@@ -0,0 +1,606 @@
+"""Tiered word lookup over a schema-v2 sumatora.db or its split packs (Database.md).
+
+    lookup = Lookup('output/packs', langs=('eng',))
+    for result in lookup.search('たべる'):
+        ...
+
+Lookup opens either a monolithic sumatora.db or a directory of installable packs.
+For packs it follows Database.md's app attachment model: sumatora_core.db is the
+main database and the installed gloss_{lang}, suffix, names and examples_{lang}
+packs are ATTACHed under those names. Every connection is read-only
+(mode=ro, query_only).
+
+search() tries the tiers in Android's order and returns each entry once, under
+the first tier that found it:
+
+    exact_writing  SearchTerm.normalized = query, writing forms
+    exact_kana     SearchTerm.normalized = hira_to_kata(query), kana forms
+    deinflect      dictionary forms of an inflected query (sumatora_deinflect.py)
+    prefix         SearchTermFts prefix match on either of the two
+    suffix         SearchSuffix, forms ending with the query (needs the suffix pack)
+    gloss          GlossSearchFts phrase match, per gloss language
+
+All SQL is fixed per Lookup, parameterized, and uses json_each() for id lists, so
+the sqlite3 module's statement cache prepares each statement once and reuses it.
+A result is a dict with Database.md's query result metadata (entry_id, form_id,
+match_kind, matched_text, original_query, dictionary_form, deinflection_label,
+rank) and the display rows a renderer needs first: source_key, entry_type, the
+matched form, and the senses that apply to it (SenseAppliesToForm) with their
+glosses, or a name entry's translations.
+
+ResultCache and CachedLookup add a shared, memory-bounded LRU of search results in
+front of any number of per-thread Lookups. It is invalidated by the packs' build
+version.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+"""
+
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from sumatora_common import hira_to_kata
+from sumatora_deinflect import Deinflector
+
+TIERS = ('exact_writing', 'exact_kana', 'deinflect', 'prefix', 'suffix', 'gloss')
+
+# The rewrite table is immutable once compiled; every Lookup shares it.
+_DEINFLECTOR = Deinflector()
+
+# Large enough for every statement a Lookup prepares (a few per attached schema).
+_STATEMENT_CACHE = 256
+
+# One row per entry: bare columns come from the row holding MAX(priority), so the
+# matched form is the entry's best-priority term in this tier.
+_TERM_SQL = (
+    'SELECT st.entry_id, st.form_id, st.term, MAX(st.priority) AS best '
+    'FROM {schema}.SearchTerm st JOIN {schema}.Entry e ON e.entry_id = st.entry_id '
+    'WHERE {where} AND e.entry_type IN (SELECT value FROM json_each(?)) '
+    'GROUP BY st.entry_id ORDER BY best DESC, e.score DESC, st.entry_id LIMIT ?'
+)
+_TERM_WHERE = {
+    'exact_writing': "st.normalized = ? AND st.script = 'writing'",
+    'exact_kana': "st.normalized = ? AND st.script = 'kana'",
+    'prefix': (
+        'st.search_id IN (SELECT rowid FROM {schema}.SearchTermFts '
+        'WHERE SearchTermFts MATCH ?) '
+        "AND st.script IN ('writing', 'kana')"
+    ),
+    'suffix': (
+        'st.search_id IN (SELECT search_id FROM {schema}.SearchSuffix '
+        'WHERE suffix IN (SELECT value FROM json_each(?))) '
+        "AND st.script IN ('writing', 'kana')"
+    ),
+}
+
+# A whole gloss equal to the query ranks before a phrase match inside a longer
+# gloss; after that, earlier senses first. Sense.ord stays far below 1000.
+# The unary + keeps SenseGlossLang out of the plan: with a usable lang index SQLite
+# would walk every gloss of the language and filter by the FTS rowids afterwards.
+_GLOSS_SQL = (
+    'SELECT s.entry_id, sg.sense_id, sg.text, '
+    'MIN((lower(sg.text) != ?) * 1000 + s.ord) AS best '
+    'FROM {schema}.SenseGloss sg '
+    'JOIN {schema}.Sense s ON s.sense_id = sg.sense_id '
+    'JOIN main.Entry e ON e.entry_id = s.entry_id '
+    'WHERE sg.rowid IN (SELECT rowid FROM {schema}.GlossSearchFts WHERE GlossSearchFts MATCH ?) '
+    'AND +sg.lang = ? '
+    'GROUP BY s.entry_id ORDER BY best, e.score DESC, s.entry_id LIMIT ?'
+)
+
+# The step each FTS-driven tier's plan must contain: its rows fetched by the rowids
+# the FTS index matched, never found by walking another index (Lookup.check_plans).
+_ROWID_LOOKUPS = {
+    'prefix': 'SEARCH st USING INTEGER PRIMARY KEY (rowid=?)',
+    'gloss': 'SEARCH sg USING INTEGER PRIMARY KEY (rowid=?)',
+}
+
+_ENTRY_SQL = (
+    'SELECT entry_id, source_key, entry_type, score FROM {schema}.Entry '
+    'WHERE entry_id IN (SELECT value FROM json_each(?))'
+)
+_FORM_SQL = (
+    'SELECT form_id, form_type, text, reading, is_common FROM {schema}.EntryForm '
+    'WHERE form_id IN (SELECT value FROM json_each(?))'
+)
+_SENSE_SQL = (
+    'SELECT sense_id, entry_id FROM {schema}.Sense '
+    'WHERE entry_id IN (SELECT value FROM json_each(?)) ORDER BY entry_id, ord'
+)
+_APPLIES_SQL = (
+    'SELECT sense_id, form_id FROM {schema}.SenseAppliesToForm '
+    'WHERE sense_id IN (SELECT value FROM json_each(?))'
+)
+_GLOSSES_SQL = (
+    'SELECT sense_id, text FROM {schema}.SenseGloss '
+    'WHERE lang = ? AND sense_id IN (SELECT value FROM json_each(?)) ORDER BY sense_id, ord'
+)
+_TRANSLATION_SQL = (
+    'SELECT entry_id, text FROM {schema}.NameTranslation '
+    'WHERE entry_id IN (SELECT value FROM json_each(?)) ORDER BY entry_id, ord'
+)
+_EXAMPLE_SQL = (
+    'SELECT x.source_key, x.translation, ee.matched_text, ee.sense_id '
+    'FROM {schema}.EntryExample ee JOIN {schema}.Example x ON x.example_id = ee.example_id '
+    'WHERE ee.entry_id = ? AND x.lang = ? ORDER BY ee.ord LIMIT ?'
+)
+
+
+def connect_readonly(path):
+    conn = sqlite3.connect(
+        f'file:{path}?mode=ro', uri=True, cached_statements=_STATEMENT_CACHE,
+    )
+    conn.execute('PRAGMA query_only = 1')
+    return conn
+
+
+def _attach(conn, path, schema):
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (f'file:{path}?mode=ro',))
+
+
+def _has_table(conn, schema, table):
+    return conn.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE name = ?", (table,),
+    ).fetchone() is not None
+
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def normalize_query(query):
+    return query.strip()
+
+
+class Lookup:
+    """Read-only tiered search over one sumatora.db or pack directory.
+
+    One Lookup owns one connection, so it must stay on the thread that created it.
+    langs picks the gloss languages returned (and searched by the gloss tier).
+    """
+
+    def __init__(self, path, langs=('eng',)):
+        self.path = path
+        self.langs = tuple(langs)
+        self._open()
+
+    def _open(self):
+        path = self.path
+        self._schemas = {}  # schema -> database file
+        if os.path.isdir(path):
+            self.conn = connect_readonly(os.path.join(path, 'sumatora_core.db'))
+            self._schemas['main'] = os.path.join(path, 'sumatora_core.db')
+            self._attach_packs(path)
+        else:
+            self.conn = connect_readonly(path)
+            self._schemas['main'] = path
+            # Everything lives in main; the gloss rows of every language share it.
+            self._term_schemas = [('main', 'main')]
+            self._suffix_schema = 'main' if _has_table(self.conn, 'main', 'SearchSuffix') else None
+            self._gloss_schemas = [(lang, 'main') for lang in self.langs]
+            self._example_schemas = {lang: 'main' for lang in self.langs}
+        # FormRule ships in sumatora_core.db, so deinflection needs no extra pack.
+        self._deinflect = _has_table(self.conn, 'main', 'FormRule')
+        self._translation_schemas = {
+            detail_schema for _schema, detail_schema in self._term_schemas
+            if _has_table(self.conn, detail_schema, 'NameTranslation')
+        }
+        self._example_schemas = {
+            lang: schema for lang, schema in self._example_schemas.items()
+            if _has_table(self.conn, schema, 'EntryExample')
+        }
+        self._signatures = self._file_signatures()
+
+    def _attach_packs(self, pack_dir):
+        def pack(name):
+            path = os.path.join(pack_dir, name)
+            return path if os.path.exists(path) else None
+
+        def attach(path, schema):
+            _attach(self.conn, path, schema)
+            self._schemas[schema] = path
+
+        # (schema searched for terms, schema holding those entries' display rows)
+        self._term_schemas = [('main', 'main')]
+        self._suffix_schema = None
+        self._gloss_schemas = []
+        self._example_schemas = {}
+        for lang in self.langs:
+            path = pack(f'sumatora_gloss_{lang}.db')
+            if path:
+                attach(path, f'gloss_{lang}')
+                self._gloss_schemas.append((lang, f'gloss_{lang}'))
+            path = pack(f'sumatora_examples_{lang}.db')
+            if path:
+                attach(path, f'examples_{lang}')
+                self._example_schemas[lang] = f'examples_{lang}'
+        path = pack('sumatora_search_suffix.db')
+        if path:
+            attach(path, 'suffix')
+            self._suffix_schema = 'suffix'
+        path = pack('sumatora_names.db')
+        if path:
+            attach(path, 'names')
+            self._term_schemas.append(('names', 'names'))
+
+    def _file_signatures(self):
+        signatures = {}
+        for schema, path in self._schemas.items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                signatures[schema] = None
+            else:
+                signatures[schema] = (st.st_ino, st.st_size, st.st_mtime_ns)
+        return signatures
+
+    def files_changed(self):
+        """True once any open database file has been replaced or rewritten on disk
+        (a pack swap); reopen() then picks the new files up."""
+        return self._file_signatures() != self._signatures
+
+    def reopen(self):
+        self.conn.close()
+        self._open()
+
+    def build_version(self):
+        """((schema, BuildMetadata build_timestamp, PRAGMA user_version), ...) for the
+        main database and every attached pack."""
+        version = []
+        for schema in sorted(self._schemas):
+            row = None
+            if _has_table(self.conn, schema, 'BuildMetadata'):
+                row = self.conn.execute(
+                    f"SELECT value FROM {schema}.BuildMetadata WHERE key = 'build_timestamp'"
+                ).fetchone()
+            user_version = self.conn.execute(f'PRAGMA {schema}.user_version').fetchone()[0]
+            version.append((schema, row[0] if row else None, user_version))
+        return tuple(version)
+
+    def plans(self, tier):
+        """EXPLAIN QUERY PLAN details of each statement tier runs: [(schema, [detail, ...])]."""
+        if tier == 'gloss':
+            statements = [
+                (schema, _GLOSS_SQL.format(schema=schema), ('', '""', lang, 1))
+                for lang, schema in self._gloss_schemas
+            ]
+        elif tier == 'prefix':
+            statements = [
+                (schema, _TERM_SQL.format(
+                    schema=schema, where=_TERM_WHERE[tier].format(schema=schema)),
+                 ('normalized : ""*', '[]', 1))
+                for schema, _detail_schema in self._term_schemas
+            ]
+        else:
+            raise ValueError(f'no plan check for tier {tier}')
+        return [
+            (schema, [row[3] for row in self.conn.execute('EXPLAIN QUERY PLAN ' + sql, params)])
+            for schema, sql, params in statements
+        ]
+
+    def check_plans(self):
+        """Problems with the FTS-driven tiers' query plans, as messages ([] if none)."""
+        problems = []
+        for tier, step in _ROWID_LOOKUPS.items():
+            for schema, details in self.plans(tier):
+                if step not in details:
+                    problems.append(f'{tier} tier on {schema} does not use "{step}": '
+                                    + '; '.join(details))
+        return problems
+
+    def search(self, query, tiers=TIERS, limit=50, entry_types=('word',)):
+        """Return up to limit results for query, tier by tier in TIERS order."""
+        original_query = query
+        query = normalize_query(query)
+        if not query:
+            return []
+        types = json.dumps(list(entry_types))
+        kana = hira_to_kata(query)
+
+        # (entry_id, detail schema, tier, form_id, matched_text, sense_id, deinflection)
+        hits = []
+        seen = set()
+
+        def take(rows, tier, detail_schema, is_gloss=False):
+            for row in rows:
+                if len(hits) >= limit:
+                    return
+                entry_id = row[0]
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                if is_gloss:
+                    hits.append((entry_id, detail_schema, tier, None, row[2], row[1], None))
+                else:
+                    hits.append((entry_id, detail_schema, tier, row[1], row[2], None, None))
+
+        for tier in TIERS:
+            if tier not in tiers or len(hits) >= limit:
+                continue
+            if tier == 'gloss':
+                if 'word' not in entry_types:
+                    continue
+                phrase = _fts_phrase(query)
+                for lang, schema in self._gloss_schemas:
+                    take(self.conn.execute(
+                        _GLOSS_SQL.format(schema=schema),
+                        (query.lower(), phrase, lang, limit),
+                    ), tier, 'main', is_gloss=True)
+                continue
+            if tier == 'deinflect':
+                if not self._deinflect or 'word' not in entry_types:
+                    continue
+                for match in _DEINFLECTOR.lookup(self.conn, query):
+                    if len(hits) >= limit:
+                        break
+                    if match['entry_id'] in seen:
+                        continue
+                    seen.add(match['entry_id'])
+                    hits.append((
+                        match['entry_id'], 'main', tier, match['form_id'], match['term'], None,
+                        (match['dictionary_form'], ' < '.join(match['reasons'])),
+                    ))
+                continue
+            if tier == 'suffix':
+                if self._suffix_schema is None:
+                    continue
+                schemas = [(self._suffix_schema, 'main')]
+                params = (json.dumps(sorted({query, kana})),)
+            else:
+                schemas = self._term_schemas
+                if tier == 'exact_writing':
+                    params = (query,)
+                elif tier == 'exact_kana':
+                    params = (kana,)
+                else:
+                    params = ('normalized : (' + ' OR '.join(
+                        _fts_phrase(v) + '*' for v in sorted({query, kana})
+                    ) + ')',)
+            for schema, detail_schema in schemas:
+                sql = _TERM_SQL.format(
+                    schema=schema, where=_TERM_WHERE[tier].format(schema=schema),
+                )
+                take(self.conn.execute(sql, params + (types, limit)), tier, detail_schema)
+
+        return self._results(hits, original_query)
+
+    def _results(self, hits, original_query):
+        by_schema = {}
+        for hit in hits:
+            by_schema.setdefault(hit[1], []).append(hit)
+
+        entries = {}
+        forms = {}
+        senses = {}
+        translations = {}
+        for schema, schema_hits in by_schema.items():
+            entry_ids = json.dumps([hit[0] for hit in schema_hits])
+            form_ids = json.dumps([hit[3] for hit in schema_hits if hit[3] is not None])
+            for entry_id, source_key, entry_type, score in self.conn.execute(
+                _ENTRY_SQL.format(schema=schema), (entry_ids,),
+            ):
+                entries[entry_id] = (source_key, entry_type, score)
+            for form_id, form_type, text, reading, is_common in self.conn.execute(
+                _FORM_SQL.format(schema=schema), (form_ids,),
+            ):
+                forms[form_id] = {
+                    'form_id': form_id, 'form_type': form_type, 'text': text,
+                    'reading': reading, 'is_common': bool(is_common),
+                }
+            if schema in self._translation_schemas:
+                for entry_id, text in self.conn.execute(
+                    _TRANSLATION_SQL.format(schema=schema), (entry_ids,),
+                ):
+                    translations.setdefault(entry_id, []).append(text)
+            if schema == 'main':
+                senses = self._senses(entry_ids)
+
+        results = []
+        for rank, hit in enumerate(hits):
+            entry_id, _schema, tier, form_id, matched_text, sense_id, deinflection = hit
+            source_key, entry_type, score = entries.get(entry_id, (None, None, None))
+            entry_senses = senses.get(entry_id, [])
+            if form_id is not None:
+                # A sense with SenseAppliesToForm rows applies only to those forms.
+                entry_senses = [
+                    s for s in entry_senses
+                    if not s['applies_to'] or form_id in s['applies_to']
+                ]
+            results.append({
+                'entry_id': entry_id,
+                'form_id': form_id,
+                'sense_id': sense_id,
+                'match_kind': tier,
+                'matched_text': matched_text,
+                'original_query': original_query,
+                'dictionary_form': deinflection[0] if deinflection else None,
+                'deinflection_label': deinflection[1] if deinflection else None,
+                'rank': rank,
+                'source_key': source_key,
+                'entry_type': entry_type,
+                'score': score,
+                'form': forms.get(form_id),
+                'senses': [
+                    {'sense_id': s['sense_id'], 'glosses': s['glosses']} for s in entry_senses
+                ],
+                'translations': translations.get(entry_id, []),
+            })
+        return results
+
+    def _senses(self, entry_ids):
+        """{entry_id: [{'sense_id', 'applies_to', 'glosses': {lang: [...]}}, ...]}."""
+        senses = {}
+        by_id = {}
+        for sense_id, entry_id in self.conn.execute(_SENSE_SQL.format(schema='main'), (entry_ids,)):
+            sense = {'sense_id': sense_id, 'applies_to': set(), 'glosses': {}}
+            senses.setdefault(entry_id, []).append(sense)
+            by_id[sense_id] = sense
+        if not by_id:
+            return senses
+        sense_ids = json.dumps(list(by_id))
+        for sense_id, form_id in self.conn.execute(
+            _APPLIES_SQL.format(schema='main'), (sense_ids,),
+        ):
+            by_id[sense_id]['applies_to'].add(form_id)
+        for lang, schema in self._gloss_schemas:
+            for sense_id, text in self.conn.execute(
+                _GLOSSES_SQL.format(schema=schema), (lang, sense_ids),
+            ):
+                by_id[sense_id]['glosses'].setdefault(lang, []).append(text)
+        return senses
+
+    def examples(self, entry_id, lang='eng', limit=3):
+        """[(sentence source_key, translation, matched_text, sense_id), ...], best first."""
+        schema = self._example_schemas.get(lang)
+        if schema is None:
+            return []
+        return self.conn.execute(
+            _EXAMPLE_SQL.format(schema=schema), (entry_id, lang, limit),
+        ).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+class ResultCache:
+    """Thread-safe LRU of search results, shared by any number of CachedLookups.
+
+    Entries are stored as the UTF-8 JSON encoding of the result list, and max_bytes
+    bounds the total size of those encodings. get() decodes a fresh list every time,
+    so a caller can modify what it got back without touching the cached entry or what
+    any other thread gets. Keys start with the build
+    version of the databases that produced the entry, and the first time a newer
+    version is seen everything cached so far is dropped, so swapping packs never
+    serves stale results.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()  # key -> encoded results
+        self._bytes = 0
+        self._versions = set()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def see_version(self, version):
+        with self._lock:
+            if version in self._versions:
+                return
+            if self._versions:
+                self._entries.clear()
+                self._bytes = 0
+                self.invalidations += 1
+            self._versions.add(version)
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(item)
+
+    def put(self, key, results):
+        encoded = json.dumps(results, ensure_ascii=False).encode('utf-8')
+        if len(encoded) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = encoded
+            self._bytes += len(encoded)
+            while self._bytes > self.max_bytes:
+                _key, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+class CachedLookup:
+    """A Lookup whose search() goes through a ResultCache.
+
+    Keyed by (build version, normalized query, tier set, language set, entry types,
+    limit). Every check_interval seconds it checks whether the database files were
+    swapped; if so it reopens them, and a new build version empties the cache.
+    Like Lookup, one CachedLookup belongs to one thread; the cache can be shared.
+    """
+
+    def __init__(self, lookup, cache, check_interval=5.0):
+        self.lookup = lookup
+        self.cache = cache
+        self._check_interval = check_interval
+        self._checked = time.monotonic()
+        self._version = lookup.build_version()
+        cache.see_version(self._version)
+
+    def _check_files(self):
+        now = time.monotonic()
+        if now - self._checked < self._check_interval:
+            return
+        self._checked = now
+        if self.lookup.files_changed():
+            self.lookup.reopen()
+            self._version = self.lookup.build_version()
+            self.cache.see_version(self._version)
+
+    def search(self, query, tiers=TIERS, limit=50, entry_types=('word',)):
+        self._check_files()
+        key = (self._version, normalize_query(query), frozenset(tiers),
+               self.lookup.langs, tuple(entry_types), limit)
+        results = self.cache.get(key)
+        if results is None:
+            results = self.lookup.search(query, tiers, limit, entry_types)
+            self.cache.put(key, results)
+        else:
+            for result in results:
+                result['original_query'] = query
+        return results
+
+    def warmup(self, queries, tiers=TIERS, limit=50, entry_types=('word',)):
+        """Search every query once so it is cached; returns how many were searched.
+
+        The limit, tiers and entry types are part of the cache key, so warmed entries
+        only serve searches made with the same ones: pass the server's defaults.
+        """
+        count = 0
+        for query in queries:
+            self.search(query, tiers, limit, entry_types)
+            count += 1
+        return count
+
+
+def read_frequency_list(path, top=None):
+    """Queries from a frequency list, most frequent first: one query per line, in
+    frequency order, optionally followed by a tab and anything else (a count)."""
+    queries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            query = line.split('\t', 1)[0].strip()
+            if not query or query.startswith('#'):
+                continue
+            queries.append(query)
+            if top is not None and len(queries) >= top:
+                break
+    return queries
@@ -0,0 +1,238 @@
+"""Longest-match dictionary scanner over running Japanese text.
+
+    scanner = Scanner.open('output/packs', cache_dir='~/.cache/sumatora')
+    scanner.matches('猫が好きです')   # every dictionary term at every position
+    scanner.segment('猫が好きです')   # greedy longest-match segmentation
+
+The index is every distinct SearchTerm.normalized of the writing and kana scripts:
+writing forms as they are, kana forms in katakana (hira_to_kata). It is kept as a
+sorted array of UTF-8 strings. Codepoint order equals UTF-8 byte order, so all
+terms sharing a prefix form one contiguous run. A term is found by narrowing that
+run one character at a time with bisect, starting from a per-first-character
+range table. Text is scanned twice, as written for writing forms and through
+hira_to_kata for kana forms; the second pass is skipped when the two are equal.
+
+The array is written once to a cache file and memory-mapped on later starts, so
+startup costs one small read regardless of dictionary size. Cache files live in a
+per-user directory (DEFAULT_CACHE_DIR unless cache_dir is given), never next to the
+packs, which may be read-only. The file name carries a hash of the source database
+paths, then a hash of their build version and file signatures: a new build gets a
+new index, and writing it removes the indexes of earlier builds of the same paths.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+"""
+
+import glob
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+from sumatora_common import hira_to_kata
+from sumatora_lookup import connect_readonly
+
+DEFAULT_CACHE_DIR = '~/.cache/sumatora'
+
+_MAGIC = b'SMSCAN1\n'
+# magic, term count, first-character table rows
+_HEADER = struct.Struct('<8sII')
+
+_TERM_SQL = (
+    'SELECT DISTINCT st.normalized FROM SearchTerm st '
+    'JOIN Entry e ON e.entry_id = st.entry_id '
+    "WHERE st.script IN ('writing', 'kana') "
+    'AND e.entry_type IN (SELECT value FROM json_each(?))'
+)
+
+
+def _sources(path, entry_types):
+    """Database files holding the SearchTerm rows for entry_types."""
+    if not os.path.isdir(path):
+        return [path]
+    sources = [os.path.join(path, 'sumatora_core.db')]
+    names = os.path.join(path, 'sumatora_names.db')
+    if 'name' in entry_types and os.path.exists(names):
+        sources.append(names)
+    return sources
+
+
+def _hash(parts):
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def _cache_keys(sources, entry_types):
+    """(key of the source paths and entry types, key of the sources' current build)."""
+    parts = []
+    for source in sources:
+        st = os.stat(source)
+        conn = connect_readonly(source)
+        try:
+            row = conn.execute(
+                "SELECT value FROM BuildMetadata WHERE key = 'build_timestamp'"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        user_version = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.close()
+        parts.append([st.st_size, st.st_mtime_ns, row[0] if row else None, user_version])
+    paths = [sorted(entry_types)] + [os.path.abspath(source) for source in sources]
+    return _hash(paths), _hash(parts)
+
+
+def _load_terms(sources, entry_types):
+    types = json.dumps(list(entry_types))
+    terms = set()
+    for source in sources:
+        conn = connect_readonly(source)
+        terms.update(row[0] for row in conn.execute(_TERM_SQL, (types,)))
+        conn.close()
+    return sorted(term.encode('utf-8') for term in terms if term)
+
+
+def _write_index(path, terms):
+    offsets = array('I', [0])
+    first_chars = array('I')  # (codepoint, lo, hi) triples
+    for i, term in enumerate(terms):
+        offsets.append(offsets[-1] + len(term))
+        first = ord(term.decode('utf-8')[0])
+        if first_chars and first_chars[-3] == first:
+            first_chars[-1] = i + 1
+        else:
+            first_chars.extend((first, i, i + 1))
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+        first_chars.byteswap()
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, len(terms), len(first_chars) // 3))
+        f.write(first_chars.tobytes())
+        f.write(offsets.tobytes())
+        for term in terms:
+            f.write(term)
+    os.replace(tmp, path)
+
+
+class _Terms:
+    """Sequence view of the mmapped term array, for bisect."""
+
+    def __init__(self, mm, base, offsets):
+        self._mm = mm
+        self._base = base
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._mm[self._base + self._offsets[i]:self._base + self._offsets[i + 1]]
+
+
+class Scanner:
+
+    def __init__(self, index_path):
+        self.path = index_path
+        with open(index_path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, first_rows = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f'{index_path} is not a scanner index')
+        pos = _HEADER.size
+        table = array('I', self._mm[pos:pos + first_rows * 12])
+        pos += first_rows * 12
+        # Offsets stay in the mapping; only the first-character table is copied.
+        self._view = memoryview(self._mm)
+        self._offsets = self._view[pos:pos + (count + 1) * 4].cast('I')
+        pos += (count + 1) * 4
+        if sys.byteorder != 'little':
+            table.byteswap()
+            self._offsets = array('I', self._offsets)
+            self._offsets.byteswap()
+        self._terms = _Terms(self._mm, pos, self._offsets)
+        self._first = {
+            table[i]: (table[i + 1], table[i + 2]) for i in range(0, len(table), 3)
+        }
+        self.term_count = count
+
+    @classmethod
+    def open(cls, path, cache_dir=None, entry_types=('word',)):
+        """Scanner for a sumatora.db file or pack directory, building the cached
+        index in cache_dir (DEFAULT_CACHE_DIR by default) the first time a given
+        build is opened."""
+        sources = _sources(path, entry_types)
+        cache_dir = os.path.expanduser(cache_dir or DEFAULT_CACHE_DIR)
+        os.makedirs(cache_dir, exist_ok=True)
+        paths_key, build_key = _cache_keys(sources, entry_types)
+        index_path = os.path.join(cache_dir, f'scanner-{paths_key}-{build_key}.idx')
+        if not os.path.exists(index_path):
+            _write_index(index_path, _load_terms(sources, entry_types))
+            for stale in glob.glob(os.path.join(cache_dir, f'scanner-{paths_key}-*.idx')):
+                if stale != index_path:
+                    os.remove(stale)
+        return cls(index_path)
+
+    def _prefix_terms(self, text, start):
+        """Lengths (in characters) of every indexed term that text[start:] begins with."""
+        run = self._first.get(ord(text[start]))
+        if run is None:
+            return []
+        lo, hi = run
+        terms = self._terms
+        lengths = []
+        prefix = b''
+        for end in range(start, len(text)):
+            prefix += text[end].encode('utf-8')
+            if end > start:
+                lo = bisect_left(terms, prefix, lo, hi)
+                hi = bisect_left(terms, prefix + b'\xff', lo, hi)
+                if lo >= hi:
+                    break
+            if terms[lo] == prefix:
+                lengths.append(end + 1 - start)
+        return lengths
+
+    def _lengths(self, text, kana, start):
+        lengths = self._prefix_terms(text, start)
+        if kana is not None:
+            lengths = sorted(set(lengths).union(self._prefix_terms(kana, start)))
+        return lengths
+
+    def matches(self, text):
+        """[(start, end, term), ...] for every term found in text, by start and then
+        longest first. term is the matched slice of text as written."""
+        kana = hira_to_kata(text)
+        kana = kana if kana != text else None
+        found = []
+        for start in range(len(text)):
+            for length in reversed(self._lengths(text, kana, start)):
+                found.append((start, start + length, text[start:start + length]))
+        return found
+
+    def segment(self, text):
+        """Greedy longest-match segmentation: [(start, end, is_match), ...] covering
+        text; characters no term starts with become one-character unmatched pieces."""
+        kana = hira_to_kata(text)
+        kana = kana if kana != text else None
+        segments = []
+        start = 0
+        while start < len(text):
+            lengths = self._lengths(text, kana, start)
+            length = lengths[-1] if lengths else 0
+            segments.append((start, start + (length or 1), bool(length)))
+            start += length or 1
+        return segments
+
+    def close(self):
+        self._terms = None
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+        self._view.release()
+        self._mm.close()
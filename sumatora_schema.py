@@ -4,11 +4,21 @@ Every stage-2 (*-to-sumatora-db.py) generator imports init_db() from here instea
 of redefining CREATE TABLE statements itself.
 """
 
+import atexit
 import os
+import re
 import sqlite3
+import sys
+import threading
+import time
 
 SCHEMA_VERSION = 2
 
+# Opt-in statement profiler for every connection opened through connect(): '1'
+# prints the report to stderr at exit, any other value names a file it is
+# appended to. build-sumatora-db.py --sql-profile sets it for every step.
+SQL_PROFILE_ENV = 'SUMATORA_SQL_PROFILE'
+
 _DDL = """
 CREATE TABLE BuildMetadata (
     key   TEXT PRIMARY KEY,
@@ -156,12 +166,35 @@ CREATE TABLE SenseReference (
     preview_text       TEXT
 );
 
+-- Language-neutral half of an example, used only by the shared segment layout
+-- (gitoeba-to-sumatora-db.py --shared-segments): the Japanese sentence's ruby segments
+-- hang off ExampleSentence once per Tatoeba sentence instead of being copied into
+-- ExampleSegment for every translation language. BuildMetadata.example_segment_layout
+-- records which layout a DB uses ('per_example' or 'shared').
+CREATE TABLE ExampleSentence (
+    sentence_id INTEGER PRIMARY KEY,
+    source_id   INTEGER NOT NULL REFERENCES DataSource(source_id),
+    source_key  TEXT NOT NULL,
+    UNIQUE (source_id, source_key)
+);
+
+CREATE TABLE ExampleSentenceSegment (
+    sentence_id INTEGER NOT NULL REFERENCES ExampleSentence(sentence_id),
+    ord         INTEGER NOT NULL,
+    base        TEXT NOT NULL,
+    ruby        TEXT,
+    PRIMARY KEY (sentence_id, ord)
+);
+
 CREATE TABLE Example (
     example_id INTEGER PRIMARY KEY,
     source_id  INTEGER NOT NULL REFERENCES DataSource(source_id),
     source_key TEXT NOT NULL,
     lang       TEXT NOT NULL,
     translation TEXT NOT NULL,
+    -- NULL in the per_example layout; in the shared layout, where this example's
+    -- segments live (ExampleSentenceSegment) instead of ExampleSegment.
+    sentence_id INTEGER REFERENCES ExampleSentence(sentence_id),
     UNIQUE (source_id, source_key, lang)
 );
 
@@ -182,7 +215,7 @@ CREATE TABLE EntryExample (
     -- Same rationale as Sense.entry_source_key above: split-sumatora-packs.py drops both
     -- Entry and Sense from examples_xx packs, so entry_id/sense_id alone can't survive a
     -- cross-release attach. sense_id always belongs to this same entry_id (see
-    -- gitoeba-to-sumatora-db.py's _sense_id lookup), so entry_source_key doubles as the
+    -- gitoeba-to-sumatora-db.py's TokenResolver.sense_id), so entry_source_key doubles as the
     -- stable entry half of the sense's key too - only its ordinal half needs its own column.
     entry_source_key TEXT NOT NULL DEFAULT '',
     sense_source_ord INTEGER,
@@ -355,13 +388,213 @@ _DATA_SOURCES = [
 ]
 
 
-def init_db(path):
+_LITERAL_RE = re.compile(r"[xX]?'(?:[^']|'')*'|(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_NULL_RE = re.compile(r'(?<!IS )(?<!NOT )\bNULL\b')
+_SPACE_RE = re.compile(r'\s+')
+_LIST_RE = re.compile(r'\(\?(?:, \?)+\)')
+_ROWS_RE = re.compile(r'\(\?, \.\.\.\)(?:, \(\?, \.\.\.\))+')
+
+# VM instructions between progress handler calls
+_PROFILE_STEP = 1000
+_PROFILE_TOP = 40
+
+
+def _normalize_sql(sql):
+    """Statement text with literals, bound values (which the trace callback gets
+    expanded) and value lists collapsed, so every execution of one statement
+    shares a key."""
+    sql = _NULL_RE.sub('?', _LITERAL_RE.sub('?', sql))
+    sql = _SPACE_RE.sub(' ', sql).strip().rstrip(';')
+    sql = _LIST_RE.sub('(?, ...)', sql)
+    return _ROWS_RE.sub('(?, ...), ...', sql)
+
+
+class _SqlProfile:
+    """Per-statement totals for one process: executions, seconds inside SQLite,
+    rows (fetched, or changed by DML) and VM steps.
+
+    The trace callback marks each statement as it starts running; time is
+    charged to the statement that last started, and only while a cursor call is
+    in progress, so Python work between fetches is not counted. Fetches are
+    charged to the statement of the cursor they read from. Statements SQLite
+    runs itself (FTS5 shadow table access, VACUUM's copies) are traced with a
+    leading "--" and take their time out of the statement that ran them.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.stats = {}
+        self.lock = threading.Lock()
+        atexit.register(self.report)
+
+    def add(self, sql, executions=0, seconds=0.0, rows=0, steps=0):
+        with self.lock:
+            totals = self.stats.setdefault(sql, [0, 0.0, 0, 0])
+            totals[0] += executions
+            totals[1] += seconds
+            totals[2] += rows
+            totals[3] += steps
+
+    def report(self):
+        if not self.stats:
+            return
+        ranked = sorted(self.stats.items(), key=lambda item: -item[1][1])
+        total = sum(totals[1] for _, totals in ranked)
+        lines = [
+            f'SQL profile: {os.path.basename(sys.argv[0])}, {len(ranked)} statements, '
+            f'{total:.2f}s in SQLite',
+            f'{"seconds":>9} {"%":>5} {"calls":>9} {"ms/call":>8} {"rows":>10} '
+            f'{"VM steps":>11}  statement',
+        ]
+        for sql, (executions, seconds, rows, steps) in ranked[:_PROFILE_TOP]:
+            per_call = seconds * 1000 / executions if executions else 0.0
+            lines.append(
+                f'{seconds:9.3f} {100 * seconds / (total or 1):5.1f} {executions:9d} '
+                f'{per_call:8.3f} {rows:10d} {steps:11d}  {sql[:160]}'
+            )
+        text = '\n'.join(lines) + '\n'
+        if self.target == '1':
+            sys.stderr.write(text)
+        else:
+            with open(self.target, 'a', encoding='utf-8') as f:
+                f.write(text + '\n')
+
+
+_PROFILE = None
+
+
+class _ProfiledConnection(sqlite3.Connection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sql = '(connection)'
+        self._call_sql = None
+        self._preparing = False
+        self._started = None
+        self.set_trace_callback(self._on_statement)
+        self.set_progress_handler(self._on_progress, _PROFILE_STEP)
+
+    def _on_statement(self, sql):
+        now = time.perf_counter()
+        sql = _normalize_sql(sql)
+        if self._started is not None:
+            # Time before a call's first statement is spent preparing it.
+            _PROFILE.add(sql if self._preparing else self._sql, seconds=now - self._started)
+            self._preparing = False
+        self._sql = sql
+        if self._call_sql is None and not self._sql.startswith('BEGIN'):
+            self._call_sql = self._sql
+        _PROFILE.add(self._sql, executions=1)
+        if self._started is not None:
+            self._started = time.perf_counter()
+
+    def _on_progress(self):
+        _PROFILE.add(self._sql, steps=_PROFILE_STEP)
+        return 0
+
+    def timed(self, call, *args, sql=None):
+        """call(*args), charged to the statements it runs, or to sql (a statement
+        already running) until another one starts."""
+        if sql is not None:
+            self._sql = sql
+        self._call_sql = sql
+        self._preparing = sql is None
+        self._started = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            _PROFILE.add(self._sql, seconds=time.perf_counter() - self._started)
+            self._started = None
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or _ProfiledCursor)
+
+    # sqlite3.Connection's shortcuts use the C cursor methods directly.
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+    def commit(self):
+        self.timed(super().commit)
+
+    def __exit__(self, *exc_info):
+        return self.timed(super().__exit__, *exc_info)
+
+
+class _ProfiledCursor(sqlite3.Cursor):
+
+    _sql = None
+
+    def _run(self, call, *args):
+        connection = self.connection
+        connection.timed(call, *args)
+        self._sql = connection._call_sql
+        if self._sql is not None and self.rowcount > 0:
+            _PROFILE.add(self._sql, rows=self.rowcount)
+        return self
+
+    def execute(self, *args):
+        return self._run(super().execute, *args)
+
+    def executemany(self, *args):
+        return self._run(super().executemany, *args)
+
+    def executescript(self, *args):
+        return self._run(super().executescript, *args)
+
+    def _fetch(self, call, *args):
+        return self.connection.timed(call, *args, sql=self._sql)
+
+    def _fetched(self, rows):
+        if self._sql is not None:
+            _PROFILE.add(self._sql, rows=rows)
+
+    def __next__(self):
+        row = self._fetch(super().__next__)
+        self._fetched(1)
+        return row
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if row is not None:
+            self._fetched(1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._fetch(super().fetchmany, *args)
+        self._fetched(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        self._fetched(len(rows))
+        return rows
+
+
+def connect(path, **kwargs):
+    """sqlite3.connect() for the generators. With SQL_PROFILE_ENV set the
+    connection records every statement into this process's SQL profile."""
+    global _PROFILE
+    target = os.environ.get(SQL_PROFILE_ENV)
+    if not target:
+        return sqlite3.connect(path, **kwargs)
+    if _PROFILE is None:
+        _PROFILE = _SqlProfile(target)
+    return sqlite3.connect(path, factory=_ProfiledConnection, **kwargs)
+
+
+def init_db(path, check_same_thread=True):
     """Create sumatora.db with the full v2 schema and return the connection.
 
     Raises if tables already exist, so callers that want a clean rebuild should
     remove the file first (or use open_or_init_db, which does this check for you).
     """
-    conn = sqlite3.connect(path)
+    conn = connect(path, check_same_thread=check_same_thread)
     conn.executescript(_DDL)
     conn.executemany(
         'INSERT INTO DataSource (code, name, url, license, attribution) VALUES (?, ?, ?, ?, ?)',
@@ -371,16 +604,17 @@ def init_db(path):
     return conn
 
 
-def open_or_init_db(path):
+def open_or_init_db(path, check_same_thread=True):
     """Open sumatora.db, creating it with the full v2 schema if it doesn't exist yet.
 
     Each stage-2 generator (kanjidic2-to-sumatora-db.py, jmdict-to-sumatora-db.py, ...)
     calls this with the same -d path; whichever one runs first creates the schema,
     later ones just add rows to the tables the earlier ones already populated.
+    Loaders that write through sumatora_common.RowWriter pass check_same_thread=False.
     """
     if os.path.exists(path):
-        return sqlite3.connect(path)
-    return init_db(path)
+        return connect(path, check_same_thread=check_same_thread)
+    return init_db(path, check_same_thread)
 
 
 def source_id(conn, code):
@@ -396,3 +630,31 @@ def set_build_metadata(conn, **kwargs):
         list(kwargs.items()),
     )
     conn.commit()
+
+
+# External-content FTS5 indexes over stage-2 tables; see finalize_fts().
+FTS_TABLES = ('SearchTermFts', 'GlossSearchFts')
+
+
+def finalize_fts(conn, tables=FTS_TABLES):
+    """Rebuild each FTS5 index from its content table, then 'optimize' it into one b-tree.
+
+    The settings suit an index that is written once and then only read. pgsz grows leaf
+    pages from FTS5's 1000-byte default to nearly a full database page, with room left
+    for the %_data row header so leaves don't spill into overflow pages. automerge is
+    off and crisismerge is raised, so the rebuild doesn't do incremental merges that the
+    optimize redoes anyway. The settings persist in each table's %_config, so pack
+    copies that rebuild later inherit them.
+    """
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    settings = (('pgsz', min(page_size - 64, 65536)), ('automerge', 0), ('crisismerge', 64))
+    for table in tables:
+        if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (table,),
+        ).fetchone():
+            continue
+        for key, value in settings:
+            conn.execute(f'INSERT INTO {table}({table}, rank) VALUES (?, ?)', (key, value))
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+    conn.commit()
@@ -12,7 +12,19 @@ to <gitoeba>/sentences/{shard}/{id}.json. Only sentences with at least one
 verified token AND at least one translation in any language are written.
 
 Downloaded files are cached in the cache directory; delete the cache to
-force a full re-download.
+force a full re-download. Their parsed contents are cached too, under
+<cache>/parsed/ (see iter_parsed), so reruns over unchanged exports skip bz2
+decompression entirely.
+
+Memory stays bounded regardless of export size: link files are external-sorted
+by translation ID into run files under the cache directory and merge-joined
+against the ID-sorted sentence exports, and per-sentence bookkeeping uses
+bitmaps (IdBitmap) rather than sets or dicts. Only the annotated Japanese
+sentences and their tokens are held in memory.
+
+Languages are independent, so -j/--jobs N processes N of them at once in a
+process pool (bz2 decompression is CPU-bound); each worker writes its own
+translations/{lang}/ tree and hands back only the IDs it wrote.
 
 This program is free software: you can redistribute it and/or modify it under
 the terms of the GNU General Public License as published by the Free Software
@@ -25,13 +37,20 @@ __license__ = "GPLv3"
 __version__ = "0.1.0"
 
 import bz2
+import concurrent.futures
 import getopt
+import hashlib
+import heapq
 import json
+import mmap
 import os
 import re
+import shutil
 import sys
 import tarfile
+import tempfile
 import urllib.request
+from array import array
 
 BASE_URL = 'https://downloads.tatoeba.org/exports'
 SHARD_SIZE = 10000
@@ -63,6 +82,17 @@ _LANG_MAP = {
 # are effectively empty (the smallest real link file is ~47 bytes).
 MIN_FILE_BYTES = 200
 
+# External sort of link files: keys per in-memory sorted run (8 bytes each in
+# the run buffer, ~40 MB transient while sorting), and keys read back per
+# chunk from each run file during the merge.
+_RUN_ITEMS = 1 << 20
+_RUN_READ_ITEMS = 1 << 14
+_ID_MASK = (1 << 32) - 1
+
+# Bump whenever the <cache>/parsed/ binary layout changes, so stale caches
+# written by an older version are rebuilt instead of misread.
+_PARSED_FORMAT = 1
+
 # B-line token regex — same semantics as sumatora-index-tatoeba.py.
 # Each space-separated token in jpn_indices text has the form:
 #   writing(reading)[sense-number]{expression}~
@@ -113,33 +143,314 @@ def parse_tsv_bz2(path, id_col=0, text_col=2):
                     pass
 
 
-def load_sentences(path):
-    """Load a bz2 TSV sentence file into {sentence_id: text}."""
-    print(f'  Loading {os.path.basename(path)} …', flush=True)
-    return {sid: text for sid, text in parse_tsv_bz2(path)}
-
-
-def load_links(path, known_ids):
-    """Load a bz2 TSV link file into {jpn_id: first_trans_id}.
-
-    Rows where col[0] is not in known_ids are ignored (the file may contain
-    links in both directions; we only want Japanese→target).
-    Only the first translation ID seen for each Japanese sentence is kept.
-    """
-    result = {}
+def parse_links_bz2(path):
+    """Yield (src_id, dst_id) from a bz2-compressed TSV link file."""
     with bz2.open(path, 'rt', encoding='utf-8') as f:
         for line in f:
             parts = line.rstrip('\n').split('\t')
             if len(parts) < 2:
                 continue
             try:
-                src = int(parts[0])
-                dst = int(parts[1])
+                yield int(parts[0]), int(parts[1])
             except ValueError:
                 continue
-            if src in known_ids and src not in result:
-                result[src] = dst
-    return result
+
+
+def parse_indices_tar(path):
+    """Yield (sentence_id, b_line_text) from the jpn_indices tar.bz2 export."""
+    with tarfile.open(path, 'r:bz2') as tf:
+        member = next(m for m in tf.getmembers() if m.name.endswith('.csv'))
+        for raw in tf.extractfile(member):
+            parts = raw.decode('utf-8').rstrip('\n').split('\t')
+            if len(parts) < 3:
+                continue
+            try:
+                yield int(parts[0]), parts[2]
+            except ValueError:
+                continue
+
+
+# ---------------------------------------------------------------------------
+# Parsed-export cache
+# ---------------------------------------------------------------------------
+#
+# Decompressing the bz2 exports dominates a rerun even when ensure_cached()
+# fetched nothing new, so every parsed export is also kept under
+# <cache>/parsed/ in a flat binary layout that is mmap'd back directly:
+#
+#   text  (sentences, jpn_indices):  count | ids[count] | offsets[count + 1] | UTF-8 heap
+#   links (jpn-{lang}_links):        count | (src, dst)[count]
+#
+# All integers are native int64 ('q'). A <name>.key JSON sidecar records the
+# source file's size, mtime and SHA-256; a size/mtime match is trusted as is,
+# and a size match with a new mtime (e.g. a restored CI cache) is confirmed by
+# hash before reuse.
+
+def _parsed_paths(path):
+    parsed_dir = os.path.join(os.path.dirname(path), 'parsed')
+    name = os.path.basename(path)
+    return os.path.join(parsed_dir, f'{name}.bin'), os.path.join(parsed_dir, f'{name}.key')
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _parsed_is_fresh(path, bin_path, key_path):
+    if not (os.path.exists(bin_path) and os.path.exists(key_path)):
+        return False
+    with open(key_path) as f:
+        saved = json.load(f)
+    st = os.stat(path)
+    if saved.get('format') != _PARSED_FORMAT or saved.get('size') != st.st_size:
+        return False
+    if saved.get('mtime_ns') == st.st_mtime_ns:
+        return True
+    if saved.get('sha256') != _sha256(path):
+        return False
+    saved['mtime_ns'] = st.st_mtime_ns
+    with open(key_path, 'w') as f:
+        json.dump(saved, f)
+    return True
+
+
+def _copy_into(out, path):
+    with open(path, 'rb') as f:
+        shutil.copyfileobj(f, out)
+
+
+def _build_parsed_text(rows, bin_path):
+    """Stream (id, text) rows into the 'text' layout without holding them in memory."""
+    parsed_dir = os.path.dirname(bin_path)
+    with tempfile.TemporaryDirectory(dir=parsed_dir) as tmp:
+        ids_path = os.path.join(tmp, 'ids')
+        offsets_path = os.path.join(tmp, 'offsets')
+        heap_path = os.path.join(tmp, 'heap')
+        count = heap_len = 0
+        with open(ids_path, 'wb') as ids_f, open(offsets_path, 'wb') as offsets_f, \
+                open(heap_path, 'wb') as heap_f:
+            ids = array('q')
+            offsets = array('q', [0])
+            for sid, text in rows:
+                data = text.encode('utf-8')
+                heap_f.write(data)
+                heap_len += len(data)
+                ids.append(sid)
+                offsets.append(heap_len)
+                count += 1
+                if len(ids) >= _RUN_READ_ITEMS:
+                    ids.tofile(ids_f)
+                    offsets.tofile(offsets_f)
+                    ids = array('q')
+                    offsets = array('q')
+            ids.tofile(ids_f)
+            offsets.tofile(offsets_f)
+        out_path = os.path.join(tmp, 'out')
+        with open(out_path, 'wb') as out:
+            array('q', [count]).tofile(out)
+            for part in (ids_path, offsets_path, heap_path):
+                _copy_into(out, part)
+        os.replace(out_path, bin_path)
+
+
+def _build_parsed_links(rows, bin_path):
+    parsed_dir = os.path.dirname(bin_path)
+    with tempfile.TemporaryDirectory(dir=parsed_dir) as tmp:
+        pairs_path = os.path.join(tmp, 'pairs')
+        count = 0
+        with open(pairs_path, 'wb') as pairs_f:
+            pairs = array('q')
+            for src, dst in rows:
+                pairs.append(src)
+                pairs.append(dst)
+                count += 1
+                if len(pairs) >= _RUN_READ_ITEMS:
+                    pairs.tofile(pairs_f)
+                    pairs = array('q')
+            pairs.tofile(pairs_f)
+        out_path = os.path.join(tmp, 'out')
+        with open(out_path, 'wb') as out:
+            array('q', [count]).tofile(out)
+            _copy_into(out, pairs_path)
+        os.replace(out_path, bin_path)
+
+
+def _iter_parsed_text(bin_path):
+    with open(bin_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        count = view[:8].cast('q')[0]
+        heap_start = 8 * (2 * count + 2)
+        ints = view[8:heap_start].cast('q')
+        try:
+            for i in range(count):
+                start = heap_start + ints[count + i]
+                end = heap_start + ints[count + i + 1]
+                yield ints[i], str(mm[start:end], 'utf-8')
+        finally:
+            ints.release()
+            view.release()
+
+
+def _iter_parsed_links(bin_path):
+    with open(bin_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        pairs = view[8:].cast('q')
+        try:
+            for i in range(0, len(pairs), 2):
+                yield pairs[i], pairs[i + 1]
+        finally:
+            pairs.release()
+            view.release()
+
+
+def iter_parsed(path, kind, parser):
+    """Yield parser(path)'s rows for a downloaded export, via the parsed cache.
+
+    kind is 'text' for (id, text) rows or 'links' for (src, dst) rows. The
+    cache is (re)built with one full pass of parser first when missing or
+    stale, then every call — including repeated calls in the same run — reads
+    the mmap'd binary instead of decompressing again.
+    """
+    bin_path, key_path = _parsed_paths(path)
+    if not _parsed_is_fresh(path, bin_path, key_path):
+        os.makedirs(os.path.dirname(bin_path), exist_ok=True)
+        print(f'    Caching parsed {os.path.basename(path)} …', flush=True)
+        build = _build_parsed_text if kind == 'text' else _build_parsed_links
+        build(parser(path), bin_path)
+        st = os.stat(path)
+        with open(key_path, 'w') as f:
+            json.dump({'format': _PARSED_FORMAT, 'size': st.st_size,
+                       'mtime_ns': st.st_mtime_ns, 'sha256': _sha256(path)}, f)
+    if kind == 'text':
+        yield from _iter_parsed_text(bin_path)
+    else:
+        yield from _iter_parsed_links(bin_path)
+
+
+def load_sentences(path, wanted_ids=None):
+    """Load a bz2 TSV sentence file into {sentence_id: text}.
+
+    When wanted_ids is given, only those sentences are kept — the rest are
+    streamed past without ever being held in memory.
+    """
+    print(f'  Loading {os.path.basename(path)} …', flush=True)
+    return {
+        sid: text
+        for sid, text in iter_parsed(path, 'text', parse_tsv_bz2)
+        if wanted_ids is None or sid in wanted_ids
+    }
+
+
+class IdBitmap:
+    """Compact set of non-negative sentence IDs, one bit per possible ID.
+
+    Tatoeba IDs are dense integers (~13M today), so a bitmap costs under 2 MB
+    where a Python set of the same IDs would cost hundreds of MB.
+    """
+
+    def __init__(self, ids=()):
+        self._bits = bytearray()
+        self._count = 0
+        for sid in ids:
+            self.add(sid)
+
+    def add(self, sid):
+        byte = sid >> 3
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(max(byte + 1 - len(self._bits), len(self._bits) // 2)))
+        mask = 1 << (sid & 7)
+        if not self._bits[byte] & mask:
+            self._bits[byte] |= mask
+            self._count += 1
+
+    def __contains__(self, sid):
+        byte = sid >> 3
+        return 0 <= byte < len(self._bits) and bool(self._bits[byte] & (1 << (sid & 7)))
+
+    def __len__(self):
+        return self._count
+
+
+class _UnsortedExport(Exception):
+    """A sentence export turned out not to be in ascending ID order."""
+
+
+def _write_run(tmp_dir, keys):
+    fd, path = tempfile.mkstemp(dir=tmp_dir, suffix='.run')
+    with os.fdopen(fd, 'wb') as f:
+        array('q', sorted(keys)).tofile(f)
+    return path
+
+
+def _read_run(path):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = array('q')
+            try:
+                chunk.fromfile(f, _RUN_READ_ITEMS)
+            except EOFError:
+                pass
+            if not chunk:
+                return
+            yield from chunk
+
+
+def sort_links(links, known_ids, tmp_dir):
+    """External-sort (src_id, dst_id) link rows by translation ID.
+
+    Returns a list of sorted run files, each a flat array of
+    (trans_id << 32 | jpn_id) keys; merge them with merge_runs().
+
+    Rows where col[0] is not in known_ids are ignored (the file may contain
+    links in both directions; we only want Japanese→target). Only the first
+    translation ID seen for each Japanese sentence is kept.
+    """
+    linked = IdBitmap()
+    runs = []
+    buf = array('q')
+    for src, dst in links:
+        if src in known_ids and src not in linked:
+            linked.add(src)
+            buf.append(dst << 32 | src)
+            if len(buf) >= _RUN_ITEMS:
+                runs.append(_write_run(tmp_dir, buf))
+                buf = array('q')
+    if buf:
+        runs.append(_write_run(tmp_dir, buf))
+    return runs
+
+
+def merge_runs(runs):
+    """Yield (trans_id, jpn_id) in ascending trans_id order across every run."""
+    for key in heapq.merge(*(_read_run(p) for p in runs)):
+        yield key >> 32, key & _ID_MASK
+
+
+def join_sentences(links, sentences, emitted):
+    """Merge-join trans_id-sorted links against an ID-sorted sentence stream.
+
+    Yields (jpn_id, trans_text) and records each jpn_id in emitted. Raises
+    _UnsortedExport if the sentence stream goes backwards, since the join is
+    only correct over ascending IDs on both sides.
+    """
+    link = next(links, None)
+    prev = -1
+    for sid, text in sentences:
+        if link is None:
+            return
+        if sid < prev:
+            raise _UnsortedExport(sid)
+        prev = sid
+        while link is not None and link[0] < sid:
+            link = next(links, None)
+        while link is not None and link[0] == sid:
+            emitted.add(link[1])
+            yield link[1], text
+            link = next(links, None)
 
 
 def parse_jpn_indices(cache_dir):
@@ -153,62 +464,52 @@ def parse_jpn_indices(cache_dir):
     print('  Parsing jpn_indices …', flush=True)
 
     result = {}
-    with tarfile.open(local, 'r:bz2') as tf:
-        member = next(m for m in tf.getmembers() if m.name.endswith('.csv'))
-        for raw in tf.extractfile(member):
-            line = raw.decode('utf-8').rstrip('\n')
-            parts = line.split('\t')
-            if len(parts) < 3:
-                continue
-            try:
-                sentence_id = int(parts[0])
-            except ValueError:
-                continue
-            tokens = []
-            seen = set()
-            for m in TOKEN_RE.finditer(parts[2]):
-                if m['verified'] == '~' and m['writing']:
-                    writing = m['writing']
-                    reading = m['reading'] or None
-                    entry_id = None
-                    if reading and reading.startswith('#') and reading[1:].isdigit():
-                        entry_id = int(reading[1:])
-                        reading = None
-                    sense_number = None
-                    if m['senseNumber'] and m['senseNumber'].isdigit():
-                        sense_number = int(m['senseNumber'])
-                    expression = m['expression'] or None
-                    # expression equal to writing carries no extra info
-                    if expression == writing:
-                        expression = None
-                    key = (writing, reading, entry_id, sense_number, expression)
-                    if key not in seen:
-                        seen.add(key)
-                        tok = {'writing': writing}
-                        if reading:
-                            tok['reading'] = reading
-                        if entry_id is not None:
-                            tok['entryId'] = entry_id
-                        if sense_number is not None:
-                            tok['senseNumber'] = sense_number
-                        if expression:
-                            tok['expression'] = expression
-                        tokens.append(tok)
-            if tokens:
-                if sentence_id not in result:
-                    result[sentence_id] = tokens
-                else:
-                    # merge tokens from multiple B-lines for the same sentence
-                    existing = {
-                        (t['writing'], t.get('reading'), t.get('entryId'),
-                         t.get('senseNumber'), t.get('expression'))
-                        for t in result[sentence_id]
-                    }
-                    result[sentence_id].extend(
-                        t for t in tokens
-                        if (t['writing'], t.get('reading'), t.get('entryId'),
-                            t.get('senseNumber'), t.get('expression')) not in existing
-                    )
+    for sentence_id, b_line in iter_parsed(local, 'text', parse_indices_tar):
+        tokens = []
+        seen = set()
+        for m in TOKEN_RE.finditer(b_line):
+            if m['verified'] == '~' and m['writing']:
+                writing = m['writing']
+                reading = m['reading'] or None
+                entry_id = None
+                if reading and reading.startswith('#') and reading[1:].isdigit():
+                    entry_id = int(reading[1:])
+                    reading = None
+                sense_number = None
+                if m['senseNumber'] and m['senseNumber'].isdigit():
+                    sense_number = int(m['senseNumber'])
+                expression = m['expression'] or None
+                # expression equal to writing carries no extra info
+                if expression == writing:
+                    expression = None
+                key = (writing, reading, entry_id, sense_number, expression)
+                if key not in seen:
+                    seen.add(key)
+                    tok = {'writing': writing}
+                    if reading:
+                        tok['reading'] = reading
+                    if entry_id is not None:
+                        tok['entryId'] = entry_id
+                    if sense_number is not None:
+                        tok['senseNumber'] = sense_number
+                    if expression:
+                        tok['expression'] = expression
+                    tokens.append(tok)
+        if tokens:
+            if sentence_id not in result:
+                result[sentence_id] = tokens
+            else:
+                # merge tokens from multiple B-lines for the same sentence
+                existing = {
+                    (t['writing'], t.get('reading'), t.get('entryId'),
+                     t.get('senseNumber'), t.get('expression'))
+                    for t in result[sentence_id]
+                }
+                result[sentence_id].extend(
+                    t for t in tokens
+                    if (t['writing'], t.get('reading'), t.get('entryId'),
+                        t.get('senseNumber'), t.get('expression')) not in existing
+                )
     return result
 
 
@@ -224,37 +525,49 @@ def list_available_langs(cache_dir):
 
 
 def process_lang(lang, cache_dir, indexed_ids):
-    """Download links + translations for lang. Returns {jpn_id: trans_text}."""
+    """Download links + translations for lang. Yields (jpn_id, trans_text).
+
+    Links are external-sorted by translation ID and merge-joined against the
+    (ID-sorted) translation sentence export, so neither file is ever held in
+    memory — only indexed_ids and a per-language bitmap of linked IDs are.
+    Results come out in translation-ID order, not Japanese-ID order.
+    """
     link_url = f'{BASE_URL}/per_language/jpn/jpn-{lang}_links.tsv.bz2'
     link_path = ensure_cached(link_url, cache_dir)
     if os.path.getsize(link_path) < MIN_FILE_BYTES:
-        return {}
+        return
 
     sent_url = f'{BASE_URL}/per_language/{lang}/{lang}_sentences.tsv.bz2'
     try:
         sent_path = ensure_cached(sent_url, cache_dir)
     except Exception as e:
         print(f'    Warning: {lang} sentences unavailable: {e}', file=sys.stderr)
-        return {}
+        return
     if os.path.getsize(sent_path) < MIN_FILE_BYTES:
-        return {}
-
-    links = load_links(link_path, indexed_ids)
-    if not links:
-        return {}
-
-    needed = set(links.values())
-    lang_sents = {
-        sid: text
-        for sid, text in parse_tsv_bz2(sent_path)
-        if sid in needed
-    }
-
-    return {
-        jpn_id: lang_sents[trans_id]
-        for jpn_id, trans_id in links.items()
-        if trans_id in lang_sents
-    }
+        return
+
+    with tempfile.TemporaryDirectory(dir=cache_dir, prefix=f'.{lang}-links-') as tmp_dir:
+        runs = sort_links(iter_parsed(link_path, 'links', parse_links_bz2), indexed_ids, tmp_dir)
+        if not runs:
+            return
+        emitted = IdBitmap()
+        try:
+            yield from join_sentences(
+                merge_runs(runs), iter_parsed(sent_path, 'text', parse_tsv_bz2), emitted,
+            )
+        except _UnsortedExport:
+            # Tatoeba writes its exports in ID order, but don't silently drop
+            # links if that ever changes: fall back to a lookup table of just
+            # the still-unmatched links for this language.
+            print(f'    Warning: {lang} sentences not sorted by ID; '
+                  'falling back to in-memory join', file=sys.stderr)
+            pending = {}
+            for trans_id, jpn_id in merge_runs(runs):
+                if jpn_id not in emitted:
+                    pending.setdefault(trans_id, []).append(jpn_id)
+            for sid, text in iter_parsed(sent_path, 'text', parse_tsv_bz2):
+                for jpn_id in pending.pop(sid, ()):
+                    yield jpn_id, text
 
 
 # ---------------------------------------------------------------------------
@@ -268,51 +581,106 @@ def write_json(path, data):
         f.write('\n')
 
 
+def translate_lang(tatoeba_lang, cache_dir, output_dir, indexed_ids):
+    """Write every translation file for one language.
+
+    Returns (tatoeba_lang, jm_lang, array of Japanese IDs written). Languages
+    write to disjoint translations/{jm_lang}/ directories, so several can run
+    at once.
+    """
+    jm_lang = _LANG_MAP.get(tatoeba_lang, tatoeba_lang)
+    lang_ids = array('q')
+    for jpn_id, translation in process_lang(tatoeba_lang, cache_dir, indexed_ids):
+        write_json(
+            os.path.join(output_dir, 'translations', jm_lang,
+                         str(jpn_id // SHARD_SIZE), f'{jpn_id}.json'),
+            {'id': jpn_id, 'lang': jm_lang, 'translation': translation},
+        )
+        lang_ids.append(jpn_id)
+    return tatoeba_lang, jm_lang, lang_ids
+
+
+# Per-worker state for the --jobs process pool, set once by _init_worker so the
+# indexed_ids bitmap is pickled per worker rather than per language.
+_worker_args = None
+
+
+def _init_worker(cache_dir, output_dir, indexed_ids):
+    global _worker_args
+    _worker_args = (cache_dir, output_dir, indexed_ids)
+
+
+def _translate_lang_in_worker(tatoeba_lang):
+    return translate_lang(tatoeba_lang, *_worker_args)
+
+
+def _translate_langs(langs, cache_dir, output_dir, indexed_ids, jobs):
+    """Yield translate_lang() results for every language, jobs at a time.
+
+    bz2 decompression dominates each language and is CPU-bound, so languages
+    run in separate processes rather than threads. Results are yielded in
+    completion order; callers only merge ID sets, so order doesn't matter.
+    """
+    if jobs <= 1:
+        for tatoeba_lang in langs:
+            yield translate_lang(tatoeba_lang, cache_dir, output_dir, indexed_ids)
+        return
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(cache_dir, output_dir, indexed_ids),
+    ) as pool:
+        futures = [pool.submit(_translate_lang_in_worker, lang) for lang in langs]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
 # ---------------------------------------------------------------------------
 # Main pipeline
 # ---------------------------------------------------------------------------
 
-def process(output_dir, cache_dir):
+def process(output_dir, cache_dir, jobs=1):
     os.makedirs(cache_dir, exist_ok=True)
     os.makedirs(output_dir, exist_ok=True)
 
-    # Step 1: Japanese sentences
+    # Step 1: B-line annotations (verified JMdict token links)
+    jpn_indices = parse_jpn_indices(cache_dir)
+    print(f'  {len(jpn_indices)} sentences with verified annotations', flush=True)
+
+    # Step 2: Japanese sentences — only the annotated ones are kept in memory
     jpn_sent_path = ensure_cached(
         f'{BASE_URL}/per_language/jpn/jpn_sentences.tsv.bz2', cache_dir
     )
-    jpn_sentences = load_sentences(jpn_sent_path)
-    print(f'  {len(jpn_sentences)} Japanese sentences loaded', flush=True)
+    jpn_sentences = load_sentences(jpn_sent_path, jpn_indices)
+    print(f'  {len(jpn_sentences)} annotated Japanese sentences loaded', flush=True)
+    indexed_ids = IdBitmap(jpn_sentences)
 
-    # Step 2: B-line annotations (verified JMdict token links)
-    jpn_indices = parse_jpn_indices(cache_dir)
-    print(f'  {len(jpn_indices)} sentences with verified annotations', flush=True)
-    indexed_ids = set(jpn_indices.keys())
-
-    # Step 3: Per-language translations
+    # Step 3: Per-language translations. Each language is streamed straight to
+    # its translation files; only a bitmap of translated IDs is kept, which
+    # decides in step 4 which sentences get written.
     langs = list_available_langs(cache_dir)
     print(f'  {len(langs)} language link files found', flush=True)
 
-    # translations[jpn_id][jm_lang] = translation_text (first found per lang)
-    translations = {}
-    for i, tatoeba_lang in enumerate(langs, 1):
-        lang_trans = process_lang(tatoeba_lang, cache_dir, indexed_ids)
-        n = len(lang_trans)
-        jm_lang = _LANG_MAP.get(tatoeba_lang, tatoeba_lang)
+    translated_ids = IdBitmap()
+    active_langs = set()
+    trans_written = 0
+    for i, (tatoeba_lang, jm_lang, lang_ids) in enumerate(
+        _translate_langs(langs, cache_dir, output_dir, indexed_ids, jobs), 1,
+    ):
+        for jpn_id in lang_ids:
+            translated_ids.add(jpn_id)
+        n = len(lang_ids)
         if n:
-            for jpn_id, text in lang_trans.items():
-                if jpn_id not in translations:
-                    translations[jpn_id] = {}
-                translations[jpn_id][jm_lang] = text
+            active_langs.add(jm_lang)
+            trans_written += n
         label = f'{tatoeba_lang}→{jm_lang}' if jm_lang != tatoeba_lang else tatoeba_lang
         print(f'  [{i:3d}/{len(langs)}] {label}: {n} links', flush=True)
 
-    # Step 4: Write sentence and translation JSON files
+    # Step 4: Write sentence JSON files
     written = skipped = 0
-    trans_written = 0
     for jpn_id, tokens in jpn_indices.items():
         text = jpn_sentences.get(jpn_id)
-        trans = translations.get(jpn_id)
-        if not text or not trans:
+        if not text or jpn_id not in translated_ids:
             skipped += 1
             continue
 
@@ -321,21 +689,11 @@ def process(output_dir, cache_dir):
             os.path.join(output_dir, 'sentences', str(shard), f'{jpn_id}.json'),
             {'id': jpn_id, 'text': text, 'indices': tokens},
         )
-        for lang, translation in trans.items():
-            write_json(
-                os.path.join(output_dir, 'translations', lang, str(shard), f'{jpn_id}.json'),
-                {'id': jpn_id, 'lang': lang, 'translation': translation},
-            )
-            trans_written += 1
         written += 1
         if written % 10000 == 0:
             print(f'  {written} sentences written…', flush=True)
 
-    active_langs = sorted({
-        lang
-        for trans in translations.values()
-        for lang in trans
-    })
+    active_langs = sorted(active_langs)
     write_json(
         os.path.join(output_dir, 'metadata.json'),
         {'langs': active_langs},
@@ -350,15 +708,16 @@ def process(output_dir, cache_dir):
 
 HELP = (
     'usage: tatoeba-to-git.py '
-    '-o <gitoeba directory> [--cache <cache directory>]'
+    '-o <gitoeba directory> [--cache <cache directory>] [-j|--jobs <n>]'
 )
 
 
 def main(argv):
     output_dir = ''
     cache_dir = os.path.expanduser('~/.cache/tatoeba')
+    jobs = 1
     try:
-        opts, _ = getopt.getopt(argv, 'ho:', ['odir=', 'cache='])
+        opts, _ = getopt.getopt(argv, 'ho:j:', ['odir=', 'cache=', 'jobs='])
     except getopt.GetoptError:
         print(HELP)
         sys.exit(2)
@@ -370,10 +729,12 @@ def main(argv):
             output_dir = arg
         elif opt == '--cache':
             cache_dir = arg
+        elif opt in ('-j', '--jobs'):
+            jobs = int(arg)
     if not output_dir:
         print(HELP)
         sys.exit(2)
-    process(output_dir, cache_dir)
+    process(output_dir, cache_dir, jobs)
 
 
 if __name__ == '__main__':
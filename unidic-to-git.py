@@ -28,8 +28,11 @@ schema and empirically cross-checked, see Algorithms.md):
     24 aType  pitch accent drop position(s); CSV-quoted when multi-valued
 
 The aType field is stored with CSV quoting when it contains commas (e.g.
-"0,2" for a word that has two possible pitch patterns).  Each feature string
-is therefore parsed with csv.reader rather than a naïve split.
+"0,2" for a word that has two possible pitch patterns).  sys.dic is
+memory-mapped and scanned record by record; unquoted records (nearly all of
+them) are split on raw bytes up to the aType column and only the orth, pron
+and aType fields are decoded, while records containing a quote fall back to
+csv.reader.
 
 Pitch position encoding (same as the rest of the pipeline):
     0  — heiban    (LH…H, no drop)
@@ -65,6 +68,7 @@ import csv
 import getopt
 import io
 import json
+import mmap
 import os
 import re
 import struct
@@ -240,8 +244,8 @@ def ensure_dicdir(url, cache_dir):
 # Binary parsing
 # ---------------------------------------------------------------------------
 
-def _read_feature_block(sysdic_path):
-    """Return the raw feature-section bytes from sys.dic."""
+def _feature_block_span(sysdic_path):
+    """Return (offset, length) of the feature section inside sys.dic."""
     with open(sysdic_path, 'rb') as f:
         hdr = f.read(72)
     fields = struct.unpack_from('<IIIIIIIIII', hdr, 0)
@@ -249,10 +253,57 @@ def _read_feature_block(sysdic_path):
     da_bytes    = fields[6] * 8
     tok_bytes   = fields[7]
     feat_bytes  = fields[8]
-    feat_offset = 72 + da_bytes + tok_bytes
-    with open(sysdic_path, 'rb') as f:
-        f.seek(feat_offset)
-        return f.read(feat_bytes)
+    return 72 + da_bytes + tok_bytes, feat_bytes
+
+
+def _iter_feature_records(mm, offset, length):
+    """Yield each NUL-terminated feature record of the mapped block as bytes.
+
+    Records are sliced out of the mapping one at a time, so only the record
+    being parsed is ever copied — never the whole ~100 MB block.
+    """
+    pos = offset
+    end = offset + length
+    while pos < end:
+        nul = mm.find(b'\x00', pos, end)
+        if nul == -1:
+            nul = end
+        if nul > pos:
+            yield mm[pos:nul]
+        pos = nul + 1
+
+
+def _split_feature(raw):
+    """Return (orth, pron, aType) as bytes, or None when aType is empty or '*'.
+
+    The vast majority of records carry no CSV quoting, so a plain byte split
+    bounded at the aType column is enough and nothing is decoded until a
+    record is known to have pitch data; only records containing a quote
+    (a quoted multi-valued aType like "0,2", or a comma inside a quoted
+    orth) take the csv.reader path.
+    """
+    if b'"' not in raw:
+        row = raw.split(b',', _COL_ATYPE + 1)
+        if len(row) <= _COL_ATYPE:
+            return None
+        atype = row[_COL_ATYPE].strip()
+        if not atype or atype == b'*':
+            return None
+        return row[_COL_ORTH], row[_COL_PRON], atype
+    try:
+        line = raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    try:
+        row = next(csv.reader(io.StringIO(line)))
+    except StopIteration:
+        return None
+    if len(row) <= _COL_ATYPE:
+        return None
+    atype = row[_COL_ATYPE].strip()
+    if not atype or atype == '*':
+        return None
+    return row[_COL_ORTH].encode('utf-8'), row[_COL_PRON].encode('utf-8'), atype.encode('utf-8')
 
 
 def _kata_to_hira(s):
@@ -275,36 +326,29 @@ def _parse_atype(s):
 def parse_entries(sysdic_path):
     """Yield (word, reading_hiragana, [pitch_positions]) for every entry with pitch."""
     print(f'  Parsing feature section of {sysdic_path}', flush=True)
-    block = _read_feature_block(sysdic_path)
+    offset, length = _feature_block_span(sysdic_path)
     count = 0
-    for raw in block.split(b'\x00'):
-        if not raw:
-            continue
-        try:
-            line = raw.decode('utf-8')
-        except UnicodeDecodeError:
-            continue
-        # csv.reader handles quoted fields like "0,2" correctly.
-        try:
-            row = next(csv.reader(io.StringIO(line)))
-        except StopIteration:
-            continue
-        if len(row) <= _COL_ATYPE:
-            continue
-        atype_str = row[_COL_ATYPE].strip()
-        if not atype_str or atype_str == '*':
-            continue
-        positions = _parse_atype(atype_str)
-        if not positions:
-            continue
-        word = unicodedata.normalize('NFC', row[_COL_ORTH].strip())
-        pron = _kata_to_hira(row[_COL_PRON].strip())
-        if not word or not pron:
-            continue
-        count += 1
-        if count % 50000 == 0:
-            print(f'  {count} entries with pitch parsed…', flush=True)
-        yield word, pron, positions
+    with open(sysdic_path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for raw in _iter_feature_records(mm, offset, length):
+            fields = _split_feature(raw)
+            if fields is None:
+                continue
+            orth, pron, atype = fields
+            try:
+                positions = _parse_atype(atype.decode('utf-8'))
+                if not positions:
+                    continue
+                word = unicodedata.normalize('NFC', orth.decode('utf-8').strip())
+                pron = _kata_to_hira(pron.decode('utf-8').strip())
+            except UnicodeDecodeError:
+                continue
+            if not word or not pron:
+                continue
+            count += 1
+            if count % 50000 == 0:
+                print(f'  {count} entries with pitch parsed…', flush=True)
+            yield word, pron, positions
 
 
 # ---------------------------------------------------------------------------